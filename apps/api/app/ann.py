@@ -0,0 +1,184 @@
+from __future__ import annotations
+import copy
+import numpy as np
+from typing import Tuple
+
+KMEANS_ITERATIONS = 10
+TRAIN_SAMPLES_PER_LIST = 40
+PQ_CENTROIDS = 256
+ENCODE_CHUNK = 8192
+# Retrain once the index holds this many times the rows it was trained on, so the
+# coarse lists keep tracking where new rows land.
+RETRAIN_GROWTH = 4
+
+
+def _cluster_sums(vectors: np.ndarray, assignment: np.ndarray, clusters: int) -> np.ndarray:
+    # Sort-and-reduce is far faster than np.add.at for wide rows.
+    order = np.argsort(assignment, kind="stable")
+    sorted_assignment = assignment[order]
+    present, starts = np.unique(sorted_assignment, return_index=True)
+    sums = np.zeros((clusters, vectors.shape[1]), dtype=np.float32)
+    sums[present] = np.add.reduceat(vectors[order], starts, axis=0)
+    return sums
+
+
+def _spherical_kmeans(vectors: np.ndarray, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = _cluster_sums(vectors, assignment, clusters)
+        empty = ~sums.any(axis=1)
+        # Empty clusters are re-seeded from random rows instead of collapsing.
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+def _nearest_codeword(vectors: np.ndarray, codewords: np.ndarray) -> np.ndarray:
+    # argmin |v - c|^2 == argmin |c|^2 - 2 v.c, built in place to limit passes over
+    # the (rows x codewords) matrix, which dominates training and encoding time.
+    scores = vectors @ (-2 * codewords.T)
+    scores += (codewords**2).sum(axis=1)
+    return np.argmin(scores, axis=1)
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=len(vectors) < clusters)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _nearest_codeword(vectors, centroids)
+        counts = np.bincount(assignment, minlength=clusters)
+        sums = _cluster_sums(vectors, assignment, clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids.astype(np.float32)
+
+
+class IVFPQIndex:
+    # Inverted-file index with product-quantized residuals over unit-normalized rows.
+    # Rows are identified by their position in the classifier's matrix; per-row state
+    # (coarse list and PQ code) lives in capacity buffers that are only ever written
+    # past ``size``, so a clone can grow while the original keeps serving searches.
+    def __init__(self, subquantizers: int = 64, nprobe: int = 16, rerank: int = 200, seed: int = 0) -> None:
+        self.subquantizers = subquantizers
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.seed = seed
+        self.size = 0
+        self.trained_rows = 0
+        self.mean = np.zeros(0, dtype=np.float32)
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.list_means = np.zeros((0, 0), dtype=np.float32)
+        self.codebooks = np.zeros((0, 0, 0), dtype=np.float32)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros((0, subquantizers), dtype=np.uint8)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def clone(self) -> "IVFPQIndex":
+        return copy.copy(self)
+
+    def quantizers(self) -> dict:
+        # Everything train() learns; rows are re-encoded against it by add().
+        return {
+            "mean": self.mean,
+            "centroids": self.centroids,
+            "list_means": self.list_means,
+            "codebooks": self.codebooks,
+            "trained_rows": np.int64(self.trained_rows),
+        }
+
+    @classmethod
+    def from_quantizers(cls, quantizers: dict, nprobe: int = 16, rerank: int = 200) -> "IVFPQIndex":
+        index = cls(len(quantizers["codebooks"]), nprobe, rerank)
+        index.mean = quantizers["mean"]
+        index.centroids = quantizers["centroids"]
+        index.list_means = quantizers["list_means"]
+        index.codebooks = quantizers["codebooks"]
+        index.trained_rows = int(quantizers["trained_rows"])
+        return index
+
+    def needs_training(self, rows: int) -> bool:
+        return not self.trained_rows or rows > RETRAIN_GROWTH * self.trained_rows
+
+    @staticmethod
+    def list_count(rows: int) -> int:
+        return int(np.clip(np.sqrt(rows), 16, 4096))
+
+    def train_size(self, rows: int) -> int:
+        return min(rows, self.list_count(rows) * TRAIN_SAMPLES_PER_LIST)
+
+    def train(self, sample: np.ndarray, rows: int) -> None:
+        # ``sample`` is a uniform draw of train_size(rows) normalized rows; the index is
+        # emptied and rows are then added (in chunks) by the caller.
+        rng = np.random.default_rng(self.seed)
+        if sample.shape[1] % self.subquantizers:
+            raise ValueError(f"{sample.shape[1]} dims do not split into {self.subquantizers} subquantizers")
+        # Embeddings share a large common component, so lists are formed on directions
+        # around the mean; clustering raw rows leaves a few lists holding most of them.
+        # For unit vectors, centering does not change which rows are nearest.
+        self.mean = sample.mean(axis=0)
+        centered = sample - self.mean
+        directions = centered / np.maximum(np.linalg.norm(centered, axis=1, keepdims=True), 1e-12)
+        self.centroids = _spherical_kmeans(directions, min(self.list_count(rows), len(sample)), rng)
+        assignment = np.argmax(directions @ self.centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=self.nlist)
+        self.list_means = _cluster_sums(centered, assignment, self.nlist) / np.maximum(counts, 1)[:, None]
+        residuals = centered - self.list_means[assignment]
+        sub = residuals.reshape(len(sample), self.subquantizers, -1)
+        self.codebooks = np.stack(
+            [_kmeans(np.ascontiguousarray(sub[:, part]), PQ_CENTROIDS, rng) for part in range(self.subquantizers)]
+        )
+        self.trained_rows = rows
+        self.size = 0
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros((0, self.subquantizers), dtype=np.uint8)
+
+    def add(self, vectors: np.ndarray) -> None:
+        if not len(vectors):
+            return
+        lists = np.empty(len(vectors), dtype=np.int32)
+        codes = np.empty((len(vectors), self.subquantizers), dtype=np.uint8)
+        # Chunked so the row x codeword score matrices stay small for bulk loads.
+        for start in range(0, len(vectors), ENCODE_CHUNK):
+            chunk = vectors[start:start + ENCODE_CHUNK] - self.mean
+            chunk_lists = np.argmax(chunk @ self.centroids.T, axis=1)
+            residuals = (chunk - self.list_means[chunk_lists]).reshape(len(chunk), self.subquantizers, -1)
+            for part in range(self.subquantizers):
+                codes[start:start + len(chunk), part] = _nearest_codeword(residuals[:, part], self.codebooks[part])
+            lists[start:start + len(chunk)] = chunk_lists
+        needed = self.size + len(vectors)
+        if needed > len(self._lists):
+            capacity = max(needed, 2 * len(self._lists), 1024)
+            list_buffer = np.empty(capacity, dtype=np.int32)
+            code_buffer = np.empty((capacity, self.subquantizers), dtype=np.uint8)
+            list_buffer[: self.size] = self._lists[: self.size]
+            code_buffer[: self.size] = self._codes[: self.size]
+            self._lists = list_buffer
+            self._codes = code_buffer
+        self._lists[self.size:needed] = lists
+        self._codes[self.size:needed] = codes
+        self.size = needed
+
+    def candidates(self, query: np.ndarray, count: int, row_mask: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Approximate inner products (less the constant query.mean) for rows in the
+        # nprobe lists whose directions are closest to the centered query.
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ (query - self.mean)), nprobe - 1)[:nprobe]
+        probe_mask = np.zeros(self.nlist, dtype=bool)
+        probe_mask[probes] = True
+        lists = self._lists[: self.size]
+        selected = probe_mask[lists]
+        if row_mask is not None:
+            selected &= row_mask
+        rows = np.flatnonzero(selected)
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        table = np.einsum("md,mkd->mk", query.reshape(self.subquantizers, -1), self.codebooks)
+        offsets = np.arange(self.subquantizers) * PQ_CENTROIDS
+        scores = (self.list_means @ query)[lists[rows]] + np.take(table.ravel(), self._codes[rows] + offsets).sum(axis=1)
+        if len(rows) > count:
+            top = np.argpartition(-scores, count - 1)[:count]
+            rows, scores = rows[top], scores[top]
+        return rows, scores
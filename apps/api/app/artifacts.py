@@ -0,0 +1,91 @@
+from __future__ import annotations
+from datetime import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from .settings import settings
+
+MANIFEST_NAME = "MANIFEST.json"
+
+
+class ArtifactMissing(RuntimeError):
+    pass
+
+
+def _digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as artifact_file:
+        for block in iter(lambda: artifact_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactManager:
+    # Models live at <root>/<name>/<version>/, written once by install() and never
+    # modified, so a worker only ever reads a complete, pinned copy from local disk.
+    def __init__(self, root: str, offline: bool) -> None:
+        self.root = root
+        self.offline = offline
+
+    def path(self, name: str, version: str) -> str:
+        return os.path.join(self.root, name, version)
+
+    def manifest(self, name: str, version: str) -> dict | None:
+        try:
+            with open(os.path.join(self.path(name, version), MANIFEST_NAME)) as manifest_file:
+                return json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def resolve(self, name: str, version: str, remote: str | None = None) -> str:
+        local = self.path(name, version)
+        if os.path.isdir(local):
+            return local
+        if remote and os.path.exists(remote):
+            return remote
+        if self.offline or not remote:
+            raise ArtifactMissing(
+                f"Model {name}/{version} not found at {local}; install it with "
+                f"`python -m scripts.fetch_models --name {name} --version {version}`"
+            )
+        return remote
+
+    def install(self, name: str, version: str, source: str, origin: str | None = None) -> str:
+        target = self.path(name, version)
+        if os.path.isdir(target):
+            raise FileExistsError(f"{target} already exists; artifact versions are immutable")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{version}-", dir=os.path.dirname(target))
+        try:
+            if os.path.isdir(source):
+                shutil.copytree(source, staging, dirs_exist_ok=True)
+            else:
+                shutil.copy2(source, os.path.join(staging, os.path.basename(source)))
+            files = {}
+            for directory, _, names in os.walk(staging):
+                for file_name in names:
+                    full_path = os.path.join(directory, file_name)
+                    files[os.path.relpath(full_path, staging)] = _digest(full_path)
+            with open(os.path.join(staging, MANIFEST_NAME), "w") as manifest_file:
+                json.dump(
+                    {
+                        "name": name,
+                        "version": version,
+                        "source": origin or source,
+                        "installed_at": datetime.utcnow().isoformat(),
+                        "files": files,
+                    },
+                    manifest_file,
+                    indent=2,
+                    sort_keys=True,
+                )
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return target
+
+
+artifacts = ArtifactManager(settings.artifact_dir, settings.artifact_offline)
@@ -0,0 +1,167 @@
+from __future__ import annotations
+from functools import lru_cache
+from io import BytesIO
+from math import gcd
+import struct
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, upfirdn
+from typing import Dict, NamedTuple, Tuple
+
+PCM_ENCODINGS = {"float32": np.dtype("<f4"), "pcm16": np.dtype("<i2")}
+RAW_PCM_CONTENT_TYPE = "audio/pcm"
+# The resampling filter grows with max(up, down) after reducing the rate pair by their
+# gcd, so an odd rate such as 44101 Hz costs megabytes of taps that stay cached. Only the
+# rates audio hardware uses are accepted; each reduces to at most 640 against 16 kHz.
+SAMPLE_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000, 88200, 96000, 176400, 192000, 352800, 384000)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+_CHUNK_HEADER = struct.Struct("<4sI")
+_FMT = struct.Struct("<HHIIHH")
+
+
+class UnsupportedAudio(ValueError):
+    pass
+
+
+class WavLayout(NamedTuple):
+    encoding: str
+    channels: int
+    sample_rate: int
+    offset: int
+    size: int
+
+
+def _to_mono_float32(samples: np.ndarray, channels: int) -> np.ndarray:
+    # float32 mono stays a zero-copy view of the request bytes; everything else is
+    # converted in a single pass (downmix and cast together), then scaled in place.
+    scale = 1.0 / 32768.0 if samples.dtype == np.int16 else 1.0
+    if channels > 1:
+        # Summing strided columns is much faster than mean(axis=1) over a short axis.
+        frames = samples[: len(samples) - len(samples) % channels].reshape(-1, channels)
+        audio = frames[:, 0].astype(np.float32)
+        for channel in range(1, channels):
+            audio += frames[:, channel]
+        scale /= channels
+    elif samples.dtype == np.float32:
+        return samples
+    else:
+        audio = samples.astype(np.float32)
+    if scale != 1.0:
+        audio *= np.float32(scale)
+    return audio
+
+
+def decode_pcm(data: bytes, encoding: str, channels: int = 1) -> np.ndarray:
+    if encoding not in PCM_ENCODINGS:
+        raise UnsupportedAudio(f"Unsupported PCM encoding {encoding!r}, expected one of {tuple(PCM_ENCODINGS)}")
+    dtype = PCM_ENCODINGS[encoding]
+    samples = np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+    return _to_mono_float32(samples, max(1, channels))
+
+
+def parse_wav(data: bytes) -> WavLayout | None:
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    fmt = None
+    while offset + _CHUNK_HEADER.size <= len(data):
+        chunk_id, chunk_size = _CHUNK_HEADER.unpack_from(data, offset)
+        body = offset + _CHUNK_HEADER.size
+        if chunk_id == b"fmt " and chunk_size >= _FMT.size and body + chunk_size <= len(data):
+            format_tag, channels, sample_rate, _, _, bits = _FMT.unpack_from(data, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # The real format code leads the SubFormat GUID.
+                format_tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            format_tag, channels, sample_rate, bits = fmt
+            # Streaming writers leave the size as 0 or 0xFFFFFFFF; take whatever arrived.
+            size = len(data) - body if chunk_size in (0, 0xFFFFFFFF) else min(chunk_size, len(data) - body)
+            if format_tag == WAVE_FORMAT_PCM and bits == 16:
+                return WavLayout("pcm16", channels, sample_rate, body, size)
+            if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+                return WavLayout("float32", channels, sample_rate, body, size)
+            return None
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int] | None:
+    layout = parse_wav(data)
+    if layout is None or layout.channels < 1:
+        return None
+    dtype = PCM_ENCODINGS[layout.encoding]
+    samples = np.frombuffer(data, dtype=dtype, count=layout.size // dtype.itemsize, offset=layout.offset)
+    return _to_mono_float32(samples, layout.channels), layout.sample_rate
+
+
+def parse_content_type(content_type: str | None) -> Tuple[str, Dict[str, str]]:
+    if not content_type:
+        return "", {}
+    media_type, *params = content_type.split(";")
+    options = {}
+    for param in params:
+        key, _, value = param.partition("=")
+        options[key.strip().lower()] = value.strip().strip('"')
+    return media_type.strip().lower(), options
+
+
+def _checked_rate(sample_rate: int) -> int:
+    if sample_rate not in SAMPLE_RATES:
+        raise UnsupportedAudio(f"Unsupported sample rate {sample_rate} Hz, expected one of {SAMPLE_RATES}")
+    return sample_rate
+
+
+def decode_audio(data: bytes, content_type: str | None = None) -> Tuple[np.ndarray, int]:
+    media_type, options = parse_content_type(content_type)
+    if media_type == RAW_PCM_CONTENT_TYPE:
+        try:
+            sample_rate = int(options["rate"])
+            channels = int(options.get("channels", 1))
+        except (KeyError, ValueError):
+            raise UnsupportedAudio(f"{RAW_PCM_CONTENT_TYPE} uploads need rate=<Hz> and optional channels=<n>")
+        return decode_pcm(data, options.get("encoding", "pcm16"), channels), _checked_rate(sample_rate)
+    decoded = decode_wav(data)
+    if decoded is not None:
+        return decoded[0], _checked_rate(decoded[1])
+    # Anything the fast path does not cover (24-bit, A-law, FLAC, OGG...) goes through libsndfile.
+    try:
+        audio, sample_rate = sf.read(BytesIO(data), dtype="float32", always_2d=True)
+    except RuntimeError as exc:
+        raise UnsupportedAudio(f"Could not decode audio: {exc}") from exc
+    return _to_mono_float32(audio.reshape(-1), audio.shape[1]), _checked_rate(sample_rate)
+
+
+class PolyphaseFilter(NamedTuple):
+    up: int
+    down: int
+    taps: np.ndarray
+    skip: int
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(src_rate: int, dst_rate: int) -> PolyphaseFilter:
+    # Same Kaiser-windowed design as scipy.signal.resample_poly, computed once per rate pair.
+    divisor = gcd(src_rate, dst_rate)
+    up, down = dst_rate // divisor, src_rate // divisor
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * up
+    # Pre-pad so the filter delay lands on a whole output sample that can be skipped.
+    pre_pad = down - half_len % down
+    taps = np.concatenate((np.zeros(pre_pad), taps)).astype(np.float32)
+    taps.setflags(write=False)
+    return PolyphaseFilter(up, down, taps, (half_len + pre_pad) // down)
+
+
+def resample(audio: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    if src_rate == dst_rate:
+        return audio
+    up, down, taps, skip = polyphase_filter(src_rate, dst_rate)
+    n_out = -(-len(audio) * up // down)
+    return upfirdn(taps, audio, up, down)[skip:skip + n_out]
@@ -1,16 +1,36 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Generic, Hashable, Iterator, Optional, TypeVar
+import asyncio
+import hashlib
+import threading
+import time
 import uuid
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from passlib.context import CryptContext
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .db import get_db
+from .db import AsyncSessionLocal, SessionLocal
+from .metrics import metrics
 from .models import User
 from .settings import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+LOCAL_ISSUER = "tikun"
+
+# Hashes at any other cost count as outdated, so a changed TIKUN_BCRYPT_ROUNDS is applied
+# to each account at its next login, in either direction.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
 security = HTTPBearer(auto_error=False)
 
 
@@ -22,10 +42,77 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHashBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    # bcrypt runs on its own small pool instead of the shared Starlette threadpool, so a
+    # burst of logins queues here (and past max_pending is turned away) while requests
+    # that need the threadpool or the event loop keep flowing. bcrypt releases the GIL.
+    def __init__(self, context: CryptContext, workers: int, max_pending: int) -> None:
+        self.context = context
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0
+        self._rejected = metrics.counter("password_hash_rejected_total")
+        self._wait = metrics.histogram("password_hash_wait_ms")
+        self._duration = {op: metrics.histogram("password_hash_ms", op=op) for op in ("hash", "verify")}
+        metrics.gauge("password_hash_pending", fn=lambda: self._pending)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    @contextmanager
+    def _reserve(self) -> Iterator[None]:
+        if self._pending >= self.max_pending:
+            self._rejected.inc()
+            raise PasswordHashBusy()
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def _run(self, op: str, fn: Callable, *args):
+        with self._reserve():
+            queued = time.perf_counter()
+
+            def timed():
+                started = time.perf_counter()
+                self._wait.observe((started - queued) * 1000)
+                try:
+                    return fn(*args)
+                finally:
+                    self._duration[op].observe((time.perf_counter() - started) * 1000)
+
+            return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        # Returns (valid, replacement); replacement is a fresh hash at the configured cost
+        # when the stored one was made with another, otherwise None.
+        return await self._run("verify", self.context.verify_and_update, password, hashed_password)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(pwd_context, settings.password_hash_workers, settings.password_hash_max_pending)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iss": LOCAL_ISSUER})
     return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
@@ -49,16 +136,86 @@ def verify_local_token(token: str) -> Optional[dict]:
         return None
 
 
-def get_current_user(
-    request: Request,
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
-    token = credentials.credentials if credentials else None
-    if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing auth token")
+def verify_token(token: str) -> Optional[dict]:
+    # Pick the verifier from the unverified issuer instead of trying every secret in turn.
+    # Tokens minted before the local ``iss`` claim was added carry no issuer at all.
+    try:
+        issuer = jwt.get_unverified_claims(token).get("iss")
+    except JWTError:
+        return None
+    if issuer in (None, LOCAL_ISSUER):
+        return verify_local_token(token)
+    return verify_supabase_token(token)
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: K, value: V, ttl_seconds: float) -> None:
+        if ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
-    payload = verify_supabase_token(token) or verify_local_token(token)
+
+# Verified principals keyed by token hash, expiring no later than the token itself, and
+# detached user rows keyed by id. Together they let a hot request authenticate without
+# a jwt.decode or a database round-trip.
+principal_cache: TTLCache[str, str] = TTLCache(settings.auth_cache_max_entries)
+user_cache: TTLCache[str, User] = TTLCache(settings.auth_cache_max_entries)
+_principal_hits = metrics.counter("auth_cache_hits_total", cache="principal")
+_principal_misses = metrics.counter("auth_cache_misses_total", cache="principal")
+_user_hits = metrics.counter("auth_cache_hits_total", cache="user")
+_user_misses = metrics.counter("auth_cache_misses_total", cache="user")
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    user_cache.pop(target.id)
+
+
+def _token_user_id(token: str) -> str:
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    user_id = principal_cache.get(token_hash)
+    if user_id is not None:
+        _principal_hits.inc()
+        return user_id
+    _principal_misses.inc()
+
+    payload = verify_token(token)
     if not payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
@@ -66,11 +223,84 @@ def get_current_user(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
+    ttl = settings.auth_token_cache_ttl_seconds
+    if "exp" in payload:
+        ttl = min(ttl, float(payload["exp"]) - time.time())
+    principal_cache.set(token_hash, user_id, ttl)
+    return user_id
+
+
+def _remember(user: Optional[User]) -> Optional[User]:
+    if user is not None:
+        user_cache.set(user.id, user, settings.auth_user_cache_ttl_seconds)
+    return user
+
+
+def _load_user(user_id: str, db: Session) -> Optional[User]:
     user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        # Detach so the cached row can be shared across requests and sessions.
+        db.expunge(user)
+    return _remember(user)
+
+
+async def _load_user_async(user_id: str, db: AsyncSession) -> Optional[User]:
+    user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+    if user is not None:
+        db.expunge(user)
+    return _remember(user)
+
+
+def _cached_user(token: Optional[str]) -> tuple[str, Optional[User]]:
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing auth token")
+
+    user_id = _token_user_id(token)
+    user = user_cache.get(user_id)
+    if user is not None:
+        _user_hits.inc()
+    else:
+        _user_misses.inc()
+    return user_id, user
+
+
+def _user_not_found() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+
+def authenticate_token(token: Optional[str], db: Optional[Session] = None) -> User:
+    user_id, user = _cached_user(token)
+    if user is not None:
+        return user
+    if db is not None:
+        user = _load_user(user_id, db)
+    else:
+        with SessionLocal() as session:
+            user = _load_user(user_id, session)
     if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        raise _user_not_found()
+    return user
+
 
-    request.state.user_id = user_id
+async def authenticate_token_async(token: Optional[str]) -> User:
+    # Same as authenticate_token, but a cache miss awaits the async engine instead of
+    # blocking the event loop (or taking a threadpool slot) for the round-trip.
+    user_id, user = _cached_user(token)
+    if user is not None:
+        return user
+    async with AsyncSessionLocal() as session:
+        user = await _load_user_async(user_id, session)
+    if not user:
+        raise _user_not_found()
+    return user
+
+
+async def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> User:
+    user = await authenticate_token_async(credentials.credentials if credentials else None)
+    request.state.user_id = user.id
     return user
 
 
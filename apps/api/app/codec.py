@@ -0,0 +1,66 @@
+from __future__ import annotations
+import struct
+import numpy as np
+from typing import Sequence
+
+# Header: magic, format version, dtype code, dimension; int8 payloads are followed
+# by a float32 scale so the vector decodes as ``codes * scale``.
+HEADER = struct.Struct("<2sBBI")
+MAGIC = b"TE"
+FORMAT_VERSION = 1
+SCALE = struct.Struct("<f")
+
+DTYPE_CODES = {"float32": 0, "float16": 1, "int8": 2}
+CODE_DTYPES = {code: np.dtype(name) for name, code in DTYPE_CODES.items()}
+
+
+def encode_embedding(embedding: np.ndarray, dtype: str = "float32") -> bytes:
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype {dtype!r}, expected one of {tuple(DTYPE_CODES)}")
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], vector.size)
+    if dtype == "int8":
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return header + SCALE.pack(scale) + codes.tobytes()
+    return header + vector.astype(CODE_DTYPES[DTYPE_CODES[dtype]]).tobytes()
+
+
+def _read_header(blob: bytes) -> tuple[np.dtype, int, int]:
+    magic, version, code, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION or code not in CODE_DTYPES:
+        raise ValueError("Not an encoded embedding")
+    offset = HEADER.size + (SCALE.size if CODE_DTYPES[code] == np.int8 else 0)
+    return CODE_DTYPES[code], dim, offset
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    dtype, dim, offset = _read_header(blob)
+    vector = np.frombuffer(blob, dtype=dtype, count=dim, offset=offset)
+    if dtype == np.int8:
+        return vector.astype(np.float32) * SCALE.unpack_from(blob, HEADER.size)[0]
+    return vector.astype(np.float32)
+
+
+def decode_embeddings(blobs: Sequence[bytes]) -> np.ndarray:
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32)
+    first = bytes(blobs[0][: HEADER.size])
+    if any(len(blob) != len(blobs[0]) or blob[: HEADER.size] != first for blob in blobs):
+        return np.stack([decode_embedding(blob) for blob in blobs])
+    dtype, dim, offset = _read_header(first)
+    # Every row shares one header, so the rows form a fixed-stride byte matrix.
+    raw = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), -1)
+    matrix = raw[:, offset:].copy().view(dtype).astype(np.float32, copy=False)
+    if dtype == np.int8:
+        scales = raw[:, HEADER.size:offset].copy().view(np.float32)
+        matrix *= scales
+    return matrix
+
+
+def stack_embeddings(values: Sequence[bytes | list | None]) -> np.ndarray:
+    if all(isinstance(value, (bytes, memoryview)) for value in values):
+        return decode_embeddings([bytes(value) for value in values])
+    rows = [decode_embedding(bytes(value)) if isinstance(value, (bytes, memoryview)) else value for value in values]
+    return np.array(rows, dtype=np.float32)
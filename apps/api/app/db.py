@@ -1,22 +1,135 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .settings import settings
 
+DATABASE_PROFILES = ("default", "tuned")
+SQLITE_SYNCHRONOUS = ("OFF", "NORMAL", "FULL", "EXTRA")
+# Async driver used for each backend when the configured URL names a sync one.
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {},
-)
+def engine_options(url: str, profile: str) -> dict:
+    if profile not in DATABASE_PROFILES:
+        raise ValueError(f"Unknown database profile {profile!r}; expected one of {DATABASE_PROFILES}")
+    backend = make_url(url).get_backend_name()
+    if profile == "default":
+        return {"connect_args": {"check_same_thread": False}} if backend == "sqlite" else {}
+    options = {"query_cache_size": settings.database_statement_cache_size}
+    if backend == "sqlite":
+        # pysqlite's own lock timeout, so a writer waits for the lock instead of failing;
+        # the busy_timeout pragma below covers connections opened outside this engine too.
+        options["connect_args"] = {"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000}
+        return options
+    options.update(
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_max_overflow,
+        pool_recycle=settings.database_pool_recycle_seconds,
+        pool_timeout=settings.database_pool_timeout_seconds,
+        pool_pre_ping=settings.database_pool_pre_ping,
+        # Most recently returned connection first, so idle extras age out via pool_recycle
+        # and the server-side caches of the hot connections stay warm.
+        pool_use_lifo=True,
+    )
+    if make_url(url).get_driver_name() == "psycopg":
+        # psycopg 3 prepares a statement server-side after it ran this many times.
+        options["connect_args"] = {"prepare_threshold": 5}
+    return options
+
+
+def tune_sqlite(dbapi_connection, _record) -> None:
+    # WAL lets readers run next to the single writer and makes a commit one sequential
+    # append; synchronous=NORMAL only fsyncs at checkpoints, which in WAL mode can lose
+    # the last commits on power loss but never corrupts the database.
+    synchronous = settings.sqlite_synchronous.upper()
+    if synchronous not in SQLITE_SYNCHRONOUS:
+        raise ValueError(f"Unknown sqlite synchronous mode {synchronous!r}; expected one of {SQLITE_SYNCHRONOUS}")
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_mb * 1024)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_mb * 1024 * 1024)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.get_driver_name() != ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _tune(bind, profile: str) -> None:
+    # An in-memory database has no journal file to put in WAL mode.
+    if profile == "tuned" and bind.dialect.name == "sqlite" and bind.url.database not in (None, "", ":memory:"):
+        event.listen(bind, "connect", tune_sqlite)
+
+
+def build_engine(url: str, profile: str):
+    bind = create_engine(url, **engine_options(url, profile))
+    _tune(bind, profile)
+    return bind
+
+
+def build_async_engine(url: str, profile: str):
+    url = async_url(url)
+    options = engine_options(url, profile)
+    if make_url(url).get_backend_name() == "sqlite":
+        # aiosqlite runs each connection on its own thread already.
+        options.get("connect_args", {}).pop("check_same_thread", None)
+    bind = create_async_engine(url, **options)
+    _tune(bind.sync_engine, profile)
+    return bind
+
+
+engine = build_engine(settings.database_url, settings.database_profile)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Same database through an async driver, for handlers on the event loop. An in-memory
+# SQLite URL gets a separate database here; use a file when both paths are in play.
+async_engine = build_async_engine(settings.database_url, settings.database_profile)
+# Nothing is lazily loaded after a commit: that would need IO outside an await.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+class LazySession:
+    # Stands in for a Session and only opens one (and checks out a connection) on first
+    # use, so endpoints that return early, or answer from caches, never touch the pool.
+    def __init__(self, factory=SessionLocal) -> None:
+        self._factory = factory
+        self._session: Session | None = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
 
 def get_db():
-    db = SessionLocal()
+    db = LazySession()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    # An AsyncSession checks out a connection on its first await, so this is lazy as well.
+    async with AsyncSessionLocal() as db:
+        yield db
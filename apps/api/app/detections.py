@@ -0,0 +1,372 @@
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+import base64
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+from sqlalchemy import Select, and_, case, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+from .db import SessionLocal
+from .metrics import metrics, SIZE_BUCKETS
+from .ml import Prediction
+from .models import DetectionEvent, DetectionRollup, Sound
+from .settings import settings
+
+ROLLUP_RESOLUTIONS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+SUMMARY_DEFAULT_SPAN = {"minute": timedelta(hours=1), "hour": timedelta(days=1)}
+# A week of minutes; longer ranges should ask for hours.
+SUMMARY_MAX_BUCKETS = 7 * 24 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    moment = moment.replace(second=0, microsecond=0)
+    return moment.replace(minute=0) if resolution == "hour" else moment
+
+
+def utc_naive(moment: datetime) -> datetime:
+    # Timestamps are stored as naive UTC; aware query parameters are converted to match.
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def rollup_rows(events: Iterable[dict]) -> List[dict]:
+    totals: Dict[Tuple[str, str, datetime, str], List[float]] = {}
+    for event in events:
+        confidence = event["confidence"]
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (event["user_id"], resolution, bucket_start(event["created_at"], resolution), event["sound_id"] or "")
+            total = totals.get(key)
+            if total is None:
+                totals[key] = [1, confidence, confidence]
+            else:
+                total[0] += 1
+                total[1] += confidence
+                total[2] = max(total[2], confidence)
+    return [
+        {
+            "user_id": user_id,
+            "resolution": resolution,
+            "bucket": bucket,
+            "sound_id": sound_id,
+            "count": count,
+            "confidence_sum": confidence_sum,
+            "confidence_max": confidence_max,
+        }
+        for (user_id, resolution, bucket, sound_id), (count, confidence_sum, confidence_max) in totals.items()
+    ]
+
+
+def upsert_rollups(db: Session, rows: List[dict]) -> None:
+    if not rows:
+        return
+    table = DetectionRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        statement = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        excluded = statement.excluded
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[column.name for column in table.primary_key],
+                set_={
+                    "count": table.c.count + excluded.count,
+                    "confidence_sum": table.c.confidence_sum + excluded.confidence_sum,
+                    "confidence_max": case(
+                        (excluded.confidence_max > table.c.confidence_max, excluded.confidence_max),
+                        else_=table.c.confidence_max,
+                    ),
+                },
+            ),
+            rows,
+        )
+        return
+    for row in rows:
+        key = and_(*(column == row[column.name] for column in table.primary_key))
+        updated = db.execute(
+            table.update()
+            .where(key)
+            .values(
+                count=table.c.count + row["count"],
+                confidence_sum=table.c.confidence_sum + row["confidence_sum"],
+                confidence_max=case(
+                    (table.c.confidence_max < row["confidence_max"], row["confidence_max"]),
+                    else_=table.c.confidence_max,
+                ),
+            )
+        )
+        if not updated.rowcount:
+            db.execute(table.insert(), row)
+
+
+def encode_cursor(event: DetectionEvent) -> str:
+    raw = f"{event.created_at.isoformat()}|{event.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, event_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), event_id
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _keyset(query, cursor: str | None, limit: int):
+    # Keyset pagination on (created_at, id): each page is an index range scan that starts
+    # where the previous one ended, however deep the client has paged. Works on a Query
+    # and on a select() alike.
+    if cursor:
+        created_at, event_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                DetectionEvent.created_at < created_at,
+                and_(DetectionEvent.created_at == created_at, DetectionEvent.id < event_id),
+            )
+        )
+    return query.order_by(DetectionEvent.created_at.desc(), DetectionEvent.id.desc()).limit(limit + 1)
+
+
+def _page(events: List[DetectionEvent], limit: int) -> Tuple[List[DetectionEvent], str | None]:
+    if len(events) > limit:
+        return events[:limit], encode_cursor(events[limit - 1])
+    return events, None
+
+
+def history_page(query: Query, cursor: str | None, limit: int) -> Tuple[List[DetectionEvent], str | None]:
+    return _page(_keyset(query, cursor, limit).all(), limit)
+
+
+async def history_page_async(
+    db: AsyncSession, statement: Select, cursor: str | None, limit: int
+) -> Tuple[List[DetectionEvent], str | None]:
+    return _page(list((await db.scalars(_keyset(statement, cursor, limit))).all()), limit)
+
+
+def _summary_window(resolution: str, since: datetime | None, until: datetime | None) -> Tuple[datetime, datetime]:
+    until = utc_naive(until) if until else datetime.utcnow()
+    since = utc_naive(since) if since else until - SUMMARY_DEFAULT_SPAN[resolution]
+    if since >= until:
+        raise ValueError("since must be before until")
+    if (until - since) / ROLLUP_RESOLUTIONS[resolution] > SUMMARY_MAX_BUCKETS:
+        raise ValueError(f"At most {SUMMARY_MAX_BUCKETS} {resolution} buckets per request")
+    return since, until
+
+
+def _summary_statements(user_id: str, resolution: str, since: datetime, until: datetime) -> Tuple[Select, Select]:
+    rollups = (
+        select(
+            DetectionRollup.bucket,
+            DetectionRollup.sound_id,
+            DetectionRollup.count,
+            DetectionRollup.confidence_sum,
+            DetectionRollup.confidence_max,
+        )
+        .where(
+            DetectionRollup.user_id == user_id,
+            DetectionRollup.resolution == resolution,
+            DetectionRollup.bucket >= bucket_start(since, resolution),
+            DetectionRollup.bucket < until,
+        )
+        .order_by(DetectionRollup.bucket, DetectionRollup.sound_id)
+    )
+    return rollups, select(Sound.id, Sound.name).where(Sound.user_id == user_id)
+
+
+def _summary(resolution: str, since: datetime, until: datetime, rollups: Iterable, names: Dict[str, str]) -> dict:
+    totals: Dict[str, int] = {}
+    buckets = []
+    for bucket, sound_id, count, confidence_sum, confidence_max in rollups:
+        totals[sound_id] = totals.get(sound_id, 0) + count
+        buckets.append({
+            "start": bucket,
+            "sound_id": sound_id or None,
+            "count": count,
+            "max_confidence": confidence_max,
+            "mean_confidence": confidence_sum / count if count else 0.0,
+        })
+    sounds = [
+        {"sound_id": sound_id or None, "sound_name": names.get(sound_id), "count": count}
+        for sound_id, count in sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    ]
+    return {"resolution": resolution, "since": since, "until": until, "buckets": buckets, "sounds": sounds}
+
+
+def summarize(db: Session, user_id: str, resolution: str, since: datetime | None, until: datetime | None) -> dict:
+    since, until = _summary_window(resolution, since, until)
+    rollups, names = _summary_statements(user_id, resolution, since, until)
+    return _summary(resolution, since, until, db.execute(rollups).all(), dict(db.execute(names).all()))
+
+
+async def summarize_async(
+    db: AsyncSession, user_id: str, resolution: str, since: datetime | None, until: datetime | None
+) -> dict:
+    since, until = _summary_window(resolution, since, until)
+    rollups, names = _summary_statements(user_id, resolution, since, until)
+    return _summary(resolution, since, until, (await db.execute(rollups)).all(), dict((await db.execute(names)).all()))
+
+
+class DetectionSink:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int,
+        flush_interval_ms: float,
+        max_queue: int,
+        below_threshold_sample_rate: float,
+    ) -> None:
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.below_threshold_sample_rate = below_threshold_sample_rate
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._written = metrics.counter("detections_written_total")
+        self._sampled_out = metrics.counter("detections_dropped_total", reason="below_threshold")
+        self._overflow = metrics.counter("detections_dropped_total", reason="queue_full")
+        self._lost = metrics.counter("detections_dropped_total", reason="flush_failed")
+        self._rejected = metrics.counter("detections_dropped_total", reason="integrity_error")
+        self._flush_failures = metrics.counter("detection_flush_failures_total")
+        self._flush_size = metrics.histogram("detection_flush_size", buckets=SIZE_BUCKETS)
+        self._flush_latency = metrics.histogram("detection_flush_ms")
+        metrics.gauge("detection_queue_depth", fn=self._queue.qsize)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, user_id: str, prediction: Prediction, detected: bool) -> bool:
+        if not detected and random.random() >= self.below_threshold_sample_rate:
+            self._sampled_out.inc()
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait({
+                "user_id": user_id,
+                "sound_id": prediction.sound_id,
+                "confidence": prediction.confidence,
+                "created_at": datetime.utcnow(),
+                "detected": detected,
+            })
+        except queue.Full:
+            self._overflow.inc()
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            rows: List[dict] = []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                return 0
+            started = time.perf_counter()
+            try:
+                self._write(rows)
+            except IntegrityError:
+                # Some row can never be written (its sound was deleted after it was queued,
+                # say) and would fail every retry of the batch, so rows go one at a time and
+                # only the bad ones are dropped.
+                rows = self._write_each(rows)
+            except Exception:
+                self._flush_failures.inc()
+                self._requeue(rows)
+                raise
+            self._flush_latency.observe((time.perf_counter() - started) * 1000)
+            self._flush_size.observe(len(rows))
+            self._written.inc(len(rows))
+            return len(rows)
+
+    def flush_for_read(self) -> None:
+        # History and summary reads flush first so they include the latest detections, but a
+        # failed flush keeps its rows queued for the writer and the read serves what is committed.
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Detection flush before a read failed; %d detections still queued", self.depth)
+
+    def _write(self, rows: List[dict]) -> None:
+        # Sampled below-threshold predictions are kept as raw events for tuning, but only
+        # real detections count towards the rollups that summaries report.
+        events = [{key: value for key, value in row.items() if key != "detected"} for row in rows]
+        with self.session_factory() as db:
+            db.execute(insert(DetectionEvent), events)
+            upsert_rollups(db, rollup_rows(row for row in rows if row["detected"]))
+            db.commit()
+
+    def _write_each(self, rows: List[dict]) -> List[dict]:
+        written = []
+        for index, row in enumerate(rows):
+            try:
+                self._write([row])
+            except IntegrityError as exc:
+                self._rejected.inc()
+                logger.warning("Dropped a detection for user %s that cannot be stored: %s", row["user_id"], exc.orig)
+                continue
+            except Exception:
+                self._flush_failures.inc()
+                self._requeue(rows[index:])
+                raise
+            written.append(row)
+        return written
+
+    def _requeue(self, rows: List[dict]) -> None:
+        # The failed batch goes back for the next flush, up to the queue bound; whatever no
+        # longer fits is dropped like any other overflow, but counted separately.
+        for index, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                lost = len(rows) - index
+                self._lost.inc(lost)
+                logger.error("Dropped %d detections after a failed flush: queue full", lost)
+                return
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="detection-sink", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Detection flush failed; %d detections queued for retry", self.depth)
+
+    def close(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+detection_sink = DetectionSink(
+    SessionLocal,
+    settings.detection_batch_size,
+    settings.detection_flush_interval_ms,
+    settings.detection_max_queue,
+    settings.detection_below_threshold_sample_rate,
+)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Sequence, Tuple
+from .ml import Prediction, UserClassifier
+from .streaming import HOP_SECONDS, PATCH_SECONDS
+
+
+@dataclass
+class SoundEvent:
+    sound_id: str
+    sound_name: str | None
+    onset: float
+    offset: float | None
+    confidence: float
+
+    def prediction(self) -> Prediction:
+        return Prediction(label=self.sound_id, sound_id=self.sound_id, sound_name=self.sound_name, confidence=self.confidence)
+
+    def relative_to(self, start: float) -> dict:
+        # Tracker times run from the tracker's first frame; responses count from the chunk.
+        event = asdict(self)
+        event["onset"] = round(self.onset - start, 3)
+        event["offset"] = None if self.offset is None else round(self.offset - start, 3)
+        return event
+
+
+class SoundTracker:
+    # Per-sound hysteresis over per-frame scores. A sound starts once it reaches its
+    # detection threshold for attack_frames frames in a row and ends once it stays below
+    # that threshold minus hysteresis for release_frames frames, so one knock spanning
+    # two overlapping patches is one event and a wobbling score does not flap.
+    def __init__(self, attack_frames: int = 1, release_frames: int = 1, hysteresis: float = 0.05) -> None:
+        self.attack_frames = max(1, attack_frames)
+        self.release_frames = max(1, release_frames)
+        self.hysteresis = hysteresis
+        self.frames = 0
+        self.labels: List[str | None] = []
+        self._above = np.zeros(0, dtype=np.int32)
+        self._below = np.zeros(0, dtype=np.int32)
+        self._active = np.zeros(0, dtype=bool)
+        self._peak = np.zeros(0, dtype=np.float32)
+        self._open: Dict[str, SoundEvent] = {}
+
+    def _align(self, classes: Sequence[str | None]) -> None:
+        # Rebuilds and new sounds can reorder or extend the classifier's classes; state
+        # follows the labels, and events of sounds that disappeared are dropped.
+        if list(classes) == self.labels:
+            return
+        index = {label: code for code, label in enumerate(self.labels)}
+        previous = np.array([index.get(label, -1) for label in classes], dtype=np.int64)
+        known = previous >= 0
+
+        def remap(values: np.ndarray) -> np.ndarray:
+            aligned = np.zeros(len(classes), dtype=values.dtype)
+            aligned[known] = values[previous[known]]
+            return aligned
+
+        self._above, self._below = remap(self._above), remap(self._below)
+        self._active, self._peak = remap(self._active), remap(self._peak)
+        self.labels = list(classes)
+        present = set(self.labels)
+        self._open = {label: event for label, event in self._open.items() if label in present}
+
+    def update(self, classifier: UserClassifier, scores: np.ndarray) -> Tuple[List[SoundEvent], List[SoundEvent]]:
+        self._align(classifier.classes)
+        enter = classifier.thresholds()
+        leave = enter - self.hysteresis
+        started: List[SoundEvent] = []
+        ended: List[SoundEvent] = []
+        for row in scores:
+            frame = self.frames
+            self.frames += 1
+            self._above = np.where(row >= enter, self._above + 1, 0)
+            self._below = np.where(row >= leave, 0, self._below + 1)
+            self._peak = np.where(self._active, np.maximum(self._peak, row), self._peak)
+            for code in np.flatnonzero(~self._active & (self._above >= self.attack_frames)):
+                label = self.labels[code]
+                self._active[code] = True
+                self._peak[code] = row[code]
+                event = SoundEvent(
+                    sound_id=label,
+                    sound_name=classifier.names.get(label),
+                    onset=round((frame - self.attack_frames + 1) * HOP_SECONDS, 3),
+                    offset=None,
+                    confidence=float(row[code]),
+                )
+                self._open[label] = event
+                started.append(event)
+            for code in np.flatnonzero(self._active & (self._below >= self.release_frames)):
+                self._active[code] = False
+                event = self._open.pop(self.labels[code], None)
+                if event is not None:
+                    # Ends with the last patch that was still above the release threshold.
+                    event.offset = round((frame - self.release_frames) * HOP_SECONDS + PATCH_SECONDS, 3)
+                    event.confidence = float(self._peak[code])
+                    ended.append(event)
+        if self._open:
+            codes = {label: code for code, label in enumerate(self.labels)}
+            for label, event in self._open.items():
+                event.confidence = float(self._peak[codes[label]])
+        return started, ended
+
+
+class SoundTrackers:
+    # One tracker per user for chunked /api/infer/frames, so hysteresis and debounce carry
+    # across chunk boundaries and a sound spanning several short chunks is one onset.
+    # A rebuilt classifier (new version) starts a fresh tracker. Bounded LRU like
+    # ActivityGates; streaming connections keep their own tracker instead.
+    def __init__(self, max_users: int, factory: Callable[[], SoundTracker]) -> None:
+        self.max_users = max_users
+        self.factory = factory
+        self._trackers: OrderedDict[str, Tuple[int, SoundTracker]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, version: int) -> SoundTracker:
+        with self._lock:
+            entry = self._trackers.get(user_id)
+            if entry is None or entry[0] != version:
+                entry = self._trackers[user_id] = (version, self.factory())
+                if len(self._trackers) > self.max_users:
+                    self._trackers.popitem(last=False)
+            self._trackers.move_to_end(user_id)
+            return entry[1]
@@ -0,0 +1,283 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, FrozenSet, Iterator, List, Sequence, Tuple
+
+EMBEDDING_DTYPE = np.float32
+LABEL_DTYPE = np.int32
+
+Stamp = Tuple[int, int, int]
+
+
+@dataclass
+class IndexSnapshot:
+    version: int
+    generation: int
+    embeddings: np.ndarray
+    labels: List[str | None]
+    names: Dict[str, str] = field(default_factory=dict)
+    sensitivities: Dict[str, float] = field(default_factory=dict)
+    removed: FrozenSet[str] = frozenset()
+
+
+# Per-user on-disk index: an append-only float32 matrix, an int32 label array and
+# a meta.json recording how many rows are committed. Rows land before meta.json is
+# atomically replaced, so readers mapping ``count`` rows always see a consistent
+# prefix. Full rewrites go to a new generation so existing mappings stay valid.
+# Removed sounds are tombstoned in meta.json and compacted away by a rewrite once
+# their rows exceed compact_ratio of the index.
+class ClassifierStore:
+    def __init__(self, root: str, compact_ratio: float = 0.2) -> None:
+        self.root = root
+        self.compact_ratio = compact_ratio
+        self._held = threading.local()
+
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id)
+
+    def _meta_path(self, user_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), "meta.json")
+
+    def _data_paths(self, user_id: str, generation: int) -> Tuple[str, str]:
+        base = self._user_dir(user_id)
+        return (
+            os.path.join(base, f"embeddings.{generation}.f32"),
+            os.path.join(base, f"labels.{generation}.i32"),
+        )
+
+    def _quantizers_path(self, user_id: str, generation: int) -> str:
+        return os.path.join(self._user_dir(user_id), f"ann.{generation}.npz")
+
+    @contextmanager
+    def locked(self, user_id: str) -> Iterator[None]:
+        # Re-entrant per thread, so callers can hold the lock around their own work
+        # (a DB commit, a DB snapshot) and still call append/write inside it.
+        held = self._held.__dict__.setdefault("users", set())
+        if user_id in held:
+            yield
+            return
+        os.makedirs(self._user_dir(user_id), exist_ok=True)
+        with open(os.path.join(self._user_dir(user_id), ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            held.add(user_id)
+            try:
+                yield
+            finally:
+                held.discard(user_id)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, user_id: str) -> dict | None:
+        try:
+            with open(self._meta_path(user_id)) as meta_file:
+                return json.load(meta_file)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, user_id: str, meta: dict) -> None:
+        path = self._meta_path(user_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, path)
+
+    def stamp(self, user_id: str) -> Stamp | None:
+        try:
+            stat = os.stat(self._meta_path(user_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def load(self, user_id: str) -> IndexSnapshot | None:
+        meta = self._read_meta(user_id)
+        if meta is None:
+            return None
+        count, dim = meta["count"], meta["dim"]
+        snapshot = IndexSnapshot(
+            version=meta["version"],
+            generation=meta["generation"],
+            embeddings=np.zeros((0, dim), dtype=EMBEDDING_DTYPE),
+            labels=[],
+            names=meta["names"],
+            sensitivities=meta.get("sensitivities", {}),
+            removed=frozenset(meta.get("removed", ())),
+        )
+        if count:
+            embeddings_path, labels_path = self._data_paths(user_id, meta["generation"])
+            snapshot.embeddings = np.memmap(embeddings_path, dtype=EMBEDDING_DTYPE, mode="r", shape=(count, dim))
+            codes = np.memmap(labels_path, dtype=LABEL_DTYPE, mode="r", shape=(count,))
+            classes = meta["classes"]
+            snapshot.labels = [classes[code] for code in codes]
+        return snapshot
+
+    def load_quantizers(self, user_id: str, generation: int) -> Dict[str, np.ndarray] | None:
+        try:
+            with np.load(self._quantizers_path(user_id, generation)) as archive:
+                return dict(archive)
+        except FileNotFoundError:
+            return None
+
+    def save_quantizers(self, user_id: str, generation: int, quantizers: Dict[str, np.ndarray]) -> None:
+        # Trained ANN quantizers of a generation, so other workers (and restarts) only
+        # re-encode rows instead of training again. Replaced atomically like meta.json.
+        with self.locked(user_id):
+            meta = self._read_meta(user_id)
+            # A rewrite since training started has removed this generation's files.
+            if meta is None or meta["generation"] != generation:
+                return
+            path = self._quantizers_path(user_id, generation)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as quantizers_file:
+                np.savez(quantizers_file, **quantizers)
+            os.replace(tmp_path, path)
+
+    def write(
+        self,
+        user_id: str,
+        embeddings: np.ndarray,
+        labels: Sequence[str | None],
+        names: Dict[str, str],
+        sensitivities: Dict[str, float] | None = None,
+    ) -> int:
+        with self.locked(user_id):
+            return self._write_unlocked(user_id, embeddings, labels, names, sensitivities or {})
+
+    def _write_unlocked(
+        self,
+        user_id: str,
+        embeddings: np.ndarray,
+        labels: Sequence[str | None],
+        names: Dict[str, str],
+        sensitivities: Dict[str, float],
+    ) -> int:
+        embeddings = np.ascontiguousarray(embeddings, dtype=EMBEDDING_DTYPE)
+        previous = self._read_meta(user_id)
+        generation = previous["generation"] + 1 if previous else 0
+        dim = embeddings.shape[1] if len(embeddings) else (previous["dim"] if previous else 0)
+        classes = list(dict.fromkeys(labels))
+        class_codes = {label: code for code, label in enumerate(classes)}
+        codes = np.array([class_codes[label] for label in labels], dtype=LABEL_DTYPE)
+        embeddings_path, labels_path = self._data_paths(user_id, generation)
+        embeddings.tofile(embeddings_path)
+        codes.tofile(labels_path)
+        version = previous["version"] + 1 if previous else 1
+        self._write_meta(user_id, {
+            "version": version,
+            "generation": generation,
+            "count": len(labels),
+            "dim": dim,
+            "classes": classes,
+            "names": dict(names),
+            "sensitivities": dict(sensitivities),
+        })
+        if previous:
+            for path in (*self._data_paths(user_id, previous["generation"]), self._quantizers_path(user_id, previous["generation"])):
+                if os.path.exists(path):
+                    os.remove(path)
+        return version
+
+    def append(
+        self,
+        user_id: str,
+        embedding: np.ndarray,
+        label: str | None,
+        name: str | None = None,
+        sensitivity: float | None = None,
+    ) -> int:
+        return self.append_many(
+            user_id,
+            np.asarray(embedding).reshape(1, -1),
+            [label],
+            {label: name} if label and name else {},
+            {label: sensitivity} if label and sensitivity is not None else {},
+        )
+
+    def append_many(
+        self,
+        user_id: str,
+        embeddings: np.ndarray,
+        labels: Sequence[str | None],
+        names: Dict[str, str] | None = None,
+        sensitivities: Dict[str, float] | None = None,
+    ) -> int:
+        rows = np.ascontiguousarray(embeddings, dtype=EMBEDDING_DTYPE).reshape(len(labels), -1)
+        with self.locked(user_id):
+            meta = self._read_meta(user_id)
+            if meta is None:
+                meta = {"version": 0, "generation": 0, "count": 0, "dim": rows.shape[1], "classes": [], "names": {}}
+            meta.setdefault("sensitivities", {})
+            if not len(labels):
+                return meta["version"]
+            if meta["count"] and meta["dim"] != rows.shape[1]:
+                raise ValueError(f"Embedding has {rows.shape[1]} dims, index for user {user_id} has {meta['dim']}")
+            for label in labels:
+                if label not in meta["classes"]:
+                    meta["classes"].append(label)
+            meta["names"].update(names or {})
+            meta["sensitivities"].update(sensitivities or {})
+            class_codes = {label: code for code, label in enumerate(meta["classes"])}
+            codes = np.array([class_codes[label] for label in labels], dtype=LABEL_DTYPE)
+            embeddings_path, labels_path = self._data_paths(user_id, meta["generation"])
+            # Truncate any rows left behind by a writer that died before updating meta.json.
+            with open(embeddings_path, "ab") as embeddings_file:
+                embeddings_file.truncate(meta["count"] * rows.shape[1] * rows.itemsize)
+                embeddings_file.write(rows.tobytes())
+            with open(labels_path, "ab") as labels_file:
+                labels_file.truncate(meta["count"] * np.dtype(LABEL_DTYPE).itemsize)
+                labels_file.write(codes.tobytes())
+            meta["count"] += len(labels)
+            meta["dim"] = rows.shape[1]
+            meta["version"] += 1
+            self._write_meta(user_id, meta)
+        return meta["version"]
+
+    def update_sound(self, user_id: str, label: str, name: str, sensitivity: float) -> None:
+        with self.locked(user_id):
+            meta = self._read_meta(user_id)
+            if meta is None:
+                return
+            sensitivities = meta.setdefault("sensitivities", {})
+            if meta["names"].get(label) == name and sensitivities.get(label) == sensitivity:
+                return
+            meta["names"][label] = name
+            sensitivities[label] = sensitivity
+            meta["version"] += 1
+            self._write_meta(user_id, meta)
+
+    def remove_label(self, user_id: str, label: str) -> None:
+        with self.locked(user_id):
+            meta = self._read_meta(user_id)
+            if meta is None or (label not in meta["classes"] and label not in meta["names"]):
+                return
+            removed = meta.setdefault("removed", [])
+            if label in removed:
+                return
+            meta["names"].pop(label, None)
+            meta.setdefault("sensitivities", {}).pop(label, None)
+            if label in meta["classes"]:
+                _, labels_path = self._data_paths(user_id, meta["generation"])
+                code = meta["classes"].index(label)
+                codes = np.memmap(labels_path, dtype=LABEL_DTYPE, mode="r", shape=(meta["count"],)) if meta["count"] else []
+                dead = meta.get("dead", 0) + int(np.count_nonzero(np.asarray(codes) == code))
+                if dead > self.compact_ratio * meta["count"]:
+                    self._compact(user_id, meta, set(removed) | {label})
+                    return
+                removed.append(label)
+                meta["dead"] = dead
+            meta["version"] += 1
+            self._write_meta(user_id, meta)
+
+    def _compact(self, user_id: str, meta: dict, removed: set) -> None:
+        snapshot = self.load(user_id)
+        keep = [index for index, row_label in enumerate(snapshot.labels) if row_label not in removed]
+        self._write_unlocked(
+            user_id,
+            snapshot.embeddings[keep],
+            [snapshot.labels[index] for index in keep],
+            meta["names"],
+            meta["sensitivities"],
+        )
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import json
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+ARCHIVE_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed", "application/x-tar", "application/gzip")
+MANIFEST_NAME = "manifest.json"
+
+
+class BundleError(ValueError):
+    pass
+
+
+@dataclass
+class Clip:
+    filename: str
+    data: bytes | None = None
+    content_type: str | None = None
+    sound_id: str | None = None
+    label: str | None = None
+    error: str | None = None
+
+
+def is_archive(filename: str | None, content_type: str | None) -> bool:
+    name = (filename or "").lower()
+    return name.endswith(ARCHIVE_SUFFIXES) or (content_type or "").split(";")[0].strip() in ARCHIVE_CONTENT_TYPES
+
+
+def _skip_member(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base or base.startswith(".") or name.startswith("__MACOSX/")
+
+
+def _iter_zip(fileobj: BinaryIO) -> Iterator[Tuple[str, int, BinaryIO]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or _skip_member(info.filename):
+                continue
+            with archive.open(info) as member:
+                yield info.filename, info.file_size, member
+
+
+def _iter_tar(fileobj: BinaryIO) -> Iterator[Tuple[str, int, BinaryIO]]:
+    # Stream mode reads members in order without seeking, so the spooled upload is read once.
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for info in archive:
+            if not info.isfile() or _skip_member(info.name):
+                continue
+            member = archive.extractfile(info)
+            if member is not None:
+                yield info.name, info.size, member
+
+
+def read_archive(
+    fileobj: BinaryIO,
+    filename: str,
+    max_clip_bytes: int,
+    max_total_bytes: int,
+    max_clips: int,
+) -> Tuple[List[Clip], Dict[str, dict] | None]:
+    members = _iter_zip(fileobj) if filename.lower().endswith(".zip") or zipfile.is_zipfile(fileobj) else _iter_tar(fileobj)
+    fileobj.seek(0)
+    clips: List[Clip] = []
+    manifest = None
+    total = 0
+    try:
+        for name, size, member in members:
+            if os.path.basename(name) == MANIFEST_NAME:
+                manifest = parse_manifest(member.read(max_clip_bytes + 1))
+                continue
+            if len(clips) >= max_clips:
+                raise BundleError(f"Bundle has more than {max_clips} clips")
+            # Declared sizes can lie, so the read itself is bounded too.
+            data = member.read(max_clip_bytes + 1) if size <= max_clip_bytes else b""
+            if size > max_clip_bytes or len(data) > max_clip_bytes:
+                clips.append(Clip(filename=name, error="File too large"))
+                continue
+            total += len(data)
+            if total > max_total_bytes:
+                raise BundleError("Bundle too large")
+            clips.append(Clip(filename=name, data=data))
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as exc:
+        raise BundleError(f"Could not read {filename}: {exc}") from exc
+    return clips, manifest
+
+
+def parse_manifest(raw: bytes | str) -> Dict[str, dict]:
+    try:
+        manifest = json.loads(raw)
+    except ValueError as exc:
+        raise BundleError(f"Invalid manifest: {exc}") from exc
+    if not isinstance(manifest, dict) or not all(isinstance(entry, dict) for entry in manifest.values()):
+        raise BundleError('Manifest must map file names to {"sound_id": ..., "label": ...}')
+    return manifest
+
+
+def apply_manifest(clips: List[Clip], manifest: Dict[str, dict], sound_id: str | None, label: str) -> None:
+    for clip in clips:
+        entry = manifest.get(clip.filename) or manifest.get(os.path.basename(clip.filename)) or {}
+        clip.sound_id = entry.get("sound_id", sound_id)
+        clip.label = entry.get("label", label)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from .codec import stack_embeddings
+from .db import SessionLocal
+from .metrics import metrics
+from .ml import ModelRegistry, model_registry
+from .models import Sound, TrainingSample
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RebuildJob:
+    user_id: str
+    reason: str = "manual"
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"
+    samples: int | None = None
+    sounds: int | None = None
+    version: int | None = None
+    error: str | None = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("rebuilt", "failed")
+
+
+def rebuild_user_index(db: Session, registry: ModelRegistry, user_id: str) -> tuple[int, int, int]:
+    # Holding the index lock across the snapshot and the rewrite orders this rebuild
+    # against train uploads, which commit and append under the same lock: every sample
+    # lands either in this snapshot or as an append to the new generation, never both.
+    with registry.store.locked(user_id):
+        # Samples of deleted sounds are skipped until maintenance garbage-collects them.
+        samples = (
+            db.query(TrainingSample.sound_id, TrainingSample.embedding_blob, TrainingSample.embedding)
+            .outerjoin(Sound, Sound.id == TrainingSample.sound_id)
+            .filter(TrainingSample.user_id == user_id)
+            .filter(or_(TrainingSample.sound_id.is_(None), Sound.id.is_not(None)))
+            .all()
+        )
+        sounds = db.query(Sound.id, Sound.name, Sound.sensitivity).filter(Sound.user_id == user_id).all()
+        embeddings = stack_embeddings([blob if blob is not None else legacy for _, blob, legacy in samples])
+        labels = [sound_id for sound_id, _, _ in samples]
+        with metrics.stage("index_write").time():
+            version = registry.store.write(
+                user_id,
+                embeddings,
+                labels,
+                {sound.id: sound.name for sound in sounds},
+                {sound.id: sound.sensitivity for sound in sounds},
+            )
+    return len(samples), len(sounds), version
+
+
+class RebuildQueue:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        registry: ModelRegistry,
+        workers: int,
+        history: int,
+        auto_after_samples: int,
+    ) -> None:
+        self.session_factory = session_factory
+        self.registry = registry
+        self.workers = max(1, workers)
+        self.history = history
+        self.auto_after_samples = auto_after_samples
+        self._queue: queue.Queue[RebuildJob | None] = queue.Queue()
+        self._jobs: OrderedDict[str, RebuildJob] = OrderedDict()
+        self._queued: Dict[str, RebuildJob] = {}
+        self._new_samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._coalesced = metrics.counter("rebuild_jobs_coalesced_total")
+        self._completed = metrics.counter("rebuild_jobs_total", status="rebuilt")
+        self._failed = metrics.counter("rebuild_jobs_total", status="failed")
+        self._duration = metrics.histogram("rebuild_job_ms")
+        metrics.gauge("rebuild_queue_depth", fn=self._queue.qsize)
+
+    def submit(self, user_id: str, reason: str = "manual") -> RebuildJob:
+        with self._lock:
+            self._new_samples.pop(user_id, None)
+            # A queued job has not taken its snapshot yet, so it already covers this request.
+            # A running one may have, so a fresh job is queued behind it instead.
+            job = self._queued.get(user_id)
+            if job is not None:
+                self._coalesced.inc()
+                return job
+            job = RebuildJob(user_id=user_id, reason=reason)
+            self._queued[user_id] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if not oldest.finished:
+                    break
+                del self._jobs[oldest_id]
+        self._ensure_started()
+        self._queue.put(job)
+        return job
+
+    def note_samples(self, user_id: str, count: int = 1) -> RebuildJob | None:
+        if self.auto_after_samples <= 0:
+            return None
+        with self._lock:
+            pending = self._new_samples.get(user_id, 0) + count
+            self._new_samples[user_id] = pending
+        if pending >= self.auto_after_samples:
+            return self.submit(user_id, reason="auto")
+        return None
+
+    def get(self, job_id: str) -> RebuildJob | None:
+        return self._jobs.get(job_id)
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"rebuild-{index}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if self._queued.get(job.user_id) is job:
+                    del self._queued[job.user_id]
+            self.run(job)
+
+    def run(self, job: RebuildJob) -> RebuildJob:
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            with self.session_factory() as db:
+                job.samples, job.sounds, job.version = rebuild_user_index(db, self.registry, job.user_id)
+            # Build the new classifier here so requests never pay for the refit; they keep
+            # using the previous one until this swap.
+            self.registry.get_classifier(job.user_id, wait=True)
+            job.status = "rebuilt"
+            self._completed.inc()
+        except Exception as exc:
+            job.status = "failed"
+            job.error = str(exc) or exc.__class__.__name__
+            self._failed.inc()
+            logger.exception("Rebuild job %s for user %s failed", job.id, job.user_id)
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._duration.observe((time.perf_counter() - started) * 1000)
+            job.done.set()
+        return job
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self._threads = []
+
+
+rebuild_queue = RebuildQueue(
+    SessionLocal,
+    model_registry,
+    settings.rebuild_workers,
+    settings.rebuild_job_history,
+    settings.rebuild_after_samples,
+)
@@ -1,15 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status, Request
+from fastapi import FastAPI, Depends, Header, HTTPException, UploadFile, File, Form, Query, Response, status, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from datetime import datetime
-
-from .db import Base, engine, get_db
-from .models import User, Sound, TrainingSample, DetectionEvent
+from typing import List, Optional
+import asyncio
+import hmac
+import threading
+import numpy as np
+
+from .db import Base, async_engine, engine, get_async_db, get_db
+from .detections import ROLLUP_RESOLUTIONS, detection_sink, history_page_async, summarize_async
+from .frames import SoundTracker, SoundTrackers
+from .jobs import rebuild_queue
+from .maintenance import maintenance
+from .ingest import BundleError, Clip, apply_manifest, is_archive, parse_manifest, read_archive
+from .models import User, Sound, TrainingSample, DetectionEvent, RetentionPolicy, uuid_str
 from .schemas import (
     UserCreate,
     UserLogin,
@@ -19,24 +32,80 @@ from .schemas import (
     SoundOut,
     SoundListOut,
     PredictionOut,
+    FramePredictionOut,
+    GateStatsOut,
     TrainSampleOut,
-    TrainRebuildOut,
+    TrainBatchItemOut,
+    TrainBatchOut,
+    RebuildJobOut,
     DetectionOut,
+    DetectionSummaryOut,
+    RetentionOut,
+    RetentionUpdate,
     HealthOut,
+    ReadyOut,
 )
 from .auth import (
-    hash_password,
-    verify_password,
+    PasswordHashBusy,
+    password_hasher,
     create_token_for_user,
+    authenticate_token_async,
     get_current_user,
     generate_token,
 )
 from .settings import settings
-from .ml import load_audio, model_registry
+from .audio import PCM_ENCODINGS, UnsupportedAudio, decode_pcm
+from .codec import encode_embedding
+from .ml import YAMNET_SAMPLE_RATE, UserClassifier, activity_gates, model_registry
+from .metrics import MetricsMiddleware, metrics
+from .pipeline import PipelineBusy, pipeline
+from .profiling import profiler
+from .streaming import HOP_SECONDS, ListenStream
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Tikun API", version="0.1.0")
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+CLASSIFY_STAGE = metrics.stage("classify")
+
+
+_warmup_stop = threading.Event()
+
+
+def warm_up_models() -> None:
+    # Retried with backoff: with TIKUN_EMBEDDING_BACKEND=remote the workers may start
+    # before the model server, and /ready should recover once it is up.
+    delay = 1.0
+    while True:
+        try:
+            model_registry.warm_up(pipeline.warm_up, local=pipeline.mode != "process")
+            return
+        except Exception as exc:
+            print(f"[MODEL] warm-up failed, retrying in {delay:.0f}s: {exc!r}")
+        if _warmup_stop.wait(delay):
+            return
+        delay = min(delay * 2, 30.0)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers while the model loads; /ready
+    # only turns 200 once a synthetic inference has gone through every path.
+    if settings.warmup_on_startup:
+        _warmup_stop.clear()
+        threading.Thread(target=warm_up_models, name="model-warmup", daemon=True).start()
+    maintenance.start()
+    yield
+    _warmup_stop.set()
+    maintenance.close()
+    profiler.stop()
+    rebuild_queue.close()
+    detection_sink.close()
+    pipeline.close()
+    password_hasher.close()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Tikun API", version="0.1.0", lifespan=lifespan)
 
 limiter = Limiter(key_func=get_remote_address, default_limits=[f"{settings.rate_limit_per_minute}/minute"])
 app.state.limiter = limiter
@@ -47,7 +116,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"] ,
     allow_headers=["*"] ,
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.exception_handler(RateLimitExceeded)
@@ -55,35 +126,104 @@ async def rate_limit_handler(request, exc):
     return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"})
 
 
+@app.exception_handler(UnsupportedAudio)
+async def unsupported_audio_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(PipelineBusy)
+async def pipeline_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Inference queue full"}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(PasswordHashBusy)
+async def password_hash_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Too many sign-ins in progress"}, headers={"Retry-After": "1"})
+
+
 @app.get("/health", response_model=HealthOut)
 async def health():
     return {"status": "ok", "embedding_backend": settings.embedding_backend}
 
 
+@app.get("/ready", response_model=ReadyOut, responses={503: {"model": ReadyOut}})
+async def ready():
+    readiness = model_registry.readiness()
+    if model_registry.ready or not settings.warmup_on_startup:
+        return readiness
+    return JSONResponse(status_code=503, content=readiness)
+
+
+@app.get("/metrics")
+async def metrics_snapshot(format: str = "prometheus"):
+    if format == "json":
+        return metrics.snapshot()
+    return PlainTextResponse(metrics.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def require_profiler(x_debug_token: Optional[str] = Header(None)) -> None:
+    # Stack samples expose code paths and arguments, so the endpoints stay hidden unless a
+    # shared token is configured as well, and every call has to present it.
+    if not settings.profiler_enabled or not settings.profiler_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token.encode(), settings.profiler_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+@app.get("/debug/profiler", dependencies=[Depends(require_profiler)])
+async def profiler_status():
+    return profiler.report()
+
+
+@app.post("/debug/profiler/start", dependencies=[Depends(require_profiler)])
+async def profiler_start(interval_ms: float | None = None):
+    if not profiler.start(interval_ms or settings.profiler_interval_ms):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return profiler.report()
+
+
+@app.post("/debug/profiler/stop", dependencies=[Depends(require_profiler)])
+async def profiler_stop():
+    await asyncio.to_thread(profiler.stop)
+    return PlainTextResponse(profiler.collapsed())
+
+
+# bcrypt runs on password_hasher's own pool and the queries on the async engine, so an
+# auth burst neither blocks the event loop nor takes threadpool slots from other requests.
+# Each handler ends its read transaction before hashing, so a queued login does not hold
+# a pooled connection for the whole wait.
 @app.post("/api/auth/signup", response_model=AuthResponse)
-def signup(payload: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == payload.email).first()
+async def signup(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = (await db.scalars(select(User).where(User.email == payload.email))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
+    await db.commit()
     token = generate_token()
     user = User(
         email=payload.email,
-        hashed_password=hash_password(payload.password),
+        hashed_password=await password_hasher.hash(payload.password),
         is_verified=False,
         verification_token=token,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     print(f"[EMAIL] Verify account for {user.email}: http://localhost:3000/verify?token={token}")
     return {"access_token": create_token_for_user(user)}
 
 
 @app.post("/api/auth/login", response_model=AuthResponse)
-def login(payload: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.scalars(select(User).where(User.email == payload.email))).first()
+    if not user:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    await db.commit()
+    valid, upgraded = await password_hasher.verify(payload.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if upgraded:
+        user.hashed_password = upgraded
+        await db.commit()
     if not user.is_verified:
         raise HTTPException(status_code=403, detail="Email not verified")
     return {"access_token": create_token_for_user(user)}
@@ -113,19 +253,20 @@ def forgot_password(email: str = Form(...), db: Session = Depends(get_db)):
 
 
 @app.post("/api/auth/reset")
-def reset_password(token: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.reset_token == token).first()
+async def reset_password(token: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.scalars(select(User).where(User.reset_token == token))).first()
     if not user:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user.hashed_password = hash_password(password)
+    await db.commit()
+    user.hashed_password = await password_hasher.hash(password)
     user.reset_token = None
-    db.commit()
+    await db.commit()
     return {"status": "updated"}
 
 
 @app.get("/api/sounds", response_model=SoundListOut)
-async def list_sounds(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    sounds = db.query(Sound).filter(Sound.user_id == current_user.id).all()
+async def list_sounds(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    sounds = (await db.scalars(select(Sound).where(Sound.user_id == current_user.id))).all()
     return {"sounds": sounds}
 
 
@@ -152,6 +293,7 @@ async def update_sound(
         setattr(sound, key, value)
     db.commit()
     db.refresh(sound)
+    model_registry.store.update_sound(current_user.id, sound.id, sound.name, sound.sensitivity)
     return sound
 
 
@@ -160,8 +302,15 @@ async def delete_sound(sound_id: str, current_user: User = Depends(get_current_u
     sound = db.query(Sound).filter(Sound.id == sound_id, Sound.user_id == current_user.id).first()
     if not sound:
         raise HTTPException(status_code=404, detail="Sound not found")
+    db.query(TrainingSample).filter(TrainingSample.sound_id == sound_id).delete(synchronize_session=False)
+    # Past detections stay in the history as unknown sounds, and the foreign key no longer
+    # blocks the delete (Postgres enforces it; SQLite does not by default).
+    db.query(DetectionEvent).filter(DetectionEvent.user_id == current_user.id, DetectionEvent.sound_id == sound_id).update(
+        {DetectionEvent.sound_id: None}, synchronize_session=False
+    )
     db.delete(sound)
     db.commit()
+    model_registry.store.remove_label(current_user.id, sound_id)
     return {"status": "deleted"}
 
 
@@ -176,39 +325,161 @@ async def train_sample(
     data = await file.read()
     if len(data) > settings.max_upload_mb * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File too large")
-    audio, sample_rate = load_audio(data)
-    embedding = model_registry.embedder.extract(audio, sample_rate)
+    embedding = await pipeline.embed(data, file.content_type)
     sample = TrainingSample(
         user_id=current_user.id,
         sound_id=sound_id,
         type=label,
-        embedding=embedding.tolist(),
+        embedding_blob=encode_embedding(embedding, settings.embedding_storage_dtype),
     )
-    db.add(sample)
-    db.commit()
-    db.refresh(sample)
+
+    def persist() -> None:
+        # The sound lookup is sync database IO too, so it runs here rather than on the event loop.
+        sound = db.query(Sound).filter(Sound.id == sound_id, Sound.user_id == current_user.id).first() if sound_id else None
+        sound_name, sensitivity = (sound.name, sound.sensitivity) if sound else (None, None)
+        # Commit and append under the index lock so a background rebuild sees each sample exactly once.
+        with model_registry.store.locked(current_user.id):
+            with metrics.stage("db_write").time():
+                db.add(sample)
+                db.commit()
+                db.refresh(sample)
+            with metrics.stage("index_append").time():
+                model_registry.store.append(current_user.id, embedding, sound_id, sound_name, sensitivity)
+
+    await asyncio.to_thread(persist)
+    rebuild_queue.note_samples(current_user.id)
     return TrainSampleOut(id=sample.id, sound_id=sample.sound_id, type=sample.type, created_at=sample.created_at.isoformat())
 
 
-@app.post("/api/train/rebuild", response_model=TrainRebuildOut)
-async def rebuild(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    samples = db.query(TrainingSample).filter(TrainingSample.user_id == current_user.id).all()
-    sounds = db.query(Sound).filter(Sound.user_id == current_user.id).all()
-    sound_map = {sound.id: sound.name for sound in sounds}
+@app.post("/api/train/samples:batch", response_model=TrainBatchOut)
+async def train_samples_batch(
+    files: List[UploadFile] = File(...),
+    sound_id: Optional[str] = Form(None),
+    label: str = Form("positive"),
+    manifest: Optional[str] = Form(None),
+    update_classifier: bool = Form(True),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    max_clip_bytes = settings.max_upload_mb * 1024 * 1024
+    max_total_bytes = settings.train_batch_max_mb * 1024 * 1024
+    clips: List[Clip] = []
+    labels_by_file = {}
+    try:
+        if manifest:
+            labels_by_file.update(parse_manifest(manifest))
+        for upload in files:
+            if is_archive(upload.filename, upload.content_type):
+                bundled, bundled_manifest = await asyncio.to_thread(
+                    read_archive,
+                    upload.file,
+                    upload.filename or "bundle",
+                    max_clip_bytes,
+                    max_total_bytes - sum(len(clip.data or b"") for clip in clips),
+                    settings.train_batch_max_clips - len(clips),
+                )
+                clips.extend(bundled)
+                labels_by_file.update(bundled_manifest or {})
+                continue
+            if len(clips) >= settings.train_batch_max_clips:
+                raise BundleError(f"Batch has more than {settings.train_batch_max_clips} clips")
+            data = await upload.read()
+            if len(data) > max_clip_bytes:
+                clips.append(Clip(filename=upload.filename or "", error="File too large"))
+            else:
+                clips.append(Clip(filename=upload.filename or "", data=data, content_type=upload.content_type))
+            if sum(len(clip.data or b"") for clip in clips) > max_total_bytes:
+                raise BundleError("Batch too large")
+    except BundleError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    apply_manifest(clips, labels_by_file, sound_id, label)
+
+    sounds = await asyncio.to_thread(
+        lambda: {sound.id: sound for sound in db.query(Sound).filter(Sound.user_id == current_user.id).all()}
+    )
+    for clip in clips:
+        if clip.error is None and clip.sound_id is not None and clip.sound_id not in sounds:
+            clip.error = "Sound not found"
+    pending = [clip for clip in clips if clip.error is None]
+    results = await pipeline.embed_many([(clip.data, clip.content_type) for clip in pending])
+
+    rows = []
     embeddings = []
-    labels = []
-    names = []
-    for sample in samples:
-        embeddings.append(sample.embedding)
-        labels.append(sample.sound_id)
-        names.append(sound_map.get(sample.sound_id))
-    if embeddings:
-        import numpy as np
-
-        model_registry.get_classifier(current_user.id).fit(np.array(embeddings), labels, names)
-    else:
-        model_registry.get_classifier(current_user.id).fit([], [], [])
-    return {"samples": len(samples), "sounds": len(sounds), "status": "rebuilt"}
+    created_at = datetime.utcnow()
+    for clip, result in zip(pending, results):
+        clip.data = None
+        if isinstance(result, UnsupportedAudio):
+            clip.error = str(result)
+        elif isinstance(result, Exception):
+            clip.error = "Could not embed clip"
+        else:
+            rows.append({
+                "id": uuid_str(),
+                "user_id": current_user.id,
+                "sound_id": clip.sound_id,
+                "type": clip.label,
+                "embedding_blob": encode_embedding(result, settings.embedding_storage_dtype),
+                "created_at": created_at,
+            })
+            embeddings.append(result)
+    if rows:
+        labels = [row["sound_id"] for row in rows]
+        used = {sound_id for sound_id in labels if sound_id}
+        names = {sound_id: sounds[sound_id].name for sound_id in used}
+        sensitivities = {sound_id: sounds[sound_id].sensitivity for sound_id in used}
+
+        def persist() -> None:
+            with model_registry.store.locked(current_user.id):
+                with metrics.stage("db_write").time():
+                    db.execute(insert(TrainingSample), rows)
+                    db.commit()
+                if update_classifier:
+                    with metrics.stage("index_append").time():
+                        model_registry.store.append_many(
+                            current_user.id, np.stack(embeddings), labels, names, sensitivities
+                        )
+
+        await asyncio.to_thread(persist)
+        if update_classifier:
+            rebuild_queue.note_samples(current_user.id, len(rows))
+
+    row_iter = iter(rows)
+    samples = []
+    for clip in clips:
+        if clip.error is not None:
+            samples.append(TrainBatchItemOut(filename=clip.filename, status="error", sound_id=clip.sound_id, error=clip.error))
+            continue
+        row = next(row_iter)
+        samples.append(TrainBatchItemOut(filename=clip.filename, status="ok", id=row["id"], sound_id=row["sound_id"], type=row["type"]))
+    return TrainBatchOut(
+        accepted=len(rows),
+        rejected=len(clips) - len(rows),
+        classifier_updated=bool(rows) and update_classifier,
+        samples=samples,
+    )
+
+
+@app.post("/api/train/rebuild", response_model=RebuildJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild(current_user: User = Depends(get_current_user)):
+    return rebuild_queue.submit(current_user.id)
+
+
+@app.get("/api/train/jobs/{job_id}", response_model=RebuildJobOut)
+async def rebuild_job(job_id: str, wait: float = 0.0, current_user: User = Depends(get_current_user)):
+    job = rebuild_queue.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait > 0 and not job.finished:
+        await asyncio.to_thread(job.done.wait, min(wait, 30.0))
+    return job
+
+
+# Returned for chunks the activity gate skips; nothing is written for them.
+SKIPPED_PREDICTION = {"sound_id": None, "sound_name": None, "confidence": 0.0, "label": "unknown", "skipped": True}
+
+
+def user_gate(user_id: str):
+    return activity_gates.get(user_id) if settings.gate_enabled else None
 
 
 @app.post("/api/infer", response_model=PredictionOut)
@@ -217,22 +488,17 @@ async def infer(
     request: Request,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
 ):
     data = await file.read()
     if len(data) > settings.max_upload_mb * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File too large")
-    audio, sample_rate = load_audio(data)
-    embedding = model_registry.embedder.extract(audio, sample_rate)
-    prediction = model_registry.get_classifier(current_user.id).predict(embedding)
-    detection = DetectionEvent(
-        user_id=current_user.id,
-        sound_id=prediction.sound_id,
-        confidence=prediction.confidence,
-        created_at=datetime.utcnow(),
-    )
-    db.add(detection)
-    db.commit()
+    embedding = await pipeline.embed(data, file.content_type, user_gate(current_user.id))
+    if embedding is None:
+        return SKIPPED_PREDICTION
+    classifier = await model_registry.get_classifier_async(current_user.id)
+    with CLASSIFY_STAGE.time():
+        prediction = classifier.predict(embedding)
+    detection_sink.submit(current_user.id, prediction, classifier.is_detection(prediction))
     return {
         "sound_id": prediction.sound_id,
         "sound_name": prediction.sound_name,
@@ -241,13 +507,204 @@ async def infer(
     }
 
 
+def sound_tracker() -> SoundTracker:
+    return SoundTracker(settings.detection_attack_frames, settings.detection_release_frames, settings.detection_hysteresis)
+
+
+sound_trackers = SoundTrackers(settings.detection_tracker_max_users, sound_tracker)
+
+
+@app.post("/api/infer/frames", response_model=FramePredictionOut)
+@limiter.limit(f"{settings.rate_limit_per_minute}/minute")
+async def infer_frames(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+):
+    # Classifies every 0.96 s YAMNet patch (0.48 s hop) instead of the clip mean, so a
+    # short sound at the edge of a chunk is not diluted and reports its own onset.
+    data = await file.read()
+    if len(data) > settings.max_upload_mb * 1024 * 1024:
+        raise HTTPException(status_code=400, detail="File too large")
+    embeddings = await pipeline.embed_frames(data, file.content_type, user_gate(current_user.id))
+    if embeddings is None:
+        return {"frames": 0, "detections": [], "skipped": True}
+    classifier = await model_registry.get_classifier_async(current_user.id)
+    with CLASSIFY_STAGE.time():
+        # The user's tracker continues from the previous chunk, so a sound that is still
+        # present does not start (and get written) again.
+        tracker = sound_trackers.get(current_user.id, classifier.version)
+        start = tracker.frames * HOP_SECONDS
+        events, _ = tracker.update(classifier, classifier.frame_scores(embeddings))
+    for event in events:
+        detection_sink.submit(current_user.id, event.prediction(), True)
+    return {"frames": len(embeddings), "detections": [event.relative_to(start) for event in events]}
+
+
+@app.get("/api/infer/gate", response_model=GateStatsOut)
+async def gate_stats(current_user: User = Depends(get_current_user)):
+    stats = activity_gates.stats(current_user.id)
+    gate = activity_gates.peek(current_user.id)
+    return {
+        "enabled": settings.gate_enabled,
+        "chunks": stats.chunks,
+        "skipped": stats.skipped,
+        "skip_rate": stats.skip_rate,
+        "noise_floor_db": gate.floor_db if gate is not None else None,
+    }
+
+
 @app.get("/api/detections", response_model=list[DetectionOut])
-async def detections(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    events = (
-        db.query(DetectionEvent)
-        .filter(DetectionEvent.user_id == current_user.id)
-        .order_by(DetectionEvent.created_at.desc())
-        .limit(50)
-        .all()
-    )
+async def detections(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sound_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # The sink writes through the sync engine, so its flush runs off the event loop.
+    await asyncio.to_thread(detection_sink.flush_for_read)
+    statement = select(DetectionEvent).where(DetectionEvent.user_id == current_user.id)
+    if sound_id:
+        statement = statement.where(DetectionEvent.sound_id == sound_id)
+    try:
+        events, next_cursor = await history_page_async(db, statement, cursor, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return events
+
+
+def retention_out(policy: RetentionPolicy | None) -> dict:
+    if policy is None:
+        return {"days": settings.detection_retention_days, "default": True}
+    return {"days": policy.detection_days, "default": False}
+
+
+@app.get("/api/detections/retention", response_model=RetentionOut)
+async def get_retention(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    return retention_out(await db.get(RetentionPolicy, current_user.id))
+
+
+@app.put("/api/detections/retention", response_model=RetentionOut)
+async def set_retention(
+    payload: RetentionUpdate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)
+):
+    policy = await db.get(RetentionPolicy, current_user.id)
+    if payload.days is None:
+        if policy is not None:
+            await db.delete(policy)
+            await db.commit()
+        return retention_out(None)
+    if not 1 <= payload.days <= settings.detection_retention_max_days:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {settings.detection_retention_max_days}")
+    if policy is None:
+        policy = RetentionPolicy(user_id=current_user.id, detection_days=payload.days)
+        db.add(policy)
+    else:
+        policy.detection_days = payload.days
+    await db.commit()
+    return retention_out(policy)
+
+
+@app.get("/api/detections/summary", response_model=DetectionSummaryOut)
+async def detection_summary(
+    resolution: str = Query("hour", pattern=f"^({'|'.join(ROLLUP_RESOLUTIONS)})$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await asyncio.to_thread(detection_sink.flush_for_read)
+    try:
+        return await summarize_async(db, current_user.id, resolution, since, until)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+async def send_events(
+    websocket: WebSocket,
+    user_id: str,
+    tracker: SoundTracker,
+    classifier: UserClassifier,
+    embeddings: List[np.ndarray | None],
+) -> None:
+    # Patches skipped by the activity gate score zero, which also releases active sounds.
+    scored = [index for index, embedding in enumerate(embeddings) if embedding is not None]
+    scores = np.zeros((len(embeddings), len(classifier.classes)), dtype=np.float32)
+    with CLASSIFY_STAGE.time():
+        if scored:
+            scores[scored] = classifier.frame_scores(np.stack([embeddings[index] for index in scored]))
+        started, ended = tracker.update(classifier, scores)
+    for event in started:
+        detection_sink.submit(user_id, event.prediction(), True)
+        await websocket.send_json({"type": "onset", **asdict(event)})
+    for event in ended:
+        await websocket.send_json({"type": "offset", **asdict(event)})
+
+
+@app.websocket("/ws/listen")
+async def listen(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        start = await websocket.receive_json()
+        user = await authenticate_token_async(start.get("token"))
+    except HTTPException as exc:
+        await websocket.close(code=4401, reason=exc.detail)
+        return
+    except (ValueError, KeyError, AttributeError):
+        await websocket.close(code=1003, reason="Expected a JSON start message")
+        return
+    encoding = start.get("encoding", "float32")
+    if start.get("sample_rate", YAMNET_SAMPLE_RATE) != YAMNET_SAMPLE_RATE or encoding not in PCM_ENCODINGS:
+        await websocket.close(code=1003, reason=f"Send {YAMNET_SAMPLE_RATE} Hz mono {'/'.join(PCM_ENCODINGS)} frames")
+        return
+
+    # "frames" mode scores each patch on its own and reports onset/offset events instead
+    # of one smoothed prediction per patch.
+    tracker = sound_tracker() if start.get("mode") == "frames" else None
+    context_patches = 1 if tracker is not None else settings.stream_context_patches
+    gate = activity_gates.connection(user.id) if settings.gate_enabled else None
+    stream = ListenStream(None, context_patches, settings.stream_buffer_seconds, gate)
+    connections = metrics.gauge("stream_connections")
+    connections.inc()
+    await websocket.send_json({"type": "ready", "sample_rate": YAMNET_SAMPLE_RATE, "encoding": encoding})
+    try:
+        while True:
+            frame = await websocket.receive_bytes()
+            if len(frame) > settings.max_upload_mb * 1024 * 1024:
+                await websocket.close(code=1009, reason="Frame too large")
+                return
+            try:
+                results = await pipeline.embed_stream(stream, decode_pcm(frame, encoding))
+            except PipelineBusy:
+                # A dropped frame would silently leave a gap in the timeline, so the client
+                # is told to reconnect later instead.
+                await websocket.close(code=1013, reason="Server busy, try again later")
+                return
+            classifier = await model_registry.get_classifier_async(user.id)
+            if tracker is not None:
+                if results:
+                    await send_events(websocket, user.id, tracker, classifier, [embedding for _, embedding in results])
+                continue
+            for end_seconds, embedding in results:
+                if embedding is None:
+                    await websocket.send_json({"type": "prediction", "time": round(end_seconds, 3), **SKIPPED_PREDICTION})
+                    continue
+                with CLASSIFY_STAGE.time():
+                    prediction = classifier.predict(embedding)
+                detection_sink.submit(user.id, prediction, classifier.is_detection(prediction))
+                await websocket.send_json({
+                    "type": "prediction",
+                    "time": round(end_seconds, 3),
+                    "sound_id": prediction.sound_id,
+                    "sound_name": prediction.sound_name,
+                    "confidence": prediction.confidence,
+                    "label": prediction.label,
+                })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connections.dec()
@@ -0,0 +1,286 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterator, List
+from sqlalchemy import Engine, delete, exists, func, select, text
+from sqlalchemy.orm import Session
+from .db import SessionLocal, engine
+from .metrics import metrics
+from .models import DetectionEvent, DetectionRollup, RetentionPolicy, Sound, TrainingSample, User
+from .settings import settings
+
+# pg_try_advisory_lock key shared by every API process, so one of them runs a pass.
+ADVISORY_LOCK_KEY = 0x74696B756E
+PARTITION_PREFIX = "detection_events_p"
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+    months = moment.year * 12 + moment.month - 1 + offset
+    return datetime(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def create_partitions(conn, first: datetime, last: datetime) -> List[str]:
+    created = []
+    month = month_start(first)
+    while month <= last:
+        following = month_start(month, 1)
+        name = partition_name(month)
+        exists_already = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+        if not exists_already:
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF detection_events "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+            ))
+            created.append(name)
+        month = following
+    return created
+
+
+class Maintenance:
+    # Periodic housekeeping for the tables that only ever grow: expires raw detection
+    # events per user (their counts are already in detection_rollups, written with the
+    # events), expires minute rollups (hourly ones stay), deletes training samples of
+    # sounds that no longer exist and, on a partitioned Postgres table, keeps monthly
+    # partitions ahead of time and drops expired ones whole. Deletes go by primary key in
+    # batches of batch_size, each its own short transaction, with a pause in between so
+    # request traffic can take the write lock.
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        bind: Engine,
+        interval_minutes: float,
+        batch_size: int,
+        pause_ms: float,
+        lock_path: str,
+    ) -> None:
+        self.session_factory = session_factory
+        self.engine = bind
+        self.interval = interval_minutes * 60.0
+        self.batch_size = max(1, batch_size)
+        self.pause = pause_ms / 1000.0
+        self.lock_path = lock_path
+        self.users_total = 0
+        self.users_done = 0
+        self.last_run: dict | None = None
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._deleted = {
+            name: metrics.counter("maintenance_rows_deleted_total", table=name)
+            for name in ("detection_events", "detection_rollups", "training_samples")
+        }
+        self._partitions_dropped = metrics.counter("maintenance_partitions_dropped_total")
+        self._runs = metrics.counter("maintenance_runs_total")
+        self._duration = metrics.histogram("maintenance_run_ms", buckets=(100, 1000, 10_000, 60_000, 600_000, 3_600_000))
+        self._last_finished = 0.0
+        metrics.gauge("maintenance_users_total", fn=lambda: self.users_total)
+        metrics.gauge("maintenance_users_done", fn=lambda: self.users_done)
+        metrics.gauge("maintenance_last_run_timestamp", fn=lambda: self._last_finished)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[bool]:
+        if self.engine.dialect.name == "postgresql":
+            with self.engine.connect() as conn:
+                acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+                try:
+                    yield bool(acquired)
+                finally:
+                    if acquired:
+                        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            return
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _delete_batches(self, table_name: str, ids_query) -> int:
+        table = {"detection_events": DetectionEvent, "training_samples": TrainingSample}[table_name]
+        deleted = 0
+        while not self._stopping.is_set():
+            with self.session_factory() as db:
+                ids = db.execute(ids_query.limit(self.batch_size)).scalars().all()
+                if not ids:
+                    break
+                db.execute(delete(table).where(table.id.in_(ids)))
+                db.commit()
+            deleted += len(ids)
+            self._deleted[table_name].inc(len(ids))
+            if len(ids) < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return deleted
+
+    def collect_orphans(self) -> int:
+        # Samples of deleted sounds would otherwise be loaded (and dropped) by every rebuild.
+        orphaned = select(TrainingSample.id).where(
+            TrainingSample.sound_id.is_not(None),
+            ~exists().where(Sound.id == TrainingSample.sound_id),
+        )
+        return self._delete_batches("training_samples", orphaned)
+
+    def expire_detections(self, now: datetime) -> tuple[int, int]:
+        with self.session_factory() as db:
+            users = db.execute(
+                select(User.id, RetentionPolicy.detection_days).outerjoin(RetentionPolicy, RetentionPolicy.user_id == User.id)
+            ).all()
+        self.users_total, self.users_done = len(users), 0
+        minute_cutoff = now - timedelta(days=settings.rollup_minute_retention_days)
+        events = rollups = 0
+        for user_id, days in users:
+            if self._stopping.is_set():
+                break
+            days = days or settings.detection_retention_days
+            if days > 0:
+                # (user_id, created_at) range on the composite index, oldest first.
+                expired = (
+                    select(DetectionEvent.id)
+                    .where(DetectionEvent.user_id == user_id, DetectionEvent.created_at < now - timedelta(days=days))
+                    .order_by(DetectionEvent.created_at)
+                )
+                events += self._delete_batches("detection_events", expired)
+            if settings.rollup_minute_retention_days > 0:
+                rollups += self._expire_minute_rollups(user_id, minute_cutoff)
+            self.users_done += 1
+        return events, rollups
+
+    def _expire_minute_rollups(self, user_id: str, cutoff: datetime) -> int:
+        # The rollup key has no single id column, so deletes walk one day of buckets at a time.
+        deleted = 0
+        with self.session_factory() as db:
+            oldest = db.execute(
+                select(func.min(DetectionRollup.bucket)).where(
+                    DetectionRollup.user_id == user_id, DetectionRollup.resolution == "minute"
+                )
+            ).scalar()
+        while oldest is not None and oldest < cutoff and not self._stopping.is_set():
+            upper = min(oldest + timedelta(days=1), cutoff)
+            with self.session_factory() as db:
+                result = db.execute(
+                    delete(DetectionRollup).where(
+                        DetectionRollup.user_id == user_id,
+                        DetectionRollup.resolution == "minute",
+                        DetectionRollup.bucket < upper,
+                    )
+                )
+                db.commit()
+            deleted += result.rowcount
+            self._deleted["detection_rollups"].inc(result.rowcount)
+            oldest = upper
+            time.sleep(self.pause)
+        return deleted
+
+    def maintain_partitions(self, now: datetime) -> dict:
+        # Only for a detection_events table converted with scripts.migrate_detections --partition.
+        if self.engine.dialect.name != "postgresql":
+            return {}
+        with self.engine.begin() as conn:
+            partitioned = conn.execute(text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('detection_events'))"
+            )).scalar()
+            if not partitioned:
+                return {}
+            created = create_partitions(conn, now, month_start(now, settings.maintenance_partition_months_ahead))
+            longest = conn.execute(select(func.max(RetentionPolicy.detection_days))).scalar() or 0
+            dropped = []
+            if settings.detection_retention_days > 0:
+                # A partition goes once every user's retention has passed its last day;
+                # shorter per-user retention inside it is left to the batched deletes.
+                horizon = now - timedelta(days=max(settings.detection_retention_days, longest))
+                names = conn.execute(text(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = to_regclass('detection_events')"
+                )).scalars().all()
+                for name in sorted(names):
+                    if not name.startswith(PARTITION_PREFIX):
+                        continue
+                    month = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m")
+                    if month_start(month, 1) <= horizon:
+                        conn.execute(text(f"DROP TABLE {name}"))
+                        dropped.append(name)
+            self._partitions_dropped.inc(len(dropped))
+        return {"created": created, "dropped": dropped}
+
+    def optimize(self) -> None:
+        if self.engine.dialect.name == "sqlite":
+            # Lets SQLite refresh planner statistics for tables that changed a lot; freed
+            # pages are reused by later inserts, so the file stops growing.
+            with self.engine.connect() as conn:
+                conn.execute(text("PRAGMA optimize"))
+
+    def run_once(self, now: datetime | None = None) -> dict:
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        with self._exclusive() as acquired:
+            if not acquired:
+                return {"skipped": "another process is running maintenance"}
+            partitions = self.maintain_partitions(now)
+            samples = self.collect_orphans()
+            events, rollups = self.expire_detections(now)
+            self.optimize()
+        elapsed = time.perf_counter() - started
+        self._runs.inc()
+        self._duration.observe(elapsed * 1000)
+        self._last_finished = time.time()
+        self.last_run = {
+            "finished_at": datetime.utcnow().isoformat(),
+            "seconds": round(elapsed, 3),
+            "deleted": {"detection_events": events, "detection_rollups": rollups, "training_samples": samples},
+            "partitions": partitions,
+        }
+        return self.last_run
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as exc:
+                print(f"[MAINTENANCE] run failed: {exc!r}")
+
+    def close(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+
+maintenance = Maintenance(
+    SessionLocal,
+    engine,
+    settings.maintenance_interval_minutes,
+    settings.maintenance_batch_size,
+    settings.maintenance_pause_ms,
+    os.path.join(settings.index_dir, ".maintenance.lock"),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one maintenance pass (retention, orphan GC, partitions).")
+    parser.parse_args()
+    print(json.dumps(maintenance.run_once(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+from __future__ import annotations
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    0.5, 1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 400, 600, 1000, 2500, 5000, 10000,
+)
+SIZE_BUCKETS: Tuple[float, ...] = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Counter:
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"value": self._value}
+
+
+class Gauge:
+    def __init__(self, fn: Callable[[], float] | None = None) -> None:
+        self._value = 0.0
+        self._fn = fn
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return float(self._fn()) if self._fn else self._value
+
+    def snapshot(self) -> dict:
+        return {"value": self.value}
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS) -> None:
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def cumulative(self) -> Tuple[List[Tuple[float, int]], float, int]:
+        with self._lock:
+            counts = list(self._counts)
+            total_sum, total = self._sum, self._count
+        running = 0
+        buckets = []
+        for upper, count in zip([*self.buckets, math.inf], counts):
+            running += count
+            buckets.append((upper, running))
+        return buckets, total_sum, total
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            observed_max = self._max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else observed_max
+                upper = min(upper, observed_max)
+                fraction = (rank - cumulative) / count
+                return lower + (upper - lower) * fraction
+            cumulative += count
+        return observed_max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self._count,
+            "sum": round(self._sum, 4),
+            "mean": round(self._sum / self._count, 4) if self._count else 0.0,
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self._max, 4),
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe((time.perf_counter() - self.started) * 1000)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[Tuple[str, LabelKey], object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, labels: Dict[str, object], factory: Callable[[], object]):
+        key = (name, _label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = factory()
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get_or_create(name, labels, Counter)
+
+    def gauge(self, name: str, fn: Callable[[], float] | None = None, **labels) -> Gauge:
+        return self._get_or_create(name, labels, lambda: Gauge(fn))
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS_MS, **labels) -> Histogram:
+        return self._get_or_create(name, labels, lambda: Histogram(buckets))
+
+    def _sorted_items(self) -> list:
+        with self._lock:
+            return sorted(self._metrics.items(), key=lambda item: item[0])
+
+    def stage(self, name: str) -> Histogram:
+        return self.histogram("stage_ms", stage=name)
+
+    def snapshot(self) -> dict:
+        result: Dict[str, list] = {}
+        for (name, label_key), metric in self._sorted_items():
+            entry = {"labels": dict(label_key), **metric.snapshot()}
+            result.setdefault(name, []).append(entry)
+        return result
+
+    def render_prometheus(self, prefix: str = "tikun_") -> str:
+        families: Dict[str, list] = {}
+        for (name, label_key), metric in self._sorted_items():
+            families.setdefault(name, []).append((dict(label_key), metric))
+        lines: List[str] = []
+        for name, members in families.items():
+            full_name = prefix + name
+            kind = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}[type(members[0][1])]
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, metric in members:
+                if isinstance(metric, Histogram):
+                    buckets, total_sum, total = metric.cumulative()
+                    for upper, count in buckets:
+                        bucket_labels = _format_labels({**labels, "le": _format_value(upper)})
+                        lines.append(f"{full_name}_bucket{bucket_labels} {count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(total_sum)}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {total}")
+                else:
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    def __init__(self, app, registry: MetricsRegistry = metrics) -> None:
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Label by route template, not raw path, so ids in URLs don't explode cardinality.
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.registry.histogram("http_request_ms", route=path).observe(elapsed_ms)
+            self.registry.counter(
+                "http_requests_total", method=scope["method"], route=path, status=status_code
+            ).inc()
@@ -1,14 +1,38 @@
 from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+import asyncio
+import copy
 import hashlib
+import logging
+import os
+import queue
+import threading
+import time
 import numpy as np
-import soundfile as sf
-import resampy
-from io import BytesIO
-from sklearn.neighbors import NearestNeighbors
-from typing import List, Tuple
+from typing import Callable, Dict, List, Sequence, Tuple
+from .ann import ENCODE_CHUNK, IVFPQIndex
+from .artifacts import artifacts
+from .audio import decode_audio, resample
+from .index_store import ClassifierStore, Stamp
+from .metrics import metrics, SIZE_BUCKETS
 from .settings import settings
 
+logger = logging.getLogger(__name__)
+
+YAMNET_SAMPLE_RATE = 16000
+YAMNET_PATCH_SAMPLES = 15360
+YAMNET_HOP_SAMPLES = 7680
+# The last STFT frame of a patch reaches 240 samples past the 0.96 s window.
+YAMNET_PATCH_SPAN_SAMPLES = 15600
+
+
+def patch_count(num_samples: int) -> int:
+    if num_samples < YAMNET_PATCH_SAMPLES:
+        return 0
+    return 1 + (num_samples - YAMNET_PATCH_SAMPLES) // YAMNET_HOP_SAMPLES
+
 
 @dataclass
 class Prediction:
@@ -19,83 +43,972 @@ class Prediction:
 
 
 class BaseEmbedder:
-    def extract(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    version = "base"
+
+    def prepare(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        return audio
+
+    def embed_batch(self, waveforms: List[np.ndarray]) -> List[np.ndarray]:
         raise NotImplementedError
 
+    def extract(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        return self.embed_batch([self.prepare(audio, sample_rate)])[0]
+
+    def embed_patches(self, waveform: np.ndarray) -> np.ndarray:
+        starts = range(0, patch_count(len(waveform)) * YAMNET_HOP_SAMPLES, YAMNET_HOP_SAMPLES)
+        patches = [waveform[start:start + YAMNET_PATCH_SAMPLES] for start in starts]
+        return np.array(self.embed_batch(patches)) if patches else np.zeros((0, 1024))
+
 
 class MockEmbedder(BaseEmbedder):
-    def extract(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
-        digest = hashlib.sha256(audio.tobytes()).digest()
-        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
-        return rng.random(1024)
+    version = "mock-1"
+
+    def embed_batch(self, waveforms: List[np.ndarray]) -> List[np.ndarray]:
+        embeddings = []
+        for waveform in waveforms:
+            digest = hashlib.sha256(waveform.tobytes()).digest()
+            rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+            embeddings.append(rng.random(1024))
+        return embeddings
 
 
 class YamnetEmbedder(BaseEmbedder):
+    # Bumped from yamnet-1 when resampy was replaced by the cached polyphase resampler,
+    # so cached embeddings of non-16 kHz clips are recomputed.
+    version = "yamnet-2"
+
     def __init__(self) -> None:
         import tensorflow as tf
         import tensorflow_hub as hub
 
         self.tf = tf
-        self.model = hub.load("https://tfhub.dev/google/yamnet/1")
+        self.model = hub.load(artifacts.resolve("yamnet", settings.yamnet_model_version, settings.yamnet_model_handle))
 
-    def extract(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    def prepare(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        return resample(audio, sample_rate, YAMNET_SAMPLE_RATE).astype(np.float32, copy=False)
+
+    def embed_batch(self, waveforms: List[np.ndarray]) -> List[np.ndarray]:
         tf = self.tf
-        if sample_rate != 16000:
-            audio = resampy.resample(audio, sample_rate, 16000)
-        waveform = tf.convert_to_tensor(audio, dtype=tf.float32)
-        scores, embeddings, _ = self.model(waveform)
-        embedding = tf.reduce_mean(embeddings, axis=0).numpy()
-        return embedding
+        if len(waveforms) == 1:
+            _, embeddings, _ = self.model(tf.convert_to_tensor(waveforms[0], dtype=tf.float32))
+            return [tf.reduce_mean(embeddings, axis=0).numpy()]
+        # YAMNet only takes a single 1-D waveform, so clips are laid end to end on
+        # patch-hop boundaries with one hop of silence between them. Each clip then
+        # owns a contiguous run of patches that never overlap a neighbouring clip.
+        segments = []
+        spans = []
+        offset = 0
+        for waveform in waveforms:
+            hops = -(-max(len(waveform), YAMNET_PATCH_SAMPLES) // YAMNET_HOP_SAMPLES)
+            segment = np.zeros((hops + 1) * YAMNET_HOP_SAMPLES, dtype=np.float32)
+            segment[: len(waveform)] = waveform
+            first_patch = offset // YAMNET_HOP_SAMPLES
+            spans.append((first_patch, first_patch + hops - 1))
+            segments.append(segment)
+            offset += len(segment)
+        _, embeddings, _ = self.model(tf.convert_to_tensor(np.concatenate(segments), dtype=tf.float32))
+        embeddings = embeddings.numpy()
+        return [embeddings[start:stop].mean(axis=0) for start, stop in spans]
+
+    def embed_patches(self, waveform: np.ndarray) -> np.ndarray:
+        _, embeddings, _ = self.model(self.tf.convert_to_tensor(waveform, dtype=self.tf.float32))
+        return embeddings.numpy()[: patch_count(len(waveform))]
+
+
+def pad_patches(waveform: np.ndarray) -> np.ndarray:
+    # Pads exactly like YAMNet's own front end (at least one patch span, then whole hops),
+    # so a clip shorter than a patch still yields one frame and none of its tail is dropped.
+    num_samples = max(len(waveform), YAMNET_PATCH_SPAN_SAMPLES)
+    hops = -(-(num_samples - YAMNET_PATCH_SPAN_SAMPLES) // YAMNET_HOP_SAMPLES)
+    padded = np.zeros(YAMNET_PATCH_SPAN_SAMPLES + hops * YAMNET_HOP_SAMPLES, dtype=np.float32)
+    padded[: len(waveform)] = waveform
+    return padded
+
+
+def frame_patches(waveform: np.ndarray) -> np.ndarray:
+    # Each row reproduces one patch of the full graph's output.
+    return np.lib.stride_tricks.sliding_window_view(pad_patches(waveform), YAMNET_PATCH_SPAN_SAMPLES)[::YAMNET_HOP_SAMPLES]
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as model_file:
+        for block in iter(lambda: model_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+# Backends for the exported embedding-only graph (scripts/export_yamnet.py): one
+# 15600-sample patch span in, one 1024-d embedding out, no scores head and no TensorFlow.
+class PatchEmbedder(BaseEmbedder):
+    def prepare(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        return resample(audio, sample_rate, YAMNET_SAMPLE_RATE).astype(np.float32, copy=False)
+
+    def run_patches(self, patches: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_batch(self, waveforms: List[np.ndarray]) -> List[np.ndarray]:
+        framed = [frame_patches(waveform) for waveform in waveforms]
+        embeddings = self.run_patches(np.concatenate(framed))
+        bounds = np.cumsum([0] + [len(patches) for patches in framed])
+        return [embeddings[start:stop].mean(axis=0) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def embed_patches(self, waveform: np.ndarray) -> np.ndarray:
+        count = patch_count(len(waveform))
+        if not count:
+            return np.zeros((0, 1024), dtype=np.float32)
+        windows = np.lib.stride_tricks.sliding_window_view(waveform.astype(np.float32, copy=False), YAMNET_PATCH_SPAN_SAMPLES)
+        return self.run_patches(windows[::YAMNET_HOP_SAMPLES][:count])
+
+
+class OnnxEmbedder(PatchEmbedder):
+    def __init__(self, path: str | None = None) -> None:
+        import onnxruntime as ort
+
+        path = path or settings.embedding_model_path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.embedding_threads > 0:
+            options.intra_op_num_threads = settings.embedding_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exports with a leading batch axis take every patch in one call; the default
+        # rank-1 export takes one patch span per run.
+        self.batched = len(model_input.shape) == 2
+        self.version = f"yamnet-onnx-{_file_digest(path)}"
+
+    def run_patches(self, patches: np.ndarray) -> np.ndarray:
+        patches = np.ascontiguousarray(patches, dtype=np.float32)
+        if self.batched:
+            return self.session.run(None, {self.input_name: patches})[0].reshape(len(patches), -1)
+        return np.concatenate([self.session.run(None, {self.input_name: patch})[0].reshape(1, -1) for patch in patches])
+
+
+class TfliteEmbedder(PatchEmbedder):
+    def __init__(self, path: str | None = None) -> None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        path = path or settings.embedding_model_path
+        threads = settings.embedding_threads if settings.embedding_threads > 0 else None
+        self.interpreter = Interpreter(model_path=path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self._lock = threading.Lock()
+        self.version = f"yamnet-tflite-{_file_digest(path)}"
+
+    def run_patches(self, patches: np.ndarray) -> np.ndarray:
+        embeddings = np.empty((len(patches), 1024), dtype=np.float32)
+        # The interpreter owns one set of tensors, so calls from different threads are serialized.
+        with self._lock:
+            for row, patch in enumerate(patches):
+                self.interpreter.set_tensor(self.input_index, np.ascontiguousarray(patch, dtype=np.float32))
+                self.interpreter.invoke()
+                embeddings[row] = self.interpreter.get_tensor(self.output_index).reshape(-1)
+        return embeddings
+
+
+def _remote_embedder() -> BaseEmbedder:
+    from .model_server import RemoteEmbedder
+
+    return RemoteEmbedder(settings.embed_server_socket, settings.embed_server_timeout_seconds)
+
+
+EMBEDDERS = {
+    "yamnet": YamnetEmbedder,
+    "onnx": OnnxEmbedder,
+    "tflite": TfliteEmbedder,
+    "remote": _remote_embedder,
+    "mock": MockEmbedder,
+}
+
+
+def create_embedder(backend: str) -> BaseEmbedder:
+    if backend not in EMBEDDERS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {tuple(EMBEDDERS)}")
+    return EMBEDDERS[backend]()
+
+
+@dataclass
+class _PendingEmbedding:
+    waveform: np.ndarray
+    future: Future
+    enqueued_at: float
+
+
+class MicroBatcher:
+    def __init__(self, embedder: BaseEmbedder | None, max_batch_size: int, window_ms: float) -> None:
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue: queue.Queue[_PendingEmbedding] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._batch_size = metrics.histogram("embed_batch_size", buckets=SIZE_BUCKETS)
+        self._queue_wait = metrics.histogram("embed_queue_wait_ms")
+        self._compute = metrics.histogram("embed_batch_compute_ms")
+        self._latency = metrics.histogram("embed_latency_ms")
+        metrics.gauge("embed_queue_depth", fn=self._queue.qsize)
+
+    def submit(self, waveform: np.ndarray) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put(_PendingEmbedding(waveform, future, time.perf_counter()))
+        return future
+
+    async def extract(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(self.embedder.prepare(audio, sample_rate)))
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[_PendingEmbedding]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [item for item in batch if item.future.set_running_or_notify_cancel()]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                results = self.embedder.embed_batch([item.waveform for item in batch])
+            except Exception as exc:
+                for item in batch:
+                    item.future.set_exception(exc)
+                continue
+            finished = time.perf_counter()
+            self._batch_size.observe(len(batch))
+            self._compute.observe((finished - started) * 1000)
+            for item, result in zip(batch, results):
+                self._queue_wait.observe((started - item.enqueued_at) * 1000)
+                self._latency.observe((finished - item.enqueued_at) * 1000)
+                item.future.set_result(result)
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes: int, directory: str | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory or None
+        self.size_bytes = 0
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-cache") if self.directory else None
+        self._memory_hits = metrics.counter("embed_cache_hits_total", tier="memory")
+        self._disk_hits = metrics.counter("embed_cache_hits_total", tier="disk")
+        self._misses = metrics.counter("embed_cache_misses_total")
+        self._evictions = metrics.counter("embed_cache_evictions_total")
+        metrics.gauge("embed_cache_bytes", fn=lambda: self.size_bytes)
+        metrics.gauge("embed_cache_entries", fn=lambda: len(self._entries))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.directory is not None
+
+    @staticmethod
+    def key(audio: np.ndarray, sample_rate: int, model_version: str) -> str:
+        digest = hashlib.sha256(np.ascontiguousarray(audio).tobytes())
+        digest.update(f"|{audio.dtype.str}|{sample_rate}|{model_version}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.npy")
+
+    def get(self, key: str) -> np.ndarray | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+        if embedding is not None:
+            self._memory_hits.inc()
+            return embedding
+        if self.directory is not None:
+            try:
+                embedding = np.load(self._path(key))
+            except (FileNotFoundError, ValueError, OSError):
+                embedding = None
+            if embedding is not None:
+                self._disk_hits.inc()
+                self._remember(key, embedding)
+                return embedding
+        self._misses.inc()
+        return None
+
+    def put(self, key: str, embedding: np.ndarray) -> None:
+        if not self.enabled:
+            return
+        embedding = np.array(embedding)
+        self._remember(key, embedding)
+        if self._writer is not None:
+            self._writer.submit(self._write, key, embedding)
+
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        if embedding.nbytes > self.max_bytes:
+            return
+        embedding.setflags(write=False)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous.nbytes
+            self._entries[key] = embedding
+            self.size_bytes += embedding.nbytes
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= evicted.nbytes
+                self._evictions.inc()
 
+    def _write(self, key: str, embedding: np.ndarray) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as cache_file:
+            np.save(cache_file, embedding)
+        os.replace(tmp_path, path)
+
+
+_DECODE_STAGE = metrics.stage("decode")
+_GATE_DECISIONS = {decision: metrics.counter("gate_chunks_total", decision=decision) for decision in ("passed", "forced", "skipped")}
+
+
+# Activity gate frames: 32 ms (512 samples at 16 kHz), short enough to catch a click.
+GATE_FRAME_SECONDS = 0.032
+# Spectral flux floor for digital silence, where any relative change would count.
+GATE_MIN_FLUX = 0.05
+
+
+@dataclass
+class GateStats:
+    chunks: int = 0
+    skipped: int = 0
+
+    @property
+    def skip_rate(self) -> float:
+        return self.skipped / self.chunks if self.chunks else 0.0
+
+
+def activity_features(audio: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Per-frame level (dBFS) and normalized positive spectral flux between frames.
+    length = max(1, int(sample_rate * GATE_FRAME_SECONDS))
+    count = max(1, len(audio) // length)
+    frames = np.zeros((count, length), dtype=np.float32)
+    flat = np.asarray(audio, dtype=np.float32)[: count * length]
+    frames.reshape(-1)[: len(flat)] = flat
+    level_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    spectra = np.abs(np.fft.rfft(frames * np.hanning(length).astype(np.float32), axis=1))
+    flux = np.maximum(spectra[1:] - spectra[:-1], 0.0).sum(axis=1) / (spectra[:-1].sum(axis=1) + 1e-6)
+    return level_db, flux
+
+
+class ActivityGate:
+    # Lets a chunk through to the model only if its loudest frame rises margin_db above
+    # an adaptive noise floor or its spectral flux jumps well above the background's.
+    # The floor follows quiet chunks at adapt_rate and drops immediately, but only creeps
+    # up a tenth as fast during activity, so a long alarm does not become background.
+    # After max_skipped skipped chunks in a row one chunk is always let through.
+    def __init__(
+        self,
+        margin_db: float = 6.0,
+        flux_ratio: float = 2.5,
+        adapt_rate: float = 0.05,
+        max_skipped: int = 10,
+        stats: GateStats | None = None,
+    ) -> None:
+        self.margin_db = margin_db
+        self.flux_ratio = flux_ratio
+        self.adapt_rate = adapt_rate
+        self.max_skipped = max_skipped
+        self.stats = stats if stats is not None else GateStats()
+        self.floor_db: float | None = None
+        self.flux_floor = 0.0
+        self._skipped_in_row = 0
+        self._lock = threading.Lock()
+
+    def admit(self, audio: np.ndarray, sample_rate: int) -> bool:
+        level_db, flux = activity_features(audio, sample_rate)
+        level, peak = float(np.median(level_db)), float(level_db.max())
+        change, peak_change = (float(np.median(flux)), float(flux.max())) if len(flux) else (0.0, 0.0)
+        with self._lock:
+            if self.floor_db is None:
+                self.floor_db, self.flux_floor = level, change
+                decision = "passed"
+            elif peak > self.floor_db + self.margin_db or peak_change > max(self.flux_floor * self.flux_ratio, GATE_MIN_FLUX):
+                decision = "passed"
+            elif self._skipped_in_row >= self.max_skipped:
+                decision = "forced"
+            else:
+                decision = "skipped"
+            rate = self.adapt_rate if decision != "passed" else self.adapt_rate * 0.1
+            self.floor_db = level if level < self.floor_db else self.floor_db + rate * (level - self.floor_db)
+            self.flux_floor = change if change < self.flux_floor else self.flux_floor + rate * (change - self.flux_floor)
+            self._skipped_in_row = self._skipped_in_row + 1 if decision == "skipped" else 0
+            self.stats.chunks += 1
+            self.stats.skipped += decision == "skipped"
+        _GATE_DECISIONS[decision].inc()
+        return decision != "skipped"
+
+
+class ActivityGates:
+    # One gate per user for chunked HTTP inference (a user's client streams from one
+    # place), bounded LRU like the auth caches. Streaming connections get their own gate
+    # and share only the user's stats.
+    def __init__(self, max_users: int) -> None:
+        self.max_users = max_users
+        self._gates: OrderedDict[str, ActivityGate] = OrderedDict()
+        self._stats: OrderedDict[str, GateStats] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _lookup(self, entries: OrderedDict, user_id: str, factory: Callable[[], object]):
+        with self._lock:
+            entry = entries.get(user_id)
+            if entry is None:
+                entry = entries[user_id] = factory()
+                if len(entries) > self.max_users:
+                    entries.popitem(last=False)
+            entries.move_to_end(user_id)
+            return entry
 
-def load_audio(wav_bytes: bytes) -> Tuple[np.ndarray, int]:
-    audio, sample_rate = sf.read(BytesIO(wav_bytes))
-    if audio.ndim > 1:
-        audio = np.mean(audio, axis=1)
-    return audio.astype(np.float32), sample_rate
+    def stats(self, user_id: str) -> GateStats:
+        return self._lookup(self._stats, user_id, GateStats)
+
+    def get(self, user_id: str) -> ActivityGate:
+        return self._lookup(self._gates, user_id, lambda: self.connection(user_id))
+
+    def peek(self, user_id: str) -> ActivityGate | None:
+        return self._gates.get(user_id)
+
+    def connection(self, user_id: str) -> ActivityGate:
+        return ActivityGate(
+            settings.gate_margin_db,
+            settings.gate_flux_ratio,
+            settings.gate_adapt_rate,
+            settings.gate_max_skipped,
+            self.stats(user_id),
+        )
+
+
+def load_audio(data: bytes, content_type: str | None = None) -> Tuple[np.ndarray, int]:
+    with _DECODE_STAGE.time():
+        return decode_audio(data, content_type)
+
+
+DEFAULT_SENSITIVITY = 0.6
+CLASSIFIER_ROW_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+CLASSIFIER_MODES = ("knn", "centroid")
+# Similarities computed per chunk in frame_scores (rows x frames), about 16 MB of float32.
+FRAME_SCORE_CHUNK = 1 << 22
+
+
+def detection_threshold(sensitivity: float) -> float:
+    return 1.0 - sensitivity
+
+
+def _unknown() -> Prediction:
+    return Prediction(label="unknown", sound_id=None, sound_name=None, confidence=0.0)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
 
 
 class UserClassifier:
-    def __init__(self) -> None:
-        self.nn: NearestNeighbors | None = None
-        self.labels: List[str | None] = []
-        self.sound_names: List[str | None] = []
-        self.embeddings: np.ndarray | None = None
-
-    def fit(self, embeddings: np.ndarray, labels: List[str | None], names: List[str | None]) -> None:
-        if len(embeddings) == 0:
-            self.nn = None
-            self.labels = []
-            self.sound_names = []
-            self.embeddings = None
+    def __init__(
+        self,
+        k: int = 5,
+        mode: str = "knn",
+        ann_min_rows: int = 0,
+        ann_nprobe: int = 16,
+        ann_subquantizers: int = 64,
+        ann_rerank: int = 200,
+    ) -> None:
+        if mode not in CLASSIFIER_MODES:
+            raise ValueError(f"Unknown classifier mode {mode!r}, expected one of {CLASSIFIER_MODES}")
+        self.k = k
+        self.mode = mode
+        # kNN switches from exact search to an IVF-PQ index once it holds ann_min_rows rows.
+        self.ann_min_rows = ann_min_rows
+        self.ann_nprobe = ann_nprobe
+        self.ann_subquantizers = ann_subquantizers
+        self.ann_rerank = ann_rerank
+        self.removed: frozenset = frozenset()
+        self.classes: List[str | None] = []
+        self.names: Dict[str, str] = {}
+        self.sensitivities: Dict[str, float] = {}
+        self.size = 0
+        self.version = 0
+        self.generation = -1
+        self.stamp: Stamp | None = None
+        self._class_index: Dict[str | None, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._codes = np.zeros(0, dtype=np.int32)
+        self._inv_norms = np.zeros(0, dtype=np.float32)
+        self._class_sums = np.zeros((0, 0), dtype=np.float32)
+        self._centroids = np.zeros((0, 0), dtype=np.float32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._class_alive = np.zeros(0, dtype=bool)
+        self._ann: IVFPQIndex | None = None
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._matrix[: self.size]
+
+    def clone(self) -> "UserClassifier":
+        # Shares the row buffers: add() only writes past the original's size or into
+        # new arrays, so the original stays valid for readers while the clone grows.
+        clone = copy.copy(self)
+        clone.classes = list(self.classes)
+        clone._class_index = dict(self._class_index)
+        if self._ann is not None:
+            clone._ann = self._ann.clone()
+        return clone
+
+    @property
+    def labels(self) -> List[str | None]:
+        return [self.classes[code] for code in self._codes[: self.size]]
+
+    def fit(
+        self,
+        embeddings: np.ndarray,
+        labels: Sequence[str | None],
+        names: Dict[str, str] | None = None,
+        sensitivities: Dict[str, float] | None = None,
+    ) -> None:
+        self.classes = []
+        self._class_index = {}
+        self.size = 0
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._codes = np.zeros(0, dtype=np.int32)
+        self._inv_norms = np.zeros(0, dtype=np.float32)
+        self._class_sums = np.zeros((0, 0), dtype=np.float32)
+        self._ann = None
+        self.removed = frozenset()
+        self.set_sounds(names or {}, sensitivities or {})
+        self.add(embeddings, labels)
+        # A direct fit trains in place; the registry trains in the background instead.
+        if self.ann_due:
+            self._ann = self.build_ann()
+
+    def set_sounds(self, names: Dict[str, str], sensitivities: Dict[str, float]) -> None:
+        self.names = dict(names)
+        self.sensitivities = dict(sensitivities)
+        self._weights = np.array([self._sensitivity(label) for label in self.classes], dtype=np.float32)
+
+    def _sensitivity(self, label: str | None) -> float:
+        return self.sensitivities.get(label, DEFAULT_SENSITIVITY) if label else DEFAULT_SENSITIVITY
+
+    def is_detection(self, prediction: Prediction) -> bool:
+        if prediction.sound_id is None:
+            return False
+        return prediction.confidence >= detection_threshold(self._sensitivity(prediction.sound_id))
+
+    def add(self, embeddings: np.ndarray, labels: Sequence[str | None]) -> None:
+        if len(labels) == 0:
             return
-        self.nn = NearestNeighbors(n_neighbors=min(5, len(embeddings)), metric="cosine")
-        self.nn.fit(embeddings)
-        self.labels = labels
-        self.sound_names = names
-        self.embeddings = embeddings
+        rows = np.asarray(embeddings, dtype=np.float32).reshape(len(labels), -1)
+        needed = self.size + len(rows)
+        if needed > len(self._matrix) or self._matrix.shape[1] != rows.shape[1] or not self._matrix.flags.writeable:
+            capacity = max(needed, 2 * len(self._matrix), 16)
+            matrix = np.empty((capacity, rows.shape[1]), dtype=np.float32)
+            if self.size:
+                matrix[: self.size] = self._matrix[: self.size]
+            self._matrix = matrix
+        self._matrix[self.size:needed] = rows
+        self._index_rows(rows, labels)
+
+    def attach(self, embeddings: np.ndarray, labels: Sequence[str | None]) -> None:
+        # Scores straight from a read-only matrix, typically the index's memory map, so
+        # every worker shares one page-cache copy of the rows. Only rows past self.size
+        # are new; the ones before must be the rows this classifier already indexed.
+        if len(embeddings) < self.size:
+            raise ValueError(f"Cannot attach {len(embeddings)} rows to a classifier holding {self.size}")
+        rows = np.asarray(embeddings[self.size:], dtype=np.float32)
+        self._matrix = embeddings
+        self._index_rows(rows, labels[self.size:])
+
+    def _index_rows(self, rows: np.ndarray, labels: Sequence[str | None]) -> None:
+        # Rows are kept as given; similarities are scaled by the per-row inverse norms,
+        # which is all the private memory a row costs besides its class code.
+        for label in labels:
+            if label not in self._class_index:
+                self._class_index[label] = len(self.classes)
+                self.classes.append(label)
+        new_codes = np.array([self._class_index[label] for label in labels], dtype=np.int32)
+        needed = self.size + len(rows)
+        if needed > len(self._codes):
+            capacity = max(needed, 2 * len(self._codes), 16)
+            codes_buffer = np.empty(capacity, dtype=np.int32)
+            inv_norms = np.empty(capacity, dtype=np.float32)
+            codes_buffer[: self.size] = self._codes[: self.size]
+            inv_norms[: self.size] = self._inv_norms[: self.size]
+            self._codes = codes_buffer
+            self._inv_norms = inv_norms
+        row_inv_norms = 1.0 / np.maximum(np.linalg.norm(rows, axis=1), 1e-12)
+        self._codes[self.size:needed] = new_codes
+        self._inv_norms[self.size:needed] = row_inv_norms
+        self.size = needed
+        class_sums = np.zeros((len(self.classes), rows.shape[1]), dtype=np.float32)
+        if self._class_sums.size:
+            class_sums[: len(self._class_sums)] = self._class_sums
+        np.add.at(class_sums, new_codes, rows * row_inv_norms[:, None])
+        self._class_sums = class_sums
+        self._centroids = _normalize(class_sums)
+        self._weights = np.array([self._sensitivity(label) for label in self.classes], dtype=np.float32)
+        self._class_alive = np.array([label not in self.removed for label in self.classes], dtype=bool)
+        if self._ann is not None:
+            # Training is never done here (see ann_due); an index past its retrain point
+            # keeps taking rows so it stays complete until its replacement is ready.
+            self._ann.add(rows * row_inv_norms[:, None])
+
+    @property
+    def ann_due(self) -> bool:
+        if self.mode != "knn" or not self.ann_min_rows or self.size < self.ann_min_rows:
+            return False
+        return self._ann is None or self._ann.needs_training(self.size)
+
+    def _normalized(self, rows) -> np.ndarray:
+        return np.asarray(self._matrix[rows], dtype=np.float32) * self._inv_norms[rows, None]
+
+    def build_ann(self, quantizers: dict | None = None) -> IVFPQIndex:
+        # Builds an index over the rows held now without touching this classifier, so it
+        # can run off the request path while the classifier keeps serving exact search.
+        # Quantizers persisted for these rows skip training and only encode.
+        size = self.size
+        if quantizers is not None and len(quantizers["codebooks"]) == self.ann_subquantizers:
+            ann = IVFPQIndex.from_quantizers(quantizers, self.ann_nprobe, self.ann_rerank)
+        else:
+            ann = IVFPQIndex(self.ann_subquantizers, self.ann_nprobe, self.ann_rerank)
+        if ann.needs_training(size):
+            ann = IVFPQIndex(self.ann_subquantizers, self.ann_nprobe, self.ann_rerank)
+            rng = np.random.default_rng(size)
+            sample = np.sort(rng.choice(size, ann.train_size(size), replace=False))
+            ann.train(self._normalized(sample), size)
+        for start in range(0, size, ENCODE_CHUNK):
+            ann.add(self._normalized(np.arange(start, min(start + ENCODE_CHUNK, size))))
+        return ann
+
+    def with_ann(self, ann: IVFPQIndex) -> "UserClassifier":
+        # Rows attached since the index was built are encoded into it here.
+        clone = self.clone()
+        clone._ann = ann
+        if ann.size < clone.size:
+            ann.add(clone._normalized(np.arange(ann.size, clone.size)))
+        return clone
+
+    def remove(self, labels) -> None:
+        # Tombstones whole sounds: their rows stay in the matrix (and the ANN lists) but
+        # are never returned, until the store compacts the index into a new generation.
+        self.removed = frozenset(self.removed | set(labels))
+        self._class_alive = np.array([label not in self.removed for label in self.classes], dtype=bool)
+
+    def _nearest(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        row_alive = self._class_alive[self._codes[: self.size]] if self.removed else None
+        if self._ann is not None:
+            # Approximate candidates are re-scored exactly, so confidences stay true cosines.
+            rows, _ = self._ann.candidates(query, max(k, self._ann.rerank), row_alive)
+            similarities = (np.asarray(self._matrix[rows]) @ query) * self._inv_norms[rows]
+        else:
+            similarities = (self.embeddings @ query) * self._inv_norms[: self.size]
+            rows = np.arange(self.size)
+            if row_alive is not None:
+                rows, similarities = rows[row_alive], similarities[row_alive]
+        if len(rows) > k:
+            top = np.argpartition(-similarities, k - 1)[:k]
+            rows, similarities = rows[top], similarities[top]
+        return rows, similarities
+
+    def thresholds(self) -> np.ndarray:
+        # Per-class detection thresholds; the negative (None) class never fires.
+        return np.array(
+            [detection_threshold(self._sensitivity(label)) if label else np.inf for label in self.classes],
+            dtype=np.float32,
+        )
+
+    def frame_scores(self, embeddings: np.ndarray) -> np.ndarray:
+        # Scores every frame against every sound at once as a [frames, classes] matrix:
+        # the best cosine among each frame's k nearest rows (kNN) or to each centroid,
+        # so several sounds can be present in the same frame.
+        queries = _normalize(np.asarray(embeddings).reshape(len(embeddings), -1))
+        scores = np.zeros((len(queries), len(self.classes)), dtype=np.float32)
+        if self.size == 0 or not len(queries):
+            return scores
+        k = min(self.k, self.size)
+        if self.mode == "centroid":
+            scores = queries @ self._centroids.T
+        elif self._ann is not None:
+            for frame, query in enumerate(queries):
+                rows, similarities = self._nearest(query, k)
+                np.maximum.at(scores[frame], self._codes[rows], similarities)
+        else:
+            row_alive = self._class_alive[self._codes[: self.size]] if self.removed else None
+            step = max(1, FRAME_SCORE_CHUNK // self.size)
+            for start in range(0, len(queries), step):
+                similarities = (self.embeddings @ queries[start:start + step].T) * self._inv_norms[: self.size, None]
+                if row_alive is not None:
+                    similarities[~row_alive] = -np.inf
+                nearest = np.argpartition(-similarities, k - 1, axis=0)[:k]
+                frames = np.broadcast_to(np.arange(start, start + nearest.shape[1]), nearest.shape)
+                np.maximum.at(scores, (frames, self._codes[nearest]), np.take_along_axis(similarities, nearest, axis=0))
+        scores[:, ~self._class_alive] = 0.0
+        return np.maximum(scores, 0.0)
 
     def predict(self, embedding: np.ndarray) -> Prediction:
-        if self.nn is None or self.embeddings is None:
-            return Prediction(label="unknown", sound_id=None, sound_name=None, confidence=0.0)
-        distances, indices = self.nn.kneighbors([embedding])
-        best_index = indices[0][0]
-        distance = distances[0][0]
-        confidence = max(0.0, 1.0 - float(distance))
-        label = self.labels[best_index]
-        sound_name = self.sound_names[best_index]
-        return Prediction(label=label or "unknown", sound_id=label, sound_name=sound_name, confidence=confidence)
+        if self.size == 0:
+            return _unknown()
+        query = _normalize(embedding)
+        if self.mode == "centroid":
+            similarities = self._centroids @ query
+            best_class = int(np.argmax(np.where(self._class_alive, similarities * self._weights, -np.inf)))
+            if not self._class_alive[best_class]:
+                return _unknown()
+            confidence = float(similarities[best_class])
+        else:
+            nearest, similarities = self._nearest(query, min(self.k, self.size))
+            if not len(nearest):
+                return _unknown()
+            codes = self._codes[nearest]
+            votes = np.bincount(codes, weights=similarities, minlength=len(self.classes))
+            voted = np.bincount(codes, minlength=len(self.classes)) > 0
+            best_class = int(np.argmax(np.where(voted, votes * self._weights, -np.inf)))
+            confidence = float(similarities[codes == best_class].max())
+        label = self.classes[best_class]
+        return Prediction(
+            label=label or "unknown",
+            sound_id=label,
+            sound_name=self.names.get(label) if label else None,
+            confidence=max(0.0, confidence),
+        )
 
 
 class ModelRegistry:
-    def __init__(self) -> None:
-        self.embedder: BaseEmbedder = YamnetEmbedder() if settings.embedding_backend == "yamnet" else MockEmbedder()
+    def __init__(self, backend: str | None = None) -> None:
+        # The model is loaded on first use or by warm_up() from the app's startup hook,
+        # never at import, so importing the app stays cheap and loads can be retried.
+        self.backend = backend or settings.embedding_backend
+        self.status = "cold"
+        self.error: str | None = None
+        self._embedder: BaseEmbedder | None = None
+        self._model_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._load_seconds = metrics.gauge("model_load_seconds", backend=self.backend)
+        self._warmup_seconds = metrics.gauge("model_warmup_seconds", backend=self.backend)
+        metrics.gauge("model_ready", fn=lambda: int(self.ready), backend=self.backend)
+        # A remote model server already collects a batch window across all workers; waiting
+        # here as well would only add latency, so workers just forward what is queued.
+        window_ms = 0.0 if self.backend == "remote" else settings.embed_batch_window_ms
+        self._batcher = MicroBatcher(None, settings.embed_batch_max_size, window_ms)
+        self.cache = EmbeddingCache(settings.embed_cache_bytes, settings.embed_cache_dir)
+        self.store = ClassifierStore(settings.index_dir, settings.index_compact_ratio)
         self.classifiers: dict[str, UserClassifier] = {}
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._classifier_load = metrics.stage("classifier_load")
+        # ANN indexes are trained off the request path, one at a time, so a large user's
+        # retrain neither blocks the event loop nor takes every core from inference.
+        self._ann_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ann-build")
+        self._ann_pending: set[str] = set()
+        self._ann_build = metrics.stage("ann_build")
+        self._classifier_rows = metrics.histogram("classifier_rows", buckets=CLASSIFIER_ROW_BUCKETS)
+        metrics.gauge("classifiers_loaded", fn=lambda: len(self.classifiers))
+        metrics.gauge("classifier_rows_total", fn=lambda: sum(c.size for c in list(self.classifiers.values())))
+        metrics.gauge("classifier_rows_max", fn=lambda: max((c.size for c in list(self.classifiers.values())), default=0))
+
+    @property
+    def embedder(self) -> BaseEmbedder:
+        return self._embedder if self._embedder is not None else self.load()
+
+    @property
+    def batcher(self) -> MicroBatcher:
+        self.embedder
+        return self._batcher
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def load(self) -> BaseEmbedder:
+        with self._model_lock:
+            if self._embedder is None:
+                self.status = "loading"
+                started = time.perf_counter()
+                try:
+                    embedder = create_embedder(self.backend)
+                except Exception as exc:
+                    self.status, self.error = "failed", str(exc) or exc.__class__.__name__
+                    raise
+                self._load_seconds.set(time.perf_counter() - started)
+                self._batcher.embedder = embedder
+                self._embedder = embedder
+                self.status, self.error = "loaded", None
+        return self._embedder
+
+    def warm_up(self, *hooks: Callable[[], None], local: bool = True) -> None:
+        # local=False only runs the hooks: with process pipelines every embedding happens
+        # in a worker, so loading a model here would only cost the parent memory.
+        embedder = self.load() if local else None
+        self.status = "warming"
+        started = time.perf_counter()
+        try:
+            if embedder is not None:
+                clip = (np.random.default_rng(0).standard_normal(YAMNET_SAMPLE_RATE) * 0.01).astype(np.float32)
+                # Runs every path a request can take (batcher thread, multi-clip batch,
+                # streaming window) so graph tracing and first allocations happen here.
+                self._batcher.submit(embedder.prepare(clip, YAMNET_SAMPLE_RATE)).result()
+                embedder.embed_batch([clip, clip[: YAMNET_SAMPLE_RATE // 2]])
+                embedder.embed_patches(np.resize(clip, YAMNET_PATCH_SPAN_SAMPLES + YAMNET_HOP_SAMPLES))
+            for hook in hooks:
+                hook()
+        except Exception as exc:
+            self.status, self.error = "failed", str(exc) or exc.__class__.__name__
+            raise
+        self._warmup_seconds.set(time.perf_counter() - started)
+        self.status = "ready"
+        self._ready.set()
+
+    def readiness(self) -> dict:
+        return {
+            "status": self.status,
+            "embedding_backend": self.backend,
+            "embedder_version": self._embedder.version if self._embedder is not None else None,
+            "load_seconds": self._load_seconds.value if self._embedder is not None else None,
+            "warmup_seconds": self._warmup_seconds.value if self.ready else None,
+            "error": self.error,
+        }
+
+    def extract_cached(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        key = self.cache.key(audio, sample_rate, self.embedder.version)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.embedder.extract(audio, sample_rate)
+            self.cache.put(key, embedding)
+        return embedding
+
+    def extract_frames_cached(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        # One embedding per YAMNet patch instead of their mean, cached under its own key.
+        embedder = self.embedder
+        key = self.cache.key(audio, sample_rate, f"{embedder.version}/frames")
+        frames = self.cache.get(key)
+        if frames is None:
+            frames = embedder.embed_patches(pad_patches(embedder.prepare(audio, sample_rate)))
+            self.cache.put(key, frames)
+        return frames
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        lock = self._load_locks.get(user_id)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._load_locks.setdefault(user_id, threading.Lock())
+        return lock
+
+    def get_classifier(self, user_id: str, wait: bool = False) -> UserClassifier:
+        classifier = self.classifiers.get(user_id)
+        if classifier is not None and classifier.stamp == self.store.stamp(user_id):
+            return classifier
+        lock = self._user_lock(user_id)
+        # While another thread loads a newer index for this user, keep serving the
+        # published classifier instead of queueing behind the load.
+        if not lock.acquire(blocking=wait or classifier is None):
+            return classifier
+        try:
+            classifier = self.classifiers.get(user_id)
+            stamp = self.store.stamp(user_id)
+            if classifier is None or classifier.stamp != stamp:
+                with self._classifier_load.time():
+                    classifier = self._load_classifier(user_id, stamp)
+                # Published classifiers are never mutated, so this swap is atomic for readers.
+                self.classifiers[user_id] = classifier
+                self._classifier_rows.observe(classifier.size)
+                if classifier.ann_due:
+                    self._schedule_ann(user_id, classifier)
+            return classifier
+        finally:
+            lock.release()
+
+    async def get_classifier_async(self, user_id: str) -> UserClassifier:
+        # An up-to-date published classifier is returned on the loop; loading one (memory
+        # maps, labels, row norms) runs on a thread so it never stalls other requests.
+        classifier = self.classifiers.get(user_id)
+        if classifier is not None and classifier.stamp == self.store.stamp(user_id):
+            return classifier
+        return await asyncio.to_thread(self.get_classifier, user_id)
+
+    def _schedule_ann(self, user_id: str, classifier: UserClassifier) -> None:
+        with self._locks_lock:
+            if user_id in self._ann_pending:
+                return
+            self._ann_pending.add(user_id)
+        self._ann_builder.submit(self._publish_ann, user_id, classifier)
+
+    def _publish_ann(self, user_id: str, classifier: UserClassifier) -> None:
+        try:
+            with self._ann_build.time():
+                quantizers = self.store.load_quantizers(user_id, classifier.generation)
+                ann = classifier.build_ann(quantizers)
+            if quantizers is None or ann.trained_rows != int(quantizers["trained_rows"]):
+                self.store.save_quantizers(user_id, classifier.generation, ann.quantizers())
+            with self._user_lock(user_id):
+                current = self.classifiers.get(user_id)
+                # A newer generation holds different rows; its own load schedules a build.
+                if current is not None and current.generation == classifier.generation and current.size >= ann.size:
+                    self.classifiers[user_id] = current.with_ann(ann)
+        except Exception:
+            logger.exception("ANN build for user %s failed; serving exact search", user_id)
+        finally:
+            with self._locks_lock:
+                self._ann_pending.discard(user_id)
+
+    def _new_classifier(self) -> UserClassifier:
+        return UserClassifier(
+            settings.classifier_k,
+            settings.classifier_mode,
+            ann_min_rows=settings.ann_min_rows,
+            ann_nprobe=settings.ann_nprobe,
+            ann_subquantizers=settings.ann_subquantizers,
+            ann_rerank=settings.ann_rerank,
+        )
 
-    def get_classifier(self, user_id: str) -> UserClassifier:
-        if user_id not in self.classifiers:
-            self.classifiers[user_id] = UserClassifier()
-        return self.classifiers[user_id]
+    def _load_classifier(self, user_id: str, stamp: Stamp | None) -> UserClassifier:
+        snapshot = self.store.load(user_id)
+        classifier = self.classifiers.get(user_id)
+        if snapshot is None:
+            classifier = self._new_classifier()
+        else:
+            if classifier is not None and classifier.generation == snapshot.generation and classifier.size <= len(snapshot.labels):
+                # Same generation means rows were only appended: a copy indexes just the new ones.
+                classifier = classifier.clone()
+            else:
+                classifier = self._new_classifier()
+            # Rows stay in the index's read-only mapping, shared by every worker process.
+            classifier.attach(snapshot.embeddings, snapshot.labels)
+            classifier.remove(snapshot.removed)
+            classifier.set_sounds(snapshot.names, snapshot.sensitivities)
+        if snapshot is not None:
+            classifier.version = snapshot.version
+            classifier.generation = snapshot.generation
+        classifier.stamp = stamp
+        return classifier
 
 
 model_registry = ModelRegistry()
+activity_gates = ActivityGates(settings.gate_max_users)
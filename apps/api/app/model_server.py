@@ -0,0 +1,236 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import struct
+import threading
+import numpy as np
+from typing import List, Sequence
+from .audio import resample
+from .ml import YAMNET_SAMPLE_RATE, BaseEmbedder, ModelRegistry
+from .settings import settings
+
+# Frames are a fixed header followed by raw little-endian arrays, sent from and
+# received into numpy buffers directly (sendmsg / recv_into), so samples and
+# embeddings are never pickled or copied into intermediate bytes objects.
+#   request:  op u8, count u32, total_samples u32 | count x u32 lengths | float32 samples
+#   response: status u8, rows u32, dim u32 | rows x dim float32 (or rows bytes of text)
+_REQUEST = struct.Struct("<BII")
+_RESPONSE = struct.Struct("<BII")
+OP_INFO = 0
+OP_EMBED = 1
+OP_PATCHES = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+MAX_REQUEST_SAMPLES = YAMNET_SAMPLE_RATE * 3600
+MAX_REQUEST_CLIPS = 4096
+
+
+class ModelServerUnavailable(RuntimeError):
+    pass
+
+
+def _bytes(buffer) -> memoryview:
+    if isinstance(buffer, np.ndarray):
+        # A uint8 view rather than memoryview.cast, which rejects empty arrays.
+        return memoryview(buffer.reshape(-1).view(np.uint8))
+    return memoryview(buffer)
+
+
+def _send(sock: socket.socket, *buffers) -> None:
+    views = [_bytes(buffer) for buffer in buffers]
+    sent = sock.sendmsg(views)
+    # sendmsg may stop early on large frames; finish whatever is left of each buffer.
+    for view in views:
+        if sent >= view.nbytes:
+            sent -= view.nbytes
+            continue
+        sock.sendall(view[sent:])
+        sent = 0
+
+
+def _recv_into(sock: socket.socket, view: memoryview) -> None:
+    while view.nbytes:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("model server connection closed")
+        view = view[received:]
+
+
+def _recv_array(sock: socket.socket, count: int, dtype) -> np.ndarray:
+    array = np.empty(count, dtype=dtype)
+    _recv_into(sock, _bytes(array))
+    return array
+
+
+def _recv_header(sock: socket.socket, header: struct.Struct) -> tuple:
+    buffer = bytearray(header.size)
+    _recv_into(sock, memoryview(buffer))
+    return header.unpack(buffer)
+
+
+class ModelServer:
+    def __init__(self, path: str, registry: ModelRegistry) -> None:
+        self.path = path
+        self.registry = registry
+        self._listener: socket.socket | None = None
+        self._connections: set[socket.socket] = set()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        os.chmod(self.path, 0o660)
+        listener.listen(128)
+        self._listener = listener
+        threading.Thread(target=self._accept, name="model-server", daemon=True).start()
+
+    def _accept(self) -> None:
+        listener = self._listener
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._connections.add(conn)
+            threading.Thread(target=self._serve, args=(conn,), name="model-server-conn", daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            while True:
+                op, count, total = _recv_header(conn, _REQUEST)
+                if count > MAX_REQUEST_CLIPS or total > MAX_REQUEST_SAMPLES:
+                    return
+                # The body is always drained before dispatch so an error never desyncs the stream.
+                lengths = _recv_array(conn, count, "<u4")
+                samples = _recv_array(conn, total, "<f4")
+                try:
+                    result = self._handle(op, lengths, samples)
+                except Exception as exc:
+                    message = (str(exc) or exc.__class__.__name__).encode()
+                    _send(conn, _RESPONSE.pack(STATUS_ERROR, len(message), 0), message)
+                    continue
+                if isinstance(result, bytes):
+                    _send(conn, _RESPONSE.pack(STATUS_OK, len(result), 0), result)
+                else:
+                    _send(conn, _RESPONSE.pack(STATUS_OK, *result.shape), result)
+        except OSError:
+            return
+        finally:
+            with self._lock:
+                self._connections.discard(conn)
+            conn.close()
+
+    def _handle(self, op: int, lengths: np.ndarray, samples: np.ndarray) -> np.ndarray | bytes:
+        if op == OP_INFO:
+            embedder = self.registry.embedder
+            return json.dumps({"version": embedder.version, "backend": self.registry.backend, "pid": os.getpid()}).encode()
+        if int(lengths.sum()) != len(samples):
+            raise ValueError("Frame lengths do not add up to the sample count")
+        waveforms = np.split(samples, np.cumsum(lengths)[:-1]) if len(lengths) else []
+        if op == OP_EMBED:
+            # Through the server's micro-batcher, so clips from every worker share model calls.
+            futures = [self.registry.batcher.submit(waveform) for waveform in waveforms]
+            return np.ascontiguousarray([future.result() for future in futures], dtype=np.float32).reshape(len(futures), -1)
+        if op == OP_PATCHES and len(waveforms) == 1:
+            return np.ascontiguousarray(self.registry.embedder.embed_patches(waveforms[0]), dtype=np.float32)
+        raise ValueError(f"Unknown model server op {op}")
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RemoteEmbedder(BaseEmbedder):
+    def __init__(self, path: str, timeout: float = 30.0) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[socket.socket] = queue.LifoQueue()
+        info = json.loads(self._request(OP_INFO, []))
+        # The server's version keys the embedding cache, so remote and local workers share entries.
+        self.version = info["version"]
+        self.remote_backend = info["backend"]
+
+    def prepare(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        return resample(audio, sample_rate, YAMNET_SAMPLE_RATE).astype(np.float32, copy=False)
+
+    def embed_batch(self, waveforms: List[np.ndarray]) -> List[np.ndarray]:
+        return list(self._request(OP_EMBED, waveforms)) if waveforms else []
+
+    def embed_patches(self, waveform: np.ndarray) -> np.ndarray:
+        return self._request(OP_PATCHES, [waveform])
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(self.timeout)
+        try:
+            conn.connect(self.path)
+        except OSError as exc:
+            conn.close()
+            raise ModelServerUnavailable(f"Model server at {self.path} is unavailable: {exc}") from exc
+        return conn
+
+    def _request(self, op: int, waveforms: Sequence[np.ndarray]) -> np.ndarray | bytes:
+        waveforms = [np.ascontiguousarray(waveform, dtype="<f4") for waveform in waveforms]
+        lengths = np.array([len(waveform) for waveform in waveforms], dtype="<u4")
+        header = _REQUEST.pack(op, len(waveforms), int(lengths.sum()))
+        # A pooled connection may have been dropped by a server restart; embedding is
+        # idempotent, so the request is retried once on a fresh connection.
+        for attempt in range(2):
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                _send(conn, header, lengths, *waveforms)
+                status, rows, dim = _recv_header(conn, _RESPONSE)
+                payload = _recv_array(conn, rows * dim, "<f4").reshape(rows, dim) if dim else _recv_array(conn, rows, "u1").tobytes()
+            except OSError as exc:
+                conn.close()
+                if attempt:
+                    raise ModelServerUnavailable(f"Model server at {self.path} failed: {exc}") from exc
+                continue
+            self._idle.put(conn)
+            if status != STATUS_OK:
+                raise RuntimeError(f"Model server error: {payload.decode(errors='replace')}")
+            return payload
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve one shared embedding model to every API worker")
+    parser.add_argument("--socket", default=settings.embed_server_socket)
+    parser.add_argument("--backend", default=settings.embed_server_backend, help="yamnet, onnx, tflite or mock")
+    args = parser.parse_args()
+    if args.backend == "remote":
+        parser.error("the model server needs a local backend")
+
+    registry = ModelRegistry(args.backend)
+    registry.warm_up()
+    server = ModelServer(args.socket, registry)
+    server.start()
+    print(f"[MODEL] serving {registry.embedder.version} on {args.socket} (pid {os.getpid()})")
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopped.set())
+    stopped.wait()
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, Float, ForeignKey, JSON
+from sqlalchemy import Column, String, Boolean, DateTime, Float, ForeignKey, Index, Integer, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from .db import Base
 
@@ -42,14 +42,38 @@ class TrainingSample(Base):
     user_id = Column(String, ForeignKey("users.id"), index=True, nullable=False)
     sound_id = Column(String, ForeignKey("sounds.id"), nullable=True)
     type = Column(String, nullable=False)
-    embedding = Column(JSON, nullable=False)
+    embedding = Column(JSON(none_as_null=True), nullable=True)
+    embedding_blob = Column(LargeBinary, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class DetectionEvent(Base):
     __tablename__ = "detection_events"
+    # History pages walk (user_id, created_at, id) backwards; the composite index also
+    # serves plain user_id lookups, so user_id has no index of its own.
+    __table_args__ = (Index("ix_detection_events_user_created", "user_id", "created_at", "id"),)
     id = Column(String, primary_key=True, default=uuid_str)
-    user_id = Column(String, ForeignKey("users.id"), index=True, nullable=False)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
     sound_id = Column(String, ForeignKey("sounds.id"), nullable=True)
     confidence = Column(Float, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RetentionPolicy(Base):
+    # Per-user override of TIKUN_DETECTION_RETENTION_DAYS for raw detection events.
+    __tablename__ = "retention_policies"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    detection_days = Column(Integer, nullable=False)
+
+
+class DetectionRollup(Base):
+    # Per-sound detection counts per minute and per hour, updated in the same transaction
+    # as each batch of raw events. sound_id is "" for unknown so it can be part of the key.
+    __tablename__ = "detection_rollups"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    resolution = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    sound_id = Column(String, primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    confidence_max = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import multiprocessing
+import os
+import numpy as np
+from typing import Iterator, List, Sequence, Tuple
+from .metrics import metrics
+from .ml import ActivityGate, ModelRegistry, load_audio, model_registry
+from .settings import settings
+from .streaming import ListenStream
+
+PIPELINE_MODES = ("inline", "thread", "process")
+
+
+class PipelineBusy(Exception):
+    pass
+
+
+def _warm_worker() -> None:
+    model_registry.warm_up()
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _embed_in_worker(data: bytes, content_type: str | None = None) -> np.ndarray:
+    return model_registry.extract_cached(*load_audio(data, content_type))
+
+
+def _admit(gate: ActivityGate, data: bytes, content_type: str | None) -> bool:
+    return gate.admit(*load_audio(data, content_type))
+
+
+def _embed_frames_in_worker(data: bytes, content_type: str | None = None) -> np.ndarray:
+    return model_registry.extract_frames_cached(*load_audio(data, content_type))
+
+
+def _embed_patches_in_worker(window: np.ndarray) -> np.ndarray:
+    return model_registry.embedder.embed_patches(window)
+
+
+class EmbeddingPipeline:
+    def __init__(self, registry: ModelRegistry, mode: str, workers: int, max_pending: int) -> None:
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode {mode!r}, expected one of {PIPELINE_MODES}")
+        self.registry = registry
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor: Executor | None = None
+        self._pending = 0
+        self._rejected = metrics.counter("pipeline_rejected_total", mode=mode)
+        self._resample_stage = metrics.stage("resample")
+        self._embed_stage = metrics.stage("embed")
+        self._worker_stage = metrics.stage("worker")
+        metrics.gauge("pipeline_pending", fn=lambda: self._pending, mode=mode)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                # Each worker process imports its own registry and keeps that model warm.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio-pipeline")
+        return self._executor
+
+    @contextmanager
+    def _reserve(self) -> Iterator[None]:
+        if self._pending >= self.max_pending:
+            self._rejected.inc()
+            raise PipelineBusy()
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def embed(self, data: bytes, content_type: str | None = None, gate: ActivityGate | None = None) -> np.ndarray | None:
+        # Returns None when the gate finds nothing above the noise floor.
+        with self._reserve():
+            return await self._embed(data, content_type, gate)
+
+    async def embed_many(self, clips: Sequence[Tuple[bytes, str | None]]) -> List[np.ndarray | Exception]:
+        # A bulk upload takes one pending slot: its clips fan out across the worker pool
+        # and reach the micro-batcher together, so they share model calls.
+        with self._reserve():
+            return await asyncio.gather(
+                *(self._embed(data, content_type) for data, content_type in clips), return_exceptions=True
+            )
+
+    async def embed_frames(
+        self, data: bytes, content_type: str | None = None, gate: ActivityGate | None = None
+    ) -> np.ndarray | None:
+        # Per-patch embeddings bypass the micro-batcher, which only returns clip means.
+        with self._reserve():
+            loop = asyncio.get_running_loop()
+            if self.mode == "process":
+                if gate is not None and not await loop.run_in_executor(None, _admit, gate, data, content_type):
+                    return None
+                with self._worker_stage.time():
+                    return await loop.run_in_executor(self.executor, _embed_frames_in_worker, data, content_type)
+            if self.mode == "thread":
+                return await loop.run_in_executor(self.executor, self._embed_frames, data, content_type, gate)
+            return self._embed_frames(data, content_type, gate)
+
+    async def embed_stream(self, stream: ListenStream, samples: np.ndarray) -> List[Tuple[float, np.ndarray | None]]:
+        # Each websocket frame takes a pending slot like an upload does, so live streams and
+        # uploads share one bound and the model is never loaded on the event loop.
+        with self._reserve():
+            loop = asyncio.get_running_loop()
+            if self.mode == "process":
+                # The ring and gate state live in this process; only the window travels.
+                window, skipped = await loop.run_in_executor(None, stream.take, samples)
+                if window is None:
+                    return skipped
+                with self._worker_stage.time():
+                    return stream.emit(await loop.run_in_executor(self.executor, _embed_patches_in_worker, window))
+            if self.mode == "thread":
+                return await loop.run_in_executor(self.executor, self._embed_stream, stream, samples)
+            return self._embed_stream(stream, samples)
+
+    def _embed_stream(self, stream: ListenStream, samples: np.ndarray) -> List[Tuple[float, np.ndarray | None]]:
+        window, skipped = stream.take(samples)
+        if window is None:
+            return skipped
+        with self._embed_stage.time():
+            return stream.emit(self.registry.embedder.embed_patches(window))
+
+    def _embed_frames(self, data: bytes, content_type: str | None, gate: ActivityGate | None = None) -> np.ndarray | None:
+        audio, sample_rate = load_audio(data, content_type)
+        if gate is not None and not gate.admit(audio, sample_rate):
+            return None
+        with self._embed_stage.time():
+            return self.registry.extract_frames_cached(audio, sample_rate)
+
+    async def _embed(self, data: bytes, content_type: str | None, gate: ActivityGate | None = None) -> np.ndarray | None:
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            # The gate state lives in this process, so the clip is decoded here once for it;
+            # only clips that pass are decoded again by the worker.
+            if gate is not None and not await loop.run_in_executor(None, _admit, gate, data, content_type):
+                return None
+            # Stage timings are recorded inside the worker process; only the round trip is visible here.
+            with self._worker_stage.time():
+                return await loop.run_in_executor(self.executor, _embed_in_worker, data, content_type)
+        if self.mode == "thread":
+            key, waveform, cached = await loop.run_in_executor(self.executor, self._prepare, data, content_type, gate)
+        else:
+            key, waveform, cached = self._prepare(data, content_type, gate)
+        if key is None:
+            return None
+        if cached is not None:
+            return cached
+        with self._embed_stage.time():
+            embedding = await asyncio.wrap_future(self.registry.batcher.submit(waveform))
+        self.registry.cache.put(key, embedding)
+        return embedding
+
+    def _prepare(
+        self, data: bytes, content_type: str | None = None, gate: ActivityGate | None = None
+    ) -> Tuple[str | None, np.ndarray | None, np.ndarray | None]:
+        audio, sample_rate = load_audio(data, content_type)
+        if gate is not None and not gate.admit(audio, sample_rate):
+            return None, None, None
+        key = self.registry.cache.key(audio, sample_rate, self.registry.embedder.version)
+        cached = self.registry.cache.get(key)
+        if cached is not None:
+            return key, None, cached
+        with self._resample_stage.time():
+            return key, self.registry.embedder.prepare(audio, sample_rate), None
+
+    def warm_up(self) -> None:
+        if self.mode == "process":
+            # Spawned pools start a new worker for each submission that finds none idle,
+            # so one task per worker brings the whole pool up through _warm_worker.
+            futures = [self.executor.submit(_worker_pid) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+pipeline = EmbeddingPipeline(
+    model_registry,
+    settings.pipeline_mode,
+    settings.pipeline_workers,
+    settings.pipeline_max_pending,
+)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+from collections import Counter
+import os
+import sys
+import threading
+import time
+from types import FrameType
+from .metrics import metrics
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Wall-clock sampler over every Python thread. Stacks are aggregated in the collapsed
+# "root;...;leaf count" format accepted by flamegraph.pl and speedscope.
+class SamplingProfiler:
+    def __init__(self, interval_ms: float = 5.0, max_depth: int = 64) -> None:
+        self.interval_ms = interval_ms
+        self.max_depth = max_depth
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.started_at: float | None = None
+        self.stopped_at: float | None = None
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._sample_counter = metrics.counter("profiler_samples_total")
+        metrics.gauge("profiler_running", fn=lambda: float(self.running))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval_ms: float | None = None) -> bool:
+        with self._lock:
+            if self._thread is not None:
+                return False
+            if interval_ms is not None:
+                self.interval_ms = interval_ms
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.monotonic()
+            self.stopped_at = None
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> dict:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+            self.stopped_at = time.monotonic()
+        return self.report()
+
+    def report(self) -> dict:
+        duration = 0.0
+        if self.started_at is not None:
+            duration = (self.stopped_at or time.monotonic()) - self.started_at
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "duration_s": round(duration, 3),
+            "stacks": len(self.stacks),
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stopping.wait(self.interval_ms / 1000.0):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < self.max_depth:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+            self._sample_counter.inc()
+
+
+profiler = SamplingProfiler()
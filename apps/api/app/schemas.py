@@ -62,11 +62,65 @@ class DetectionOut(BaseModel):
         from_attributes = True
 
 
+class RetentionUpdate(BaseModel):
+    days: Optional[int] = None
+
+
+class RetentionOut(BaseModel):
+    days: int
+    default: bool
+
+
+class DetectionBucketOut(BaseModel):
+    start: datetime
+    sound_id: Optional[str]
+    count: int
+    max_confidence: float
+    mean_confidence: float
+
+
+class DetectionSoundCountOut(BaseModel):
+    sound_id: Optional[str]
+    sound_name: Optional[str]
+    count: int
+
+
+class DetectionSummaryOut(BaseModel):
+    resolution: str
+    since: datetime
+    until: datetime
+    buckets: List[DetectionBucketOut]
+    sounds: List[DetectionSoundCountOut]
+
+
 class PredictionOut(BaseModel):
     sound_id: Optional[str]
     sound_name: Optional[str]
     confidence: float
     label: str
+    skipped: bool = False
+
+
+class FrameDetectionOut(BaseModel):
+    sound_id: str
+    sound_name: Optional[str]
+    onset: float
+    offset: Optional[float]
+    confidence: float
+
+
+class FramePredictionOut(BaseModel):
+    frames: int
+    detections: List[FrameDetectionOut]
+    skipped: bool = False
+
+
+class GateStatsOut(BaseModel):
+    enabled: bool
+    chunks: int
+    skipped: int
+    skip_rate: float
+    noise_floor_db: Optional[float] = None
 
 
 class TrainSampleOut(BaseModel):
@@ -76,10 +130,35 @@ class TrainSampleOut(BaseModel):
     created_at: str
 
 
-class TrainRebuildOut(BaseModel):
-    samples: int
-    sounds: int
+class TrainBatchItemOut(BaseModel):
+    filename: str
     status: str
+    id: Optional[str] = None
+    sound_id: Optional[str] = None
+    type: Optional[str] = None
+    error: Optional[str] = None
+
+
+class TrainBatchOut(BaseModel):
+    accepted: int
+    rejected: int
+    classifier_updated: bool
+    samples: List[TrainBatchItemOut]
+
+
+class RebuildJobOut(BaseModel):
+    id: str
+    status: str
+    reason: str
+    samples: Optional[int] = None
+    sounds: Optional[int] = None
+    version: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 class HealthOut(BaseModel):
@@ -87,5 +166,14 @@ class HealthOut(BaseModel):
     embedding_backend: str
 
 
+class ReadyOut(BaseModel):
+    status: str
+    embedding_backend: str
+    embedder_version: Optional[str] = None
+    load_seconds: Optional[float] = None
+    warmup_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
 class SoundListOut(BaseModel):
     sounds: List[SoundOut]
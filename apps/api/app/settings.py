@@ -4,14 +4,92 @@ from typing import List
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./tikun.db"
+    database_profile: str = "tuned"
+    database_pool_size: int = 10
+    database_max_overflow: int = 20
+    database_pool_recycle_seconds: float = 1800.0
+    database_pool_timeout_seconds: float = 30.0
+    database_pool_pre_ping: bool = True
+    database_statement_cache_size: int = 500
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_mb: int = 64
+    sqlite_mmap_mb: int = 256
     jwt_secret: str = "dev-secret-change"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24 * 7
+    # Both auth caches live in each worker process. Updating or deleting a user evicts it
+    # only in the worker that made the change, so other workers can keep serving the old
+    # row (a deleted account included) for up to auth_user_cache_ttl_seconds; keep it short.
+    # The token cache only remembers signature checks, which a user change does not affect.
+    auth_token_cache_ttl_seconds: float = 300.0
+    auth_user_cache_ttl_seconds: float = 5.0
+    auth_cache_max_entries: int = 10000
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
     supabase_jwt_secret: str | None = None
     cors_origins: List[str] = ["http://localhost:3000"]
     max_upload_mb: int = 4
     rate_limit_per_minute: int = 30
+    train_batch_max_clips: int = 200
+    train_batch_max_mb: int = 64
     embedding_backend: str = "yamnet"
+    yamnet_model_handle: str = "https://tfhub.dev/google/yamnet/1"
+    yamnet_model_version: str = "1"
+    artifact_dir: str = "./models"
+    artifact_offline: bool = False
+    warmup_on_startup: bool = True
+    embedding_model_path: str = "./models/yamnet-embedding-int8.onnx"
+    embedding_threads: int = 0
+    embed_server_socket: str = "/tmp/tikun-embed.sock"
+    embed_server_backend: str = "yamnet"
+    embed_server_timeout_seconds: float = 30.0
+    embed_batch_max_size: int = 16
+    embed_batch_window_ms: float = 5.0
+    pipeline_mode: str = "thread"
+    pipeline_workers: int = 4
+    pipeline_max_pending: int = 64
+    embed_cache_bytes: int = 64 * 1024 * 1024
+    embed_cache_dir: str | None = None
+    index_dir: str = "./data/index"
+    index_compact_ratio: float = 0.2
+    classifier_mode: str = "knn"
+    classifier_k: int = 5
+    ann_min_rows: int = 50000
+    ann_nprobe: int = 16
+    ann_subquantizers: int = 64
+    ann_rerank: int = 200
+    rebuild_workers: int = 1
+    rebuild_job_history: int = 1000
+    rebuild_after_samples: int = 0
+    embedding_storage_dtype: str = "float32"
+    detection_batch_size: int = 200
+    detection_flush_interval_ms: float = 1000.0
+    detection_max_queue: int = 10000
+    detection_below_threshold_sample_rate: float = 0.01
+    detection_attack_frames: int = 1
+    detection_release_frames: int = 1
+    detection_hysteresis: float = 0.05
+    detection_tracker_max_users: int = 10000
+    gate_enabled: bool = False
+    gate_margin_db: float = 6.0
+    gate_flux_ratio: float = 2.5
+    gate_adapt_rate: float = 0.05
+    gate_max_skipped: int = 10
+    gate_max_users: int = 10000
+    detection_retention_days: int = 30
+    detection_retention_max_days: int = 365
+    rollup_minute_retention_days: int = 30
+    maintenance_interval_minutes: float = 60.0
+    maintenance_batch_size: int = 5000
+    maintenance_pause_ms: float = 50.0
+    maintenance_partition_months_ahead: int = 2
+    stream_context_patches: int = 2
+    stream_buffer_seconds: float = 5.0
+    profiler_enabled: bool = False
+    profiler_interval_ms: float = 5.0
+    profiler_token: str | None = None
 
     class Config:
         env_prefix = "TIKUN_"
@@ -0,0 +1,104 @@
+from __future__ import annotations
+from collections import deque
+import numpy as np
+from typing import List, Tuple
+from .metrics import metrics
+from .ml import (
+    ActivityGate,
+    BaseEmbedder,
+    YAMNET_HOP_SAMPLES,
+    YAMNET_PATCH_SAMPLES,
+    YAMNET_PATCH_SPAN_SAMPLES,
+    YAMNET_SAMPLE_RATE,
+)
+
+HOP_SECONDS = YAMNET_HOP_SAMPLES / YAMNET_SAMPLE_RATE
+PATCH_SECONDS = YAMNET_PATCH_SAMPLES / YAMNET_SAMPLE_RATE
+
+
+class SampleRing:
+    def __init__(self, capacity: int) -> None:
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._start = 0
+        self._length = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def write(self, samples: np.ndarray) -> None:
+        if len(samples) > self.capacity:
+            self.dropped += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        overflow = self._length + len(samples) - self.capacity
+        if overflow > 0:
+            self.dropped += overflow
+            self.advance(overflow)
+        end = (self._start + self._length) % self.capacity
+        head = min(len(samples), self.capacity - end)
+        self._data[end:end + head] = samples[:head]
+        self._data[: len(samples) - head] = samples[head:]
+        self._length += len(samples)
+
+    def peek(self, count: int) -> np.ndarray:
+        count = min(count, self._length)
+        stop = self._start + count
+        if stop <= self.capacity:
+            return self._data[self._start:stop]
+        return np.concatenate((self._data[self._start:], self._data[: stop - self.capacity]))
+
+    def advance(self, count: int) -> None:
+        count = min(count, self._length)
+        self._start = (self._start + count) % self.capacity
+        self._length -= count
+
+
+class ListenStream:
+    def __init__(
+        self, embedder: BaseEmbedder | None, context_patches: int, buffer_seconds: float, gate: ActivityGate | None = None
+    ) -> None:
+        # The embedder is only used by feed(); the API hands take() windows to its pipeline instead.
+        self.embedder = embedder
+        self.gate = gate
+        self.ring = SampleRing(max(YAMNET_PATCH_SPAN_SAMPLES, int(buffer_seconds * YAMNET_SAMPLE_RATE)))
+        self.recent: deque[np.ndarray] = deque(maxlen=max(1, context_patches))
+        self.patches = 0
+        self._patch_counter = metrics.counter("stream_patches_total")
+
+    def feed(self, samples: np.ndarray) -> List[Tuple[float, np.ndarray | None]]:
+        window, skipped = self.take(samples)
+        return skipped if window is None else self.emit(self.embedder.embed_patches(window))
+
+    def take(self, samples: np.ndarray) -> Tuple[np.ndarray | None, List[Tuple[float, None]]]:
+        # Returns the window whose patches are due for embedding, or None along with the
+        # results for patches the gate skipped. The window may be a view into the ring,
+        # so it has to be embedded before the next take().
+        self.ring.write(samples)
+        if len(self.ring) < YAMNET_PATCH_SPAN_SAMPLES:
+            return None, []
+        # Embed only patches that start in unseen audio; the previous hop of samples
+        # stays in the ring because every patch overlaps its successor by half.
+        count = 1 + (len(self.ring) - YAMNET_PATCH_SPAN_SAMPLES) // YAMNET_HOP_SAMPLES
+        window = self.ring.peek((count - 1) * YAMNET_HOP_SAMPLES + YAMNET_PATCH_SPAN_SAMPLES)
+        self.ring.advance(count * YAMNET_HOP_SAMPLES)
+        if self.gate is not None and not self.gate.admit(window, YAMNET_SAMPLE_RATE):
+            # Skipped patches keep their place in the timeline but yield no embedding,
+            # and stale context is not carried over into the next active patch.
+            self.recent.clear()
+            self.patches += count
+            return None, [((self.patches - count + index) * HOP_SECONDS + PATCH_SECONDS, None) for index in range(count)]
+        return window, []
+
+    def emit(self, embeddings: np.ndarray) -> List[Tuple[float, np.ndarray]]:
+        self._patch_counter.inc(len(embeddings))
+        results = []
+        for embedding in embeddings:
+            self.recent.append(embedding)
+            self.patches += 1
+            end_seconds = (self.patches - 1) * HOP_SECONDS + PATCH_SECONDS
+            results.append((end_seconds, np.mean(self.recent, axis=0)))
+        return results
@@ -0,0 +1,111 @@
+"""Recall and latency of the IVF-PQ kNN index against exact search.
+
+Run from apps/api:  python -m benchmarks.bench_ann [--sizes 20000 100000] [--nprobe 4 8 16 32] [--json]
+
+Rows are drawn around a few hundred synthetic "sounds" so that, as with real
+embeddings, neighbours are meaningful; recall@k is the overlap between the exact
+and approximate top-k rows, agreement is how often both pick the same sound.
+"""
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import argparse
+import json
+import time
+import numpy as np
+
+from app.ml import UserClassifier
+
+DIM = 1024
+SOUNDS = 500
+K = 10
+LATENT_DIM = 32
+
+
+def make_library(size: int, rng: np.random.Generator):
+    centers = np.abs(rng.standard_normal((SOUNDS, DIM))).astype(np.float32)
+    basis = (rng.standard_normal((LATENT_DIM, DIM)) / np.sqrt(LATENT_DIM)).astype(np.float32)
+    sounds = rng.integers(0, SOUNDS, size)
+    return centers, basis, sample(centers, basis, sounds, rng), [f"sound-{sound}" for sound in sounds]
+
+
+def sample(centers: np.ndarray, basis: np.ndarray, sounds: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # Variation mostly along a low-dimensional subspace plus a little isotropic noise,
+    # which is closer to real embeddings than full-rank Gaussian noise.
+    latent = rng.standard_normal((len(sounds), LATENT_DIM)).astype(np.float32) @ basis
+    return centers[sounds] + 0.4 * latent + 0.1 * rng.standard_normal((len(sounds), DIM)).astype(np.float32)
+
+
+def make_queries(centers: np.ndarray, basis: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    return sample(centers, basis, rng.integers(0, SOUNDS, count), rng)
+
+
+def time_per_call(fn, queries) -> float:
+    started = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - started) / len(queries) * 1000
+
+
+def run(sizes, nprobes, queries: int, subquantizers: int, rerank: int) -> list[dict]:
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        centers, basis, rows, labels = make_library(size, rng)
+        query_set = make_queries(centers, basis, queries, rng)
+        exact = UserClassifier(k=K)
+        exact.fit(rows, labels)
+        built = time.perf_counter()
+        approximate = UserClassifier(k=K, ann_min_rows=1, ann_subquantizers=subquantizers, ann_rerank=rerank)
+        approximate.fit(rows, labels)
+        build_s = time.perf_counter() - built
+        exact_ms = time_per_call(exact.predict, query_set)
+        exact_top = [set(exact._nearest(query / np.linalg.norm(query), K)[0]) for query in query_set]
+        exact_labels = [exact.predict(query).sound_id for query in query_set]
+        for nprobe in nprobes:
+            approximate._ann.nprobe = nprobe
+            ann_ms = time_per_call(approximate.predict, query_set)
+            recall = np.mean([
+                len(expected & set(approximate._nearest(query / np.linalg.norm(query), K)[0])) / K
+                for query, expected in zip(query_set, exact_top)
+            ])
+            agreement = np.mean([
+                approximate.predict(query).sound_id == label for query, label in zip(query_set, exact_labels)
+            ])
+            results.append({
+                "rows": size,
+                "nlist": approximate._ann.nlist,
+                "nprobe": nprobe,
+                "build_s": round(build_s, 2),
+                "exact_ms": round(exact_ms, 3),
+                "ann_ms": round(ann_ms, 3),
+                "speedup": round(exact_ms / ann_ms, 1),
+                f"recall@{K}": round(float(recall), 4),
+                "label_agreement": round(float(agreement), 4),
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--subquantizers", type=int, default=64)
+    parser.add_argument("--rerank", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    args = parser.parse_args()
+    results = run(args.sizes, args.nprobe, args.queries, args.subquantizers, args.rerank)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'rows':>8} {'nlist':>6} {'nprobe':>7} {'build s':>8} {'exact ms':>9} {'ann ms':>7} {'speedup':>8} {'recall@10':>10} {'agree':>6}")
+    for row in results:
+        print(
+            f"{row['rows']:>8} {row['nlist']:>6} {row['nprobe']:>7} {row['build_s']:>8} {row['exact_ms']:>9}"
+            f" {row['ann_ms']:>7} {row['speedup']:>8} {row[f'recall@{K}']:>10} {row['label_agreement']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Compare concurrent request throughput with sync and async database access.
+
+"sync" serves the sound list and detection history the way the handlers used to: a
+sync Session used inside ``async def``, with a sync auth dependency, so every
+round-trip blocks the event loop. "async" goes through the current endpoints and the
+async engine. Every statement gets --latency-ms of simulated network round-trip in the
+driver (blocking for sync, awaited for async), which is roughly what a Postgres in
+another zone costs; --latency-ms 0 measures local SQLite as is. Requests run in-process
+through httpx's ASGI transport, while a probe times /health to show what the rest of
+the worker sees.
+
+Keep --clients below the sync pool size (15 by default on SQLite). Beyond it the sync
+path deadlocks until the pool timeout: a handler blocks the loop waiting for a
+connection, while the sessions holding them can only be closed by teardowns that need
+that loop.
+
+Run from apps/api:  python -m benchmarks.bench_async_db [--clients 12] [--latency-ms 2] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.load import summarize
+
+USERS = 16
+SOUNDS = 10
+EVENTS = 500
+MODES = ("sync", "async")
+
+
+def configure_environment() -> None:
+    # Settings are read at import time, so this has to run before any app import.
+    workdir = tempfile.mkdtemp(prefix="tikun-bench-async-db-")
+    os.environ["TIKUN_EMBEDDING_BACKEND"] = "mock"
+    os.environ.setdefault("TIKUN_DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("TIKUN_INDEX_DIR", os.path.join(workdir, "index"))
+
+
+def add_legacy_routes(app) -> None:
+    from typing import Optional
+
+    from fastapi import Depends, Request, Response
+    from fastapi.security import HTTPAuthorizationCredentials
+    from sqlalchemy.orm import Session
+
+    from app.auth import authenticate_token, security
+    from app.db import get_db
+    from app.detections import detection_sink, history_page
+    from app.models import DetectionEvent, Sound, User
+    from app.schemas import DetectionOut, SoundListOut
+
+    def legacy_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> User:
+        return authenticate_token(credentials.credentials if credentials else None)
+
+    async def list_sounds(current_user: User = Depends(legacy_user), db: Session = Depends(get_db)):
+        return {"sounds": db.query(Sound).filter(Sound.user_id == current_user.id).all()}
+
+    async def detections(response: Response, limit: int = 50, current_user: User = Depends(legacy_user), db: Session = Depends(get_db)):
+        detection_sink.flush()
+        query = db.query(DetectionEvent).filter(DetectionEvent.user_id == current_user.id)
+        events, next_cursor = history_page(query, None, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return events
+
+    app.add_api_route("/legacy/sounds", list_sounds, methods=["GET"], response_model=SoundListOut)
+    app.add_api_route("/legacy/detections", detections, methods=["GET"], response_model=list[DetectionOut])
+
+
+def seed() -> list:
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import insert
+
+    from app.auth import create_token_for_user
+    from app.db import SessionLocal
+    from app.models import DetectionEvent, Sound, User
+
+    start = datetime(2024, 1, 1)
+    tokens = []
+    with SessionLocal() as db:
+        for index in range(USERS):
+            user = User(id=f"user-{index}", email=f"user-{index}@example.com", hashed_password="x", is_verified=True)
+            db.add(user)
+            db.add_all(Sound(id=f"{user.id}-sound-{sound}", user_id=user.id, name=f"Sound {sound}") for sound in range(SOUNDS))
+            db.flush()
+            db.execute(insert(DetectionEvent), [
+                {
+                    "id": f"{user.id}-{event:05d}",
+                    "user_id": user.id,
+                    "sound_id": f"{user.id}-sound-{event % SOUNDS}",
+                    "confidence": 0.8,
+                    "created_at": start + timedelta(seconds=event),
+                }
+                for event in range(EVENTS)
+            ])
+            tokens.append(create_token_for_user(user))
+        db.commit()
+    return tokens
+
+
+def inject_latency(seconds: float) -> None:
+    from sqlalchemy import event
+    from sqlalchemy.util import await_only
+
+    from app.db import async_engine, engine
+
+    def blocking(*_args) -> None:
+        time.sleep(seconds)
+
+    def awaited(*_args) -> None:
+        # Runs inside the greenlet SQLAlchemy drives the async driver from, so this
+        # suspends only the calling request, like a real network wait would.
+        await_only(asyncio.sleep(seconds))
+
+    event.listen(engine, "before_cursor_execute", blocking)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", awaited)
+
+
+async def drive(client, tokens: list, mode: str, clients: int, seconds: float) -> dict:
+    prefix = "/legacy" if mode == "sync" else "/api"
+    paths = (f"{prefix}/sounds", f"{prefix}/detections?limit=50")
+    latencies, health, errors = [], [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(index: int) -> None:
+        nonlocal errors
+        headers = {"Authorization": f"Bearer {tokens[index % len(tokens)]}"}
+        request = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(paths[request % len(paths)], headers=headers)
+            request += 1
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def probe() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await client.get("/health")
+            health.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(probe(), *(worker(index) for index in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {"mode": mode, "requests": summarize(latencies, elapsed), "health": summarize(health), "errors": errors}
+
+
+async def run(args: argparse.Namespace) -> list:
+    import httpx
+
+    from app.main import app
+
+    add_legacy_routes(app)
+    tokens = seed()
+    inject_latency(args.latency_ms / 1000)
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for mode in args.mode:
+            # One pass per mode to fill the auth caches and open pooled connections.
+            await drive(client, tokens, mode, min(args.clients, len(tokens)), 0.5)
+            results.append(await drive(client, tokens, mode, args.clients, args.seconds))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--clients", type=int, default=12, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated round-trip per statement")
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    args = parser.parse_args()
+    configure_environment()
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.clients} clients, {args.latency_ms:g} ms per statement, {args.seconds:g} s per mode")
+    print(f"{'mode':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'health p99 ms':>14} {'errors':>7}")
+    for row in results:
+        requests, health = row["requests"], row["health"]
+        print(
+            f"{row['mode']:>6} {requests.get('throughput_rps', 0):>8} {requests.get('p50_ms', 0):>8}"
+            f" {requests.get('p99_ms', 0):>8} {health.get('p99_ms', 0):>14} {row['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
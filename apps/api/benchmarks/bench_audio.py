@@ -0,0 +1,103 @@
+"""Compare the fast WAV decode and cached polyphase resampler with soundfile + resampy.
+
+Run from apps/api:  python -m benchmarks.bench_audio [--json]
+"""
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import argparse
+import io
+import json
+import time
+import wave
+import numpy as np
+import soundfile as sf
+
+from app.audio import decode_audio, resample
+
+CASES = (
+    (16000, 1),
+    (44100, 1),
+    (48000, 1),
+    (48000, 2),
+)
+SECONDS = 1.0
+
+
+def make_wav(sample_rate: int, channels: int) -> bytes:
+    rng = np.random.default_rng(sample_rate + channels)
+    pcm = (rng.uniform(-0.5, 0.5, (int(sample_rate * SECONDS), channels)) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def baseline_decode(data: bytes):
+    audio, sample_rate = sf.read(io.BytesIO(data))
+    if audio.ndim > 1:
+        audio = np.mean(audio, axis=1)
+    return audio.astype(np.float32), sample_rate
+
+
+def baseline_resample(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    import resampy
+
+    if sample_rate != 16000:
+        audio = resampy.resample(audio, sample_rate, 16000)
+    return audio.astype(np.float32, copy=False)
+
+
+def time_call(fn, *args, min_seconds: float = 0.2) -> float:
+    fn(*args)
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn(*args)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1e6
+
+
+def run() -> list[dict]:
+    results = []
+    for sample_rate, channels in CASES:
+        data = make_wav(sample_rate, channels)
+        audio, _ = decode_audio(data)
+        row = {
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "sf_decode_us": round(time_call(baseline_decode, data), 1),
+            "fast_decode_us": round(time_call(decode_audio, data), 1),
+            "poly_resample_us": round(time_call(resample, audio, sample_rate, 16000), 1),
+        }
+        try:
+            row["resampy_us"] = round(time_call(baseline_resample, audio, sample_rate), 1)
+        except ImportError:
+            row["resampy_us"] = None
+        results.append(row)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    args = parser.parse_args()
+    results = run()
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'rate':>6} {'ch':>3} {'sf decode us':>13} {'fast decode us':>15} {'resampy us':>11} {'poly us':>8}")
+    for row in results:
+        print(
+            f"{row['sample_rate']:>6} {row['channels']:>3} {row['sf_decode_us']:>13} {row['fast_decode_us']:>15}"
+            f" {row['resampy_us'] or '-':>11} {row['poly_resample_us']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
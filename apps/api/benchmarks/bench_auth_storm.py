@@ -0,0 +1,158 @@
+"""Measure inference latency while a burst of logins hashes passwords.
+
+"legacy" replays the previous login handler: a sync endpoint verifying bcrypt on the
+shared Starlette threadpool, so every concurrent login holds a threadpool slot and a
+hashing thread. "bounded" uses the current /api/auth/login, where bcrypt runs on the
+password hasher's own pool of TIKUN_PASSWORD_HASH_WORKERS threads and logins past
+TIKUN_PASSWORD_HASH_MAX_PENDING get 503. During each storm, probes time /api/infer
+and /api/detections/summary (a handler that flushes the detection writer on a worker
+thread). A "quiet" pass gives the baseline. Runs in-process through httpx's ASGI
+transport against a temporary SQLite database.
+
+Run from apps/api:  python -m benchmarks.bench_auth_storm [--logins 64] [--seconds 10] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.load import make_wav, summarize
+
+MODES = ("quiet", "legacy", "bounded")
+PASSWORD = "Password123"
+
+
+def configure_environment() -> None:
+    # Settings are read at import time, so this has to run before any app import.
+    workdir = tempfile.mkdtemp(prefix="tikun-bench-auth-")
+    os.environ["TIKUN_EMBEDDING_BACKEND"] = "mock"
+    os.environ.setdefault("TIKUN_DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("TIKUN_INDEX_DIR", os.path.join(workdir, "index"))
+    os.environ.setdefault("TIKUN_RATE_LIMIT_PER_MINUTE", "1000000")
+
+
+def add_legacy_login(app) -> None:
+    from fastapi import Depends, HTTPException
+    from sqlalchemy.orm import Session
+
+    from app.auth import create_token_for_user, pwd_context
+    from app.db import get_db
+    from app.models import User
+    from app.schemas import AuthResponse, UserLogin
+
+    def login(payload: UserLogin, db: Session = Depends(get_db)):
+        user = db.query(User).filter(User.email == payload.email).first()
+        if not user or not pwd_context.verify(payload.password, user.hashed_password):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
+        return {"access_token": create_token_for_user(user)}
+
+    app.add_api_route("/legacy/login", login, methods=["POST"], response_model=AuthResponse)
+
+
+def seed(users: int) -> tuple[list, str]:
+    from app.auth import create_token_for_user, pwd_context
+    from app.db import SessionLocal
+    from app.models import User
+
+    # One hash shared by every account: each verify still pays the full bcrypt cost.
+    hashed = pwd_context.hash(PASSWORD)
+    emails = [f"storm-{index}@example.com" for index in range(users)]
+    with SessionLocal() as db:
+        accounts = [User(email=email, hashed_password=hashed, is_verified=True) for email in emails]
+        db.add_all(accounts)
+        db.commit()
+        token = create_token_for_user(accounts[0])
+    return emails, token
+
+
+async def storm_pass(client, mode: str, emails: list, token: str, clip: bytes, seconds: float) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.perf_counter() + seconds
+    logins, busy, failed, infer, summary = [], 0, 0, [], []
+
+    async def login(email: str) -> None:
+        nonlocal busy, failed
+        path = "/legacy/login" if mode == "legacy" else "/api/auth/login"
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post(path, json={"email": email, "password": PASSWORD})
+            if response.status_code == 503:
+                busy += 1
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+                continue
+            if response.status_code != 200:
+                failed += 1
+                continue
+            logins.append((time.perf_counter() - started) * 1000)
+
+    async def probe(latencies: list, request) -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await request()
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.05)
+
+    files = lambda: {"file": ("clip.wav", clip, "audio/wav")}
+    started = time.perf_counter()
+    await asyncio.gather(
+        probe(infer, lambda: client.post("/api/infer", files=files(), headers=headers)),
+        probe(summary, lambda: client.get("/api/detections/summary", headers=headers)),
+        *(login(email) for email in (emails if mode != "quiet" else [])),
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "logins": summarize(logins, elapsed),
+        "logins_rejected": busy,
+        "logins_failed": failed,
+        "infer": summarize(infer),
+        "summary": summarize(summary),
+    }
+
+
+async def run(args: argparse.Namespace) -> list:
+    import httpx
+
+    from app.main import app
+
+    add_legacy_login(app)
+    emails, token = seed(args.logins)
+    clip = make_wav(np.random.default_rng(0), 0.96, 16000)
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench", timeout=120) as client:
+        await storm_pass(client, "quiet", emails, token, clip, 1.0)
+        for mode in args.mode:
+            results.append(await storm_pass(client, mode, emails, token, clip, args.seconds))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--logins", type=int, default=64, help="concurrent clients logging in")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    args = parser.parse_args()
+    configure_environment()
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.logins} concurrent logins, {args.seconds:g} s per mode")
+    print(f"{'mode':>8} {'logins/s':>9} {'503s':>6} {'errors':>7} {'infer p50':>10} {'infer p99':>10} {'summary p50':>12} {'summary p99':>12}")
+    for row in results:
+        logins, infer, summary = row["logins"], row["infer"], row["summary"]
+        print(
+            f"{row['mode']:>8} {logins.get('throughput_rps', 0):>9} {row['logins_rejected']:>6} {row['logins_failed']:>7}"
+            f" {infer.get('p50_ms', 0):>10} {infer.get('p99_ms', 0):>10}"
+            f" {summary.get('p50_ms', 0):>12} {summary.get('p99_ms', 0):>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the NumPy cosine-kNN classifier with the previous sklearn implementation.
+
+Run from apps/api:  python -m benchmarks.bench_classifier [--json]
+"""
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import argparse
+import json
+import time
+import numpy as np
+
+from app.ml import Prediction, UserClassifier
+
+SIZES = (10, 100, 1_000, 10_000)
+DIM = 1024
+CLASSES = 8
+
+
+class SklearnClassifier:
+    def __init__(self) -> None:
+        from sklearn.neighbors import NearestNeighbors
+
+        self._factory = NearestNeighbors
+
+    def fit(self, embeddings, labels, names) -> None:
+        self.nn = self._factory(n_neighbors=min(5, len(embeddings)), metric="cosine")
+        self.nn.fit(embeddings)
+        self.labels = labels
+        self.sound_names = names
+
+    def predict(self, embedding) -> Prediction:
+        distances, indices = self.nn.kneighbors([embedding])
+        best_index = indices[0][0]
+        label = self.labels[best_index]
+        confidence = max(0.0, 1.0 - float(distances[0][0]))
+        return Prediction(label=label or "unknown", sound_id=label, sound_name=self.sound_names[best_index], confidence=confidence)
+
+
+def time_predict(classifier, queries: np.ndarray, min_seconds: float = 0.2) -> float:
+    classifier.predict(queries[0])
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        for query in queries:
+            classifier.predict(query)
+        calls += len(queries)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1e6
+
+
+def run(sizes=SIZES, queries: int = 50) -> list[dict]:
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        embeddings = rng.random((size, DIM)).astype(np.float32)
+        labels = [f"sound-{index % CLASSES}" for index in range(size)]
+        names = {label: label.title() for label in set(labels)}
+        query_set = rng.random((queries, DIM)).astype(np.float32)
+        row = {"samples": size}
+        try:
+            baseline = SklearnClassifier()
+            baseline.fit(embeddings, labels, [names[label] for label in labels])
+            row["sklearn_us"] = round(time_predict(baseline, query_set), 1)
+        except ImportError:
+            row["sklearn_us"] = None
+        for mode in ("knn", "centroid"):
+            classifier = UserClassifier(mode=mode)
+            classifier.fit(embeddings, labels, names)
+            row[f"{mode}_us"] = round(time_predict(classifier, query_set), 1)
+        results.append(row)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    results = run(queries=args.queries)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'samples':>8} {'sklearn us':>11} {'knn us':>8} {'centroid us':>12} {'speedup':>8}")
+    for row in results:
+        speedup = f"{row['sklearn_us'] / row['knn_us']:.1f}x" if row["sklearn_us"] else "-"
+        print(f"{row['samples']:>8} {row['sklearn_us'] or '-':>11} {row['knn_us']:>8} {row['centroid_us']:>12} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
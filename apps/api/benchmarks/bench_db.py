@@ -0,0 +1,191 @@
+"""Measure detection writes/sec under parallel inference load, per database profile.
+
+Each API worker is a separate process with several request threads. A thread stands in
+for one inference request: some CPU work in place of the model, then a read of the
+user's sounds and a committed detection event with its rollups. Another thread per
+worker keeps paging detection history. Each profile gets its own fresh SQLite file
+(or the database given with --url), and every worker process starts at the same moment.
+
+Run from apps/api:  python -m benchmarks.bench_db [--profile default tuned] [--workers 4] [--threads 2] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = ("default", "tuned")
+USERS = 8
+
+
+def child(worker: int, threads: int, seconds: float, start_at: float, work_ms: float) -> dict:
+    # The engine is built when app.db is imported, from the profile in the environment.
+    os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+    import threading
+    import uuid
+    from datetime import datetime
+
+    import numpy as np
+    from sqlalchemy.exc import OperationalError
+
+    from app.db import SessionLocal
+    from app.detections import history_page, rollup_rows, upsert_rollups
+    from app.models import DetectionEvent, Sound
+
+    matrix = np.random.default_rng(worker).standard_normal((256, 256)).astype(np.float32)
+    lock = threading.Lock()
+    totals = {"writes": 0, "reads": 0, "locked": 0}
+    latencies = []
+
+    def locked(exc: OperationalError) -> bool:
+        return "locked" in str(exc) or "busy" in str(exc)
+
+    def infer(thread: int) -> None:
+        user_id = f"user-{(worker * threads + thread) % USERS}"
+        while time.time() < start_at + seconds:
+            spent = time.perf_counter()
+            while (time.perf_counter() - spent) * 1000 < work_ms:
+                matrix @ matrix
+            started = time.perf_counter()
+            try:
+                with SessionLocal() as db:
+                    sounds = [sound_id for (sound_id,) in db.query(Sound.id).filter(Sound.user_id == user_id)]
+                    row = {
+                        "id": str(uuid.uuid4()),
+                        "user_id": user_id,
+                        "sound_id": sounds[0] if sounds else None,
+                        "confidence": 0.9,
+                        "created_at": datetime.utcnow(),
+                    }
+                    db.add(DetectionEvent(**row))
+                    upsert_rollups(db, rollup_rows([row]))
+                    db.commit()
+            except OperationalError as exc:
+                if not locked(exc):
+                    raise
+                with lock:
+                    totals["locked"] += 1
+                continue
+            with lock:
+                totals["writes"] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    def browse() -> None:
+        user_id = f"user-{worker % USERS}"
+        while time.time() < start_at + seconds:
+            try:
+                with SessionLocal() as db:
+                    history_page(db.query(DetectionEvent).filter(DetectionEvent.user_id == user_id), None, 50)
+            except OperationalError as exc:
+                if not locked(exc):
+                    raise
+                with lock:
+                    totals["locked"] += 1
+                continue
+            with lock:
+                totals["reads"] += 1
+
+    workers = [threading.Thread(target=infer, args=(thread,)) for thread in range(threads)]
+    workers.append(threading.Thread(target=browse))
+    time.sleep(max(0.0, start_at - time.time()))
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return {**totals, "latencies": latencies}
+
+
+def seed(url: str) -> None:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db import Base
+    from app.models import Sound, User
+
+    bind = create_engine(url)
+    Base.metadata.create_all(bind=bind)
+    with sessionmaker(bind=bind)() as db:
+        if db.get(User, "user-0") is None:
+            for index in range(USERS):
+                user_id = f"user-{index}"
+                db.add(User(id=user_id, email=f"{user_id}@example.com", hashed_password="x"))
+                db.add(Sound(id=f"sound-{index}", user_id=user_id, name="Door knock"))
+            db.commit()
+    bind.dispose()
+
+
+def run(profile: str, args: argparse.Namespace) -> dict:
+    url = args.url or f"sqlite:///{tempfile.mkdtemp(prefix='tikun-bench-db-')}/bench.db"
+    seed(url)
+    env = {**os.environ, "TIKUN_DATABASE_URL": url, "TIKUN_DATABASE_PROFILE": profile, "TIKUN_EMBEDDING_BACKEND": "mock"}
+    start_at = time.time() + 3.0
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.bench_db", "--child", str(worker),
+                "--threads", str(args.threads), "--seconds", str(args.seconds),
+                "--start-at", str(start_at), "--work-ms", str(args.work_ms),
+            ],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        for worker in range(args.workers)
+    ]
+    results = []
+    for process in processes:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            lines = stderr.strip().splitlines()
+            return {"profile": profile, "error": lines[-1] if lines else f"exit {process.returncode}"}
+        results.append(json.loads(stdout.strip().splitlines()[-1]))
+    latencies = sorted(value for result in results for value in result["latencies"])
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else 0.0
+
+    writes = sum(result["writes"] for result in results)
+    return {
+        "profile": profile,
+        "writes_per_s": round(writes / args.seconds, 1),
+        "reads_per_s": round(sum(result["reads"] for result in results) / args.seconds, 1),
+        "locked_errors": sum(result["locked"] for result in results),
+        "write_p50_ms": percentile(0.5),
+        "write_p99_ms": percentile(0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", nargs="+", choices=PROFILES, default=list(PROFILES))
+    parser.add_argument("--workers", type=int, default=4, help="API worker processes")
+    parser.add_argument("--threads", type=int, default=2, help="concurrent inference requests per worker")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--work-ms", type=float, default=2.0, help="CPU time per request before its commit")
+    parser.add_argument("--url", help="database to use instead of a fresh SQLite file per profile")
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(child(args.child, args.threads, args.seconds, args.start_at, args.work_ms)))
+        return
+    results = [run(profile, args) for profile in args.profile]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.workers} workers x {args.threads} threads, {args.seconds:g} s per profile")
+    print(f"{'profile':>8} {'writes/s':>9} {'reads/s':>8} {'locked':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['profile']:>8}  {row['error']}")
+            continue
+        print(
+            f"{row['profile']:>8} {row['writes_per_s']:>9} {row['reads_per_s']:>8} {row['locked_errors']:>7}"
+            f" {row['write_p50_ms']:>7} {row['write_p99_ms']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
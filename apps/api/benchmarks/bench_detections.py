@@ -0,0 +1,120 @@
+"""Time detection history paging and per-sound hourly counts, old layout vs new.
+
+The old layout has only a user_id index, pages with OFFSET and aggregates by scanning
+raw events. The new one has the (user_id, created_at, id) index, keyset cursors and
+the rollup table. Both run against the same temporary SQLite database.
+
+Run from apps/api:  python -m benchmarks.bench_detections [--events 500000] [--json]
+"""
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.detections import history_page, rollup_rows, summarize, upsert_rollups
+from app.models import DetectionEvent
+
+USERS = 20
+SOUNDS = 8
+PAGE = 50
+
+
+def seed(Session, events: int) -> datetime:
+    rng = np.random.default_rng(0)
+    start = datetime(2024, 1, 1)
+    with Session() as db:
+        for offset in range(0, events, 50_000):
+            count = min(50_000, events - offset)
+            seconds = rng.integers(0, 7 * 24 * 3600, count)
+            rows = [
+                {
+                    "id": f"{offset + index:012d}",
+                    "user_id": f"user-{index % USERS}",
+                    "sound_id": f"sound-{sound}" if sound else None,
+                    "confidence": float(confidence),
+                    "created_at": start + timedelta(seconds=int(second)),
+                }
+                for index, (second, sound, confidence) in enumerate(
+                    zip(seconds, rng.integers(0, SOUNDS, count), rng.random(count))
+                )
+            ]
+            db.execute(insert(DetectionEvent), rows)
+            upsert_rollups(db, rollup_rows(rows))
+            db.commit()
+    return start
+
+
+def timed(fn, repeat: int = 5) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - started) / repeat * 1000, 2)
+
+
+def user_events(db):
+    return db.query(DetectionEvent).filter(DetectionEvent.user_id == "user-0")
+
+
+def run(events: int, depth: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="tikun-bench-detections-")
+    engine = create_engine(f"sqlite:///{directory}/bench.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    seeded = time.perf_counter()
+    start = seed(Session, events)
+    result = {"events": events, "seed_s": round(time.perf_counter() - seeded, 1), "depth_pages": depth}
+    until = start + timedelta(days=7)
+
+    with Session() as db:
+        cursor = None
+        for _ in range(depth):
+            _, cursor = history_page(user_events(db), cursor, PAGE)
+        result["new_first_page_ms"] = timed(lambda: history_page(user_events(db), None, PAGE))
+        result["new_deep_page_ms"] = timed(lambda: history_page(user_events(db), cursor, PAGE))
+        result["new_summary_ms"] = timed(lambda: summarize(db, "user-0", "hour", start, until))
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_detection_events_user_created"))
+        conn.execute(text("CREATE INDEX ix_detection_events_user_id ON detection_events (user_id)"))
+    with Session() as db:
+        ordered = user_events(db).order_by(DetectionEvent.created_at.desc())
+        hour = func.strftime("%Y-%m-%d %H:00", DetectionEvent.created_at)
+        raw_summary = (
+            db.query(hour, DetectionEvent.sound_id, func.count(), func.max(DetectionEvent.confidence))
+            .filter(DetectionEvent.user_id == "user-0", DetectionEvent.created_at >= start, DetectionEvent.created_at < until)
+            .group_by(hour, DetectionEvent.sound_id)
+        )
+        result["old_first_page_ms"] = timed(lambda: ordered.limit(PAGE).all())
+        result["old_deep_page_ms"] = timed(lambda: ordered.offset(depth * PAGE).limit(PAGE).all())
+        result["old_summary_ms"] = timed(lambda: raw_summary.all())
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--depth", type=int, default=200, help="pages to skip for the deep-page timing")
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    args = parser.parse_args()
+    result = run(args.events, args.depth)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['events']} events, {USERS} users, seeded in {result['seed_s']} s")
+    print(f"{'query':>24} {'old ms':>9} {'new ms':>9}")
+    for name, label in (("first_page", "first page"), ("deep_page", f"page {result['depth_pages']}"), ("summary", "hourly counts (7 days)")):
+        print(f"{label:>24} {result[f'old_{name}_ms']:>9} {result[f'new_{name}_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
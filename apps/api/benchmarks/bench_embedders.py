@@ -0,0 +1,109 @@
+"""Compare embedding backends on startup time, resident memory and per-clip latency.
+
+Run from apps/api:  python -m benchmarks.bench_embedders --backend yamnet onnx [--json]
+
+Each backend is measured in a fresh interpreter so import cost and RSS are not shared.
+Point TIKUN_EMBEDDING_MODEL_PATH at the file written by scripts/export_yamnet.py.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BACKENDS = ("yamnet", "onnx", "tflite", "remote", "mock")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(backend: str, seconds: float, iterations: int, batch: int) -> dict:
+    # The app builds its embedder when app.ml is imported, so that import is the
+    # startup cost a worker pays: runtime import plus model load.
+    os.environ["TIKUN_EMBEDDING_BACKEND"] = backend
+    import numpy as np
+    from app import audio  # noqa: F401  shared by every backend, kept out of the timing
+
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    from app.ml import model_registry
+
+    loaded = time.perf_counter()
+    embedder = model_registry.embedder
+    rng = np.random.default_rng(0)
+    clip = rng.uniform(-0.5, 0.5, int(16000 * seconds)).astype(np.float32)
+    first_started = time.perf_counter()
+    embedder.extract(clip, 16000)
+    first_ms = (time.perf_counter() - first_started) * 1000
+    timings = []
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        embedder.extract(clip, 16000)
+        timings.append((time.perf_counter() - call_started) * 1000)
+    clips = [embedder.prepare(clip, 16000) for _ in range(batch)]
+    batch_started = time.perf_counter()
+    embedder.embed_batch(clips)
+    batch_ms = (time.perf_counter() - batch_started) * 1000
+    return {
+        "backend": backend,
+        "version": embedder.version,
+        "startup_s": round(loaded - started, 3),
+        "first_call_ms": round(first_ms, 2),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - baseline_rss, 1),
+        "clip_p50_ms": round(float(np.percentile(timings, 50)), 2),
+        "clip_p95_ms": round(float(np.percentile(timings, 95)), 2),
+        f"batch{batch}_per_clip_ms": round(batch_ms / batch, 2),
+    }
+
+
+def run_isolated(backend: str, args: argparse.Namespace) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_embedders", "--child", backend,
+        "--seconds", str(args.seconds), "--iterations", str(args.iterations), "--batch", str(args.batch),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {"backend": backend, "error": lines[-1] if lines else f"exit {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", nargs="+", choices=BACKENDS, default=["yamnet", "onnx"])
+    parser.add_argument("--seconds", type=float, default=1.0, help="clip length")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.seconds, args.iterations, args.batch)))
+        return
+    results = [run_isolated(backend, args) for backend in args.backend]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    batch_key = f"batch{args.batch}_per_clip_ms"
+    print(f"{'backend':>8} {'startup s':>10} {'rss MB':>7} {'+rss MB':>8} {'p50 ms':>7} {'p95 ms':>7} {'batch/clip ms':>14}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['backend']:>8}  {row['error']}")
+            continue
+        print(
+            f"{row['backend']:>8} {row['startup_s']:>10} {row['rss_mb']:>7} {row['rss_delta_mb']:>8}"
+            f" {row['clip_p50_ms']:>7} {row['clip_p95_ms']:>7} {row[batch_key]:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Load and latency benchmark for the API hot paths.
+
+Synthesizes users with training samples, then drives /api/infer, /api/train/sample
+and /api/train/rebuild concurrently, either in-process (ASGI transport, temporary
+SQLite database) or against a running server. A separate in-process pass times each
+stage of the inference path on the same clips. Results are printed as JSON.
+
+Run from apps/api:
+    python -m benchmarks.load --users 20 --samples 10 --requests 30
+    python -m benchmarks.load --backend yamnet --model /models/yamnet/1 --output bench.json
+    python -m benchmarks.load --url http://localhost:8000   # server needs a high rate limit
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the Tikun API hot paths.")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=10, help="training samples per user")
+    parser.add_argument("--sounds", type=int, default=3, help="sounds per user")
+    parser.add_argument("--requests", type=int, default=20, help="inference requests per user")
+    parser.add_argument("--train-every", type=int, default=10, help="upload a training sample every N inferences")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--clip-seconds", type=float, default=0.96)
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--stage-iterations", type=int, default=50)
+    parser.add_argument("--backend", choices=["mock", "yamnet", "onnx", "tflite"], default="mock")
+    parser.add_argument("--model", help="local YAMNet SavedModel directory (yamnet) or exported model file (onnx/tflite)")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--output", help="also write the JSON report to this path")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    # Settings are read at import time, so this has to run before any app import.
+    os.environ["TIKUN_EMBEDDING_BACKEND"] = args.backend
+    if args.model:
+        key = "TIKUN_YAMNET_MODEL_HANDLE" if args.backend == "yamnet" else "TIKUN_EMBEDDING_MODEL_PATH"
+        os.environ[key] = args.model
+    workdir = tempfile.mkdtemp(prefix="tikun-bench-")
+    os.environ.setdefault("TIKUN_DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("TIKUN_INDEX_DIR", os.path.join(workdir, "index"))
+    os.environ.setdefault("TIKUN_RATE_LIMIT_PER_MINUTE", "1000000")
+
+
+def make_wav(rng: np.random.Generator, seconds: float, sample_rate: int) -> bytes:
+    import io
+    import wave
+
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = 0.2 * np.sin(2 * np.pi * rng.uniform(200, 2000) * t) + 0.02 * rng.standard_normal(t.size)
+    pcm = (np.clip(tone, -1, 1) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def summarize(latencies_ms: list, elapsed_s: float | None = None) -> dict:
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.asarray(latencies_ms)
+    summary = {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+    if elapsed_s:
+        summary["throughput_rps"] = round(values.size / elapsed_s, 2)
+    return summary
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list] = {}
+        self.errors: dict[str, dict] = {}
+
+    async def call(self, name: str, request):
+        import time
+
+        started = time.perf_counter()
+        response = await request
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            errors = self.errors.setdefault(name, {})
+            errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+        else:
+            self.latencies.setdefault(name, []).append(elapsed_ms)
+        return response
+
+
+async def run_http(args: argparse.Namespace, client) -> dict:
+    import asyncio
+    import time
+    import uuid
+
+    rng = np.random.default_rng(args.seed)
+    clips = [make_wav(rng, args.clip_seconds, args.sample_rate) for _ in range(max(8, args.sounds * 4))]
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    run_id = uuid.uuid4().hex[:8]
+
+    async def limited(name, request_factory):
+        async with semaphore:
+            return await recorder.call(name, request_factory())
+
+    async def create_user(index: int) -> dict:
+        email = f"bench-{run_id}-{index}@example.com"
+        response = await limited("auth_signup", lambda: client.post(
+            "/api/auth/signup", json={"email": email, "password": "Password123"}
+        ))
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        sound_ids = []
+        for sound_index in range(args.sounds):
+            response = await limited("sounds_create", lambda: client.post(
+                "/api/sounds", headers=headers, json={"name": f"Sound {sound_index}"}
+            ))
+            sound_ids.append(response.json()["id"])
+        return {"headers": headers, "sounds": sound_ids}
+
+    def train(user: dict, sample_index: int):
+        sound_index = sample_index % len(user["sounds"])
+        clip = clips[sound_index % len(clips)]
+        return limited("train_sample", lambda: client.post(
+            "/api/train/sample",
+            headers=user["headers"],
+            files={"file": ("sample.wav", clip, "audio/wav")},
+            data={"sound_id": user["sounds"][sound_index], "label": "positive"},
+        ))
+
+    users = await asyncio.gather(*(create_user(index) for index in range(args.users)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(train(user, index) for user in users for index in range(args.samples)))
+    await asyncio.gather(*(limited("train_rebuild", lambda user=user: client.post(
+        "/api/train/rebuild", headers=user["headers"]
+    )) for user in users))
+    setup_seconds = time.perf_counter() - started
+
+    async def listen(user: dict) -> None:
+        for request_index in range(args.requests):
+            clip = clips[int(rng.integers(len(clips)))]
+            await limited("infer", lambda: client.post(
+                "/api/infer", headers=user["headers"], files={"file": ("chunk.wav", clip, "audio/wav")}
+            ))
+            if args.train_every and request_index % args.train_every == args.train_every - 1:
+                await train(user, request_index)
+        await limited("train_rebuild", lambda: client.post("/api/train/rebuild", headers=user["headers"]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(listen(user) for user in users))
+    mixed_seconds = time.perf_counter() - started
+
+    return {
+        "setup_seconds": round(setup_seconds, 3),
+        "mixed_seconds": round(mixed_seconds, 3),
+        "endpoints": {
+            name: summarize(values, mixed_seconds if name == "infer" else None)
+            for name, values in sorted(recorder.latencies.items())
+        },
+        "errors": recorder.errors,
+    }
+
+
+def run_stages(args: argparse.Namespace) -> dict:
+    import asyncio
+    import time
+    from starlette.datastructures import Headers
+    from starlette.formparsers import MultiPartParser
+    from app.db import Base, SessionLocal, engine
+    from app.ml import UserClassifier, load_audio, model_registry
+    from app.models import DetectionEvent
+
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(args.seed + 1)
+    embedder = model_registry.embedder
+    classifier = UserClassifier()
+    classifier.fit(rng.random((args.samples * args.sounds, 1024)), [f"s{i % args.sounds}" for i in range(args.samples * args.sounds)])
+    boundary = "tikunbenchboundary"
+    stages: dict[str, list] = {name: [] for name in ("upload_parse", "load_audio", "resample", "embed", "classify", "db_write")}
+
+    async def parse(body: bytes) -> bytes:
+        async def stream():
+            yield body
+
+        headers = Headers({"content-type": f"multipart/form-data; boundary={boundary}"})
+        form = await MultiPartParser(headers, stream()).parse()
+        return await form["file"].read()
+
+    def timed(name: str, fn, *fn_args):
+        started = time.perf_counter()
+        result = fn(*fn_args)
+        stages[name].append((time.perf_counter() - started) * 1000)
+        return result
+
+    for _ in range(args.stage_iterations):
+        wav = make_wav(rng, args.clip_seconds, args.sample_rate)
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"chunk.wav\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n"
+        ).encode() + wav + f"\r\n--{boundary}--\r\n".encode()
+        data = timed("upload_parse", lambda: asyncio.run(parse(body)))
+        audio, sample_rate = timed("load_audio", load_audio, data)
+        waveform = timed("resample", embedder.prepare, audio, sample_rate)
+        embedding = timed("embed", lambda: embedder.embed_batch([waveform])[0])
+        prediction = timed("classify", classifier.predict, embedding)
+
+        def write():
+            with SessionLocal() as db:
+                db.add(DetectionEvent(user_id="bench", sound_id=prediction.sound_id, confidence=prediction.confidence))
+                db.commit()
+
+        timed("db_write", write)
+    return {name: summarize(values) for name, values in stages.items()}
+
+
+def git_revision() -> str | None:
+    import subprocess
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> dict:
+    import asyncio
+    import json
+    import platform
+
+    args = parse_args(argv)
+    configure_environment(args)
+    import httpx
+
+    async def wait_ready(client) -> None:
+        # Measure a warm worker, like a rolling deploy would route to; 503 means warming.
+        while (response := await client.get("/ready")).status_code == 503:
+            if response.json().get("status") == "failed":
+                raise SystemExit(f"model warm-up failed: {response.json().get('error')}")
+            await asyncio.sleep(0.1)
+
+    async def drive() -> dict:
+        if args.url:
+            async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+                await wait_ready(client)
+                return await run_http(args, client)
+        from app.main import app, lifespan
+
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                await wait_ready(client)
+                return await run_http(args, client)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "http": asyncio.run(drive()),
+        "stages": run_stages(args),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import tempfile
+import numpy as np
+from app.ml import YAMNET_PATCH_SPAN_SAMPLES
+from app.settings import settings
+
+
+def embedding_function(handle: str):
+    import tensorflow as tf
+    import tensorflow_hub as hub
+
+    model = hub.load(handle)
+
+    # Only the embeddings output is kept, so the converters prune the 521-class scores
+    # head. One patch span yields exactly one patch, identical to the full graph's.
+    @tf.function(input_signature=[tf.TensorSpec([YAMNET_PATCH_SPAN_SAMPLES], tf.float32, name="waveform")])
+    def embed(waveform):
+        _, embeddings, _ = model(waveform)
+        return {"embedding": embeddings}
+
+    return tf, model, embed
+
+
+def export_tflite(handle: str, output: str, quantize: bool) -> None:
+    tf, model, embed = embedding_function(handle)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([embed.get_concrete_function()], model)
+    if quantize:
+        # Dynamic-range quantization: int8 weights, float activations, no calibration set.
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output, "wb") as model_file:
+        model_file.write(converter.convert())
+
+
+def export_onnx(handle: str, output: str, quantize: bool, opset: int) -> None:
+    import tf2onnx
+
+    tf, _, embed = embedding_function(handle)
+    with tempfile.TemporaryDirectory() as workdir:
+        float_path = os.path.join(workdir, "yamnet-embedding.onnx") if quantize else output
+        tf2onnx.convert.from_function(
+            embed,
+            input_signature=[tf.TensorSpec([YAMNET_PATCH_SPAN_SAMPLES], tf.float32, name="waveform")],
+            opset=opset,
+            output_path=float_path,
+        )
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(float_path, output, weight_type=QuantType.QInt8)
+
+
+def check(backend: str, output: str) -> dict:
+    from app.ml import OnnxEmbedder, TfliteEmbedder
+
+    embedder = OnnxEmbedder(output) if backend == "onnx" else TfliteEmbedder(output)
+    embedding = embedder.extract(np.zeros(YAMNET_PATCH_SPAN_SAMPLES, dtype=np.float32), 16000)
+    return {"version": embedder.version, "dims": int(embedding.shape[-1])}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export YAMNet's embedding-only graph for the onnx/tflite backends")
+    parser.add_argument("--format", choices=("onnx", "tflite"), default="onnx")
+    parser.add_argument("--handle", default=settings.yamnet_model_handle, help="TF Hub handle or SavedModel directory")
+    parser.add_argument("--output", default=None, help="defaults to TIKUN_EMBEDDING_MODEL_PATH with the format's suffix")
+    parser.add_argument("--no-quantize", action="store_true", help="keep float32 weights")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    output = args.output or f"{os.path.splitext(settings.embedding_model_path)[0]}.{args.format}"
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if args.format == "onnx":
+        export_onnx(args.handle, output, not args.no_quantize, args.opset)
+    else:
+        export_tflite(args.handle, output, not args.no_quantize)
+    report = {"format": args.format, "output": output, "bytes": os.path.getsize(output), "quantized": not args.no_quantize}
+    report.update(check(args.format, output))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import argparse
+import json
+import os
+from app.artifacts import artifacts
+from app.settings import settings
+
+
+def download(handle: str) -> str:
+    if os.path.exists(handle):
+        return handle
+    import tensorflow_hub as hub
+
+    # Downloads and unpacks into TFHUB_CACHE_DIR, returning the SavedModel directory.
+    return hub.resolve(handle)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Install a model under TIKUN_ARTIFACT_DIR as <name>/<version>")
+    parser.add_argument("--name", default="yamnet")
+    parser.add_argument("--version", default=settings.yamnet_model_version)
+    parser.add_argument("--source", default=settings.yamnet_model_handle, help="TF Hub handle, directory or model file")
+    args = parser.parse_args()
+
+    existing = artifacts.manifest(args.name, args.version)
+    if existing is not None:
+        print(json.dumps({"path": artifacts.path(args.name, args.version), "installed": False, **existing}, indent=2))
+        return
+    path = artifacts.install(args.name, args.version, download(args.source), origin=args.source)
+    print(json.dumps({"path": path, "installed": True, **artifacts.manifest(args.name, args.version)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import time
+from datetime import datetime
+from sqlalchemy import delete, inspect, select, text
+from app.db import SessionLocal, engine
+from app.detections import rollup_rows, upsert_rollups
+from app.maintenance import create_partitions, month_start
+from app.models import Base, DetectionEvent, DetectionRollup
+from app.settings import settings
+
+table = DetectionEvent.__table__
+
+
+def ensure_indexes() -> list[str]:
+    # create_all only creates missing tables, so databases from before the composite
+    # index get it here; the old single-column user_id index is then redundant.
+    existing = {index["name"] for index in inspect(engine).get_indexes("detection_events")}
+    created = []
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=engine)
+            created.append(index.name)
+    if "ix_detection_events_user_id" in existing:
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_detection_events_user_id"))
+    return created
+
+
+def backfill(batch_size: int) -> tuple[int, int]:
+    # Rebuilds the rollups from scratch. Run it before the new API version starts writing
+    # rollups (or with the API stopped), otherwise events flushed meanwhile count twice.
+    # Events are streamed and folded in memory (one entry per bucket, not per event), and
+    # written after the scan so SQLite never holds a read cursor open across the writes.
+    events = 0
+
+    def scan():
+        nonlocal events
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=batch_size).execute(
+                select(table.c.user_id, table.c.sound_id, table.c.confidence, table.c.created_at)
+            )
+            for rows in result.mappings().partitions():
+                yield from rows
+                events += len(rows)
+                print(f"scanned {events} events", flush=True)
+
+    rollups = rollup_rows(scan())
+    with SessionLocal() as db:
+        db.execute(delete(DetectionRollup))
+        for start in range(0, len(rollups), batch_size):
+            upsert_rollups(db, rollups[start:start + batch_size])
+        db.commit()
+    return events, len(rollups)
+
+
+def partition() -> list[str]:
+    # Converts detection_events into a table range-partitioned by month on created_at, so
+    # maintenance can drop expired months whole. The primary key has to include the
+    # partition key. Rows are copied in one transaction; run it in a maintenance window.
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("--partition needs PostgreSQL")
+    with engine.begin() as conn:
+        if conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('detection_events'))"
+        )).scalar():
+            return []
+        oldest = conn.execute(text("SELECT min(created_at) FROM detection_events")).scalar()
+        conn.execute(text("ALTER TABLE detection_events RENAME TO detection_events_unpartitioned"))
+        conn.execute(text(
+            "ALTER TABLE detection_events_unpartitioned RENAME CONSTRAINT detection_events_pkey TO detection_events_unpartitioned_pkey"
+        ))
+        conn.execute(text("ALTER INDEX IF EXISTS ix_detection_events_user_created RENAME TO ix_detection_events_unpartitioned_user_created"))
+        conn.execute(text(
+            "CREATE TABLE detection_events (LIKE detection_events_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        ))
+        conn.execute(text("ALTER TABLE detection_events ALTER COLUMN created_at SET NOT NULL"))
+        conn.execute(text("ALTER TABLE detection_events ADD PRIMARY KEY (id, created_at)"))
+        conn.execute(text("ALTER TABLE detection_events ADD FOREIGN KEY (user_id) REFERENCES users (id)"))
+        conn.execute(text("ALTER TABLE detection_events ADD FOREIGN KEY (sound_id) REFERENCES sounds (id)"))
+        conn.execute(text("CREATE INDEX ix_detection_events_user_created ON detection_events (user_id, created_at, id)"))
+        conn.execute(text("CREATE TABLE detection_events_default PARTITION OF detection_events DEFAULT"))
+        now = datetime.utcnow()
+        created = create_partitions(conn, oldest or now, month_start(now, settings.maintenance_partition_months_ahead))
+        conn.execute(text(
+            "INSERT INTO detection_events (id, user_id, sound_id, confidence, created_at) "
+            "SELECT id, user_id, sound_id, confidence, COALESCE(created_at, now() AT TIME ZONE 'utc') "
+            "FROM detection_events_unpartitioned"
+        ))
+        conn.execute(text("DROP TABLE detection_events_unpartitioned"))
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add the detection history index and build the detection rollups.")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--no-backfill", action="store_true", help="only create the table and indexes")
+    parser.add_argument("--partition", action="store_true", help="convert detection_events to monthly partitions (PostgreSQL)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    created = ensure_indexes()
+    partitions = partition() if args.partition else []
+    events, rollups = (0, 0) if args.no_backfill else backfill(args.batch_size)
+    summary = {
+        "indexes_created": created,
+        "partitions_created": partitions,
+        "events": events,
+        "rollups": rollups,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import time
+from sqlalchemy import bindparam, inspect, null, select, text, update
+from app.codec import encode_embedding, stack_embeddings
+from app.db import SessionLocal, engine
+from app.models import Base, TrainingSample
+from app.settings import settings
+
+table = TrainingSample.__table__
+
+
+def database_size() -> int | None:
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            page_count = conn.execute(text("PRAGMA page_count")).scalar()
+            page_size = conn.execute(text("PRAGMA page_size")).scalar()
+            return page_count * page_size
+        if engine.dialect.name == "postgresql":
+            return conn.execute(text("SELECT pg_total_relation_size('training_samples')")).scalar()
+    return None
+
+
+def time_rebuild() -> dict:
+    started = time.perf_counter()
+    rows = 0
+    with SessionLocal() as db:
+        user_ids = [user_id for (user_id,) in db.query(TrainingSample.user_id).distinct()]
+        for user_id in user_ids:
+            samples = (
+                db.query(TrainingSample.embedding_blob, TrainingSample.embedding)
+                .filter(TrainingSample.user_id == user_id)
+                .all()
+            )
+            rows += len(stack_embeddings([blob if blob is not None else legacy for blob, legacy in samples]))
+    return {"users": len(user_ids), "rows": rows, "seconds": round(time.perf_counter() - started, 4)}
+
+
+def ensure_schema() -> None:
+    columns = {column["name"]: column for column in inspect(engine).get_columns("training_samples")}
+    with engine.begin() as conn:
+        if "embedding_blob" not in columns:
+            blob_type = table.c.embedding_blob.type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE training_samples ADD COLUMN embedding_blob {blob_type}"))
+            columns["embedding_blob"] = {"name": "embedding_blob"}
+        if columns["embedding"]["nullable"]:
+            return
+        if engine.dialect.name == "sqlite":
+            # SQLite cannot drop NOT NULL in place, so copy into a table built from the current model.
+            conn.execute(text("ALTER TABLE training_samples RENAME TO training_samples_legacy"))
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            table.create(conn)
+            names = ", ".join(name for name in columns if name in table.c)
+            conn.execute(text(f"INSERT INTO training_samples ({names}) SELECT {names} FROM training_samples_legacy"))
+            conn.execute(text("DROP TABLE training_samples_legacy"))
+        else:
+            conn.execute(text("ALTER TABLE training_samples ALTER COLUMN embedding DROP NOT NULL"))
+
+
+def convert(dtype: str, batch_size: int) -> int:
+    converted = 0
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(embedding_blob=bindparam("blob"), embedding=null())
+    )
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.embedding)
+                .where(table.c.embedding_blob.is_(None), table.c.embedding.is_not(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return converted
+            conn.execute(statement, [
+                {"row_id": row_id, "blob": encode_embedding(embedding, dtype)} for row_id, embedding in rows
+            ])
+        converted += len(rows)
+        print(f"converted {converted} rows", flush=True)
+
+
+def vacuum() -> None:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("VACUUM"))
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text("VACUUM FULL training_samples"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert JSON training-sample embeddings to binary blobs.")
+    parser.add_argument("--dtype", default=settings.embedding_storage_dtype, choices=["float32", "float16", "int8"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--no-vacuum", action="store_true", help="skip reclaiming space after conversion")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    before = {"bytes": database_size()}
+    ensure_schema()
+    before["rebuild"] = time_rebuild()
+    converted = convert(args.dtype, args.batch_size)
+    if not args.no_vacuum:
+        vacuum()
+    after = {"bytes": database_size(), "rebuild": time_rebuild()}
+    print(json.dumps({"dtype": args.dtype, "converted": converted, "before": before, "after": after}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+
+import numpy as np
+import pytest
+
+from app.ann import IVFPQIndex
+from app.ml import ModelRegistry, UserClassifier
+
+
+def library(rng, sounds=40, per_sound=50, dim=64):
+    centers = np.abs(rng.standard_normal((sounds, dim))).astype(np.float32)
+    codes = np.repeat(np.arange(sounds), per_sound)
+    rows = centers[codes] + 0.2 * rng.standard_normal((len(codes), dim)).astype(np.float32)
+    return centers, rows, [f"sound-{code}" for code in codes]
+
+
+def normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def test_ivfpq_candidates_contain_exact_neighbors():
+    rng = np.random.default_rng(0)
+    centers, rows, _ = library(rng)
+    rows = normalized(rows)
+    index = IVFPQIndex(subquantizers=16, nprobe=8, rerank=100)
+    index.train(rows, len(rows))
+    index.add(rows)
+    recalled = []
+    for query in normalized(centers[:10] + 0.2 * rng.standard_normal(centers[:10].shape).astype(np.float32)):
+        candidates, _ = index.candidates(query, 100)
+        exact = np.argsort(-(rows @ query))[:10]
+        recalled.append(len(set(exact) & set(candidates)) / 10)
+    assert np.mean(recalled) >= 0.9
+
+
+def test_classifier_ann_agrees_with_exact_and_grows():
+    rng = np.random.default_rng(1)
+    centers, rows, labels = library(rng)
+    exact = UserClassifier(k=5)
+    approximate = UserClassifier(k=5, ann_min_rows=1000, ann_subquantizers=16)
+    exact.fit(rows, labels)
+    approximate.fit(rows, labels)
+    assert approximate._ann is not None and exact._ann is None
+    for sound in range(0, 40, 4):
+        assert approximate.predict(centers[sound]).sound_id == exact.predict(centers[sound]).sound_id == f"sound-{sound}"
+
+    original = approximate.clone()
+    new_sound = np.abs(rng.standard_normal(64)).astype(np.float32)
+    approximate.add(new_sound + 0.01 * rng.standard_normal((5, 64)).astype(np.float32), ["new"] * 5)
+    assert approximate.predict(new_sound).sound_id == "new"
+    assert original.predict(new_sound).sound_id != "new"
+
+
+def test_removed_sounds_are_never_predicted():
+    rng = np.random.default_rng(2)
+    centers, rows, labels = library(rng)
+    for classifier in (UserClassifier(k=5), UserClassifier(k=5, ann_min_rows=1000, ann_subquantizers=16)):
+        classifier.fit(rows, labels)
+        assert classifier.predict(centers[3]).sound_id == "sound-3"
+        classifier.remove(["sound-3"])
+        assert classifier.predict(centers[3]).sound_id != "sound-3"
+
+
+def test_registry_trains_ann_in_background_and_persists_quantizers(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.ml.settings.index_dir", str(tmp_path))
+    monkeypatch.setattr("app.ml.settings.ann_min_rows", 1000)
+    monkeypatch.setattr("app.ml.settings.ann_subquantizers", 16)
+    centers, rows, labels = library(np.random.default_rng(3))
+    first = ModelRegistry()
+    first.store.write("user", rows, labels, {})
+
+    # Exact search serves while the index trains; it is swapped in once ready.
+    assert first.get_classifier("user")._ann is None
+    first._ann_builder.submit(lambda: None).result()
+    assert first.get_classifier("user")._ann is not None
+    assert first.get_classifier("user").predict(centers[5]).sound_id == "sound-5"
+
+    # Another worker reuses the persisted quantizers and only encodes the rows.
+    monkeypatch.setattr(IVFPQIndex, "train", lambda *args: pytest.fail("retrained"))
+    second = ModelRegistry()
+    second.get_classifier("user")
+    second._ann_builder.submit(lambda: None).result()
+    assert second.get_classifier("user")._ann.nlist == first.get_classifier("user")._ann.nlist
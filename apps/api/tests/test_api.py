@@ -1,6 +1,8 @@
 import os
+import tempfile
 os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
 os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test_api.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
 
 import io
 import wave
@@ -126,6 +128,11 @@ def test_train_and_rebuild():
     
     # Rebuild classifier
     response = client.post("/api/train/rebuild", headers=headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("queued", "running", "rebuilt")
+
+    response = client.get(f"/api/train/jobs/{job['id']}", headers=headers, params={"wait": 5})
     assert response.status_code == 200
     rebuild = response.json()
     assert rebuild["status"] == "rebuilt"
@@ -202,7 +209,60 @@ def test_detections():
     assert "confidence" in detections[0]
 
 
+def test_detection_reads_survive_a_failed_flush(monkeypatch):
+    from app.db import SessionLocal
+    from app.detections import detection_sink
+    from app.ml import Prediction
+    from app.models import User
+
+    response = client.post("/api/auth/signup", json={"email": "flushfail@example.com", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    with SessionLocal() as db:
+        user_id = db.query(User.id).filter(User.email == "flushfail@example.com").scalar()
+
+    def broken():
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(detection_sink, "session_factory", broken)
+    detection_sink.submit(user_id, Prediction(label="unknown", sound_id=None, sound_name=None, confidence=0.9), detected=True)
+    assert client.get("/api/detections", headers=headers).status_code == 200
+    assert client.get("/api/detections/summary", headers=headers).status_code == 200
+    assert detection_sink.depth >= 1
+
+    monkeypatch.undo()
+    detection_sink.flush()
+    assert len(client.get("/api/detections", headers=headers).json()) == 1
+
+
 def test_unauthorized_access():
     # Try to access protected endpoint without token
     response = client.get("/api/sounds")
     assert response.status_code == 401
+
+
+def test_retention_policy_and_sound_delete_drops_samples():
+    from app.db import SessionLocal
+    from app.models import DetectionEvent, TrainingSample
+
+    response = client.post("/api/auth/signup", json={"email": "retention@example.com", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/detections/retention", headers=headers).json() == {"days": 30, "default": True}
+    assert client.put("/api/detections/retention", headers=headers, json={"days": 90}).json() == {"days": 90, "default": False}
+    assert client.put("/api/detections/retention", headers=headers, json={"days": 0}).status_code == 400
+    assert client.put("/api/detections/retention", headers=headers, json={"days": None}).json()["default"] is True
+
+    sound = client.post("/api/sounds", headers=headers, json={"name": "Door"}).json()
+    client.post(
+        "/api/train/sample",
+        headers=headers,
+        files={"file": ("sample.wav", make_wav(), "audio/wav")},
+        data={"sound_id": sound["id"], "label": "positive"},
+    )
+    with SessionLocal() as db:
+        user_id = db.query(TrainingSample.user_id).filter(TrainingSample.sound_id == sound["id"]).scalar()
+        db.add(DetectionEvent(id="retention-event", user_id=user_id, sound_id=sound["id"], confidence=0.9))
+        db.commit()
+    assert client.delete(f"/api/sounds/{sound['id']}", headers=headers).status_code == 200
+    with SessionLocal() as db:
+        assert db.query(TrainingSample).filter(TrainingSample.sound_id == sound["id"]).count() == 0
+        assert db.get(DetectionEvent, "retention-event").sound_id is None
@@ -0,0 +1,93 @@
+import io
+import numpy as np
+import pytest
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from app.audio import UnsupportedAudio, decode_audio, decode_pcm, polyphase_filter, resample
+
+
+def encode(audio: np.ndarray, sample_rate: int, subtype: str, format: str = "WAV") -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, subtype=subtype, format=format)
+    return buffer.getvalue()
+
+
+def reference(data: bytes) -> tuple[np.ndarray, int]:
+    audio, sample_rate = sf.read(io.BytesIO(data))
+    if audio.ndim > 1:
+        audio = np.mean(audio, axis=1)
+    return audio.astype(np.float32), sample_rate
+
+
+@pytest.mark.parametrize("subtype", ["PCM_16", "FLOAT", "PCM_24"])
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("format", ["WAV", "WAVEX"])
+def test_decode_matches_soundfile(subtype, channels, format):
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.9, 0.9, (4410, channels)).squeeze()
+    data = encode(audio, 44100, subtype, format)
+
+    decoded, sample_rate = decode_audio(data)
+    expected, expected_rate = reference(data)
+
+    assert sample_rate == expected_rate == 44100
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, expected, atol=1e-6)
+
+
+def test_float32_mono_wav_is_zero_copy():
+    data = encode(np.linspace(-0.5, 0.5, 1600), 16000, "FLOAT")
+    decoded, _ = decode_audio(data)
+    assert decoded.base is not None and not decoded.flags.writeable
+
+
+def test_raw_pcm_content_type():
+    samples = (np.sin(np.arange(800)) * 16000).astype("<i2")
+    decoded, sample_rate = decode_audio(samples.tobytes(), "audio/pcm; rate=16000")
+    assert sample_rate == 16000
+    np.testing.assert_allclose(decoded, samples / 32768.0, atol=1e-7)
+
+    stereo = np.stack([samples, samples], axis=1).astype("<f4") / 32768.0
+    decoded, _ = decode_audio(stereo.tobytes(), "audio/pcm;rate=48000;channels=2;encoding=float32")
+    np.testing.assert_allclose(decoded, samples / 32768.0, atol=1e-7)
+
+    with pytest.raises(UnsupportedAudio):
+        decode_audio(samples.tobytes(), "audio/pcm")
+    with pytest.raises(UnsupportedAudio):
+        decode_pcm(samples.tobytes(), "mulaw")
+
+
+def test_undecodable_bytes_raise_unsupported_audio():
+    with pytest.raises(UnsupportedAudio):
+        decode_audio(b"definitely not audio")
+
+
+@pytest.mark.parametrize("rate", [0, 44101, 383999, 10**9])
+def test_unsupported_sample_rate_raises_unsupported_audio(rate):
+    wav = bytearray(encode(np.zeros(1600), 16000, "PCM_16"))
+    # The sample rate field of the canonical 16-byte fmt chunk.
+    wav[24:28] = rate.to_bytes(4, "little")
+    with pytest.raises(UnsupportedAudio):
+        decode_audio(bytes(wav))
+    with pytest.raises(UnsupportedAudio):
+        decode_audio(np.zeros(1600, dtype="<i2").tobytes(), f"audio/pcm; rate={rate}")
+
+
+@pytest.mark.parametrize("src_rate", [8000, 22050, 44100, 48000])
+def test_resample_matches_resample_poly(src_rate):
+    audio = np.random.default_rng(1).standard_normal(src_rate // 3).astype(np.float32)
+    resampled = resample(audio, src_rate, 16000)
+    expected = resample_poly(audio, 16000, src_rate)
+    assert resampled.dtype == np.float32
+    assert resampled.shape == expected.shape
+    np.testing.assert_allclose(resampled, expected, atol=1e-4)
+
+
+def test_resample_reuses_filter_and_skips_native_rate():
+    audio = np.zeros(1000, dtype=np.float32)
+    assert resample(audio, 16000, 16000) is audio
+    resample(audio, 48000, 16000)
+    hits = polyphase_filter.cache_info().hits
+    resample(audio, 48000, 16000)
+    assert polyphase_filter.cache_info().hits == hits + 1
@@ -0,0 +1,186 @@
+import os
+import tempfile
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
+
+import asyncio
+import hashlib
+import time
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from passlib.context import CryptContext
+from sqlalchemy import event
+
+from app.auth import (
+    LOCAL_ISSUER,
+    PasswordHashBusy,
+    PasswordHasher,
+    TTLCache,
+    authenticate_token,
+    authenticate_token_async,
+    principal_cache,
+    pwd_context,
+    user_cache,
+    verify_token,
+)
+from app.db import SessionLocal, engine
+from app.main import app
+from app.models import User
+from app.settings import settings
+
+
+client = TestClient(app)
+
+
+def signup() -> tuple[str, str]:
+    email = f"auth-{uuid.uuid4().hex[:8]}@example.com"
+    token = client.post("/api/auth/signup", json={"email": email, "password": "Password123"}).json()["access_token"]
+    return email, token
+
+
+class StatementCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        event.remove(engine, "before_cursor_execute", self)
+
+
+def test_cached_principal_skips_database():
+    _, token = signup()
+    authenticate_token(token)
+
+    with StatementCounter() as statements:
+        user = authenticate_token(token)
+    assert statements.count == 0
+    assert user.email.startswith("auth-")
+
+
+def test_async_lookup_leaves_sync_engine_alone():
+    email, token = signup()
+    user_cache.clear()
+
+    with StatementCounter() as statements:
+        user = asyncio.run(authenticate_token_async(token))
+        cached = asyncio.run(authenticate_token_async(token))
+    assert statements.count == 0
+    assert user.email == email and cached is user
+
+
+def test_user_cache_invalidated_on_update():
+    email, token = signup()
+    assert authenticate_token(token).is_verified is False
+
+    with SessionLocal() as db:
+        db.query(User).filter(User.email == email).one().is_verified = True
+        db.commit()
+
+    assert authenticate_token(token).is_verified is True
+
+
+def test_deleted_user_is_rejected_despite_cached_token():
+    email, token = signup()
+    authenticate_token(token)
+
+    with SessionLocal() as db:
+        db.delete(db.query(User).filter(User.email == email).one())
+        db.commit()
+
+    with pytest.raises(HTTPException) as exc_info:
+        authenticate_token(token)
+    assert exc_info.value.detail == "User not found"
+
+
+def test_principal_ttl_bounded_by_token_expiry():
+    _, token = signup()
+    claims = jwt.get_unverified_claims(token)
+    short_lived = jwt.encode(
+        {**claims, "exp": datetime.utcnow() + timedelta(seconds=1)}, settings.jwt_secret, algorithm=settings.jwt_algorithm
+    )
+    authenticate_token(short_lived)
+
+    expires_at, _ = principal_cache._entries[hashlib.sha256(short_lived.encode()).hexdigest()]
+    assert expires_at - time.monotonic() <= 1.0
+
+
+def test_verifier_selected_by_issuer(monkeypatch):
+    monkeypatch.setattr(settings, "supabase_jwt_secret", "supabase-secret")
+    supabase = jwt.encode({"sub": "abc", "iss": "https://example.supabase.co/auth/v1"}, "supabase-secret", algorithm="HS256")
+    local = jwt.encode({"sub": "abc", "iss": LOCAL_ISSUER}, settings.jwt_secret, algorithm="HS256")
+    legacy = jwt.encode({"sub": "abc"}, settings.jwt_secret, algorithm="HS256")
+    forged = jwt.encode({"sub": "abc", "iss": LOCAL_ISSUER}, "supabase-secret", algorithm="HS256")
+
+    assert verify_token(supabase)["sub"] == "abc"
+    assert verify_token(local)["sub"] == "abc"
+    assert verify_token(legacy)["sub"] == "abc"
+    assert verify_token(forged) is None
+    assert verify_token("not-a-jwt") is None
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    cache.set("c", 3, 60)
+    cache.set("d", 4, 0)
+    assert cache.get("a") is None
+    assert (cache.get("b"), cache.get("c"), cache.get("d")) == (2, 3, None)
+
+
+def test_authenticated_request_skips_user_query():
+    _, token = signup()
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/detections", headers=headers)
+    user_cache.clear()
+    client.get("/api/detections", headers=headers)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        client.get("/api/detections", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert not any("FROM users" in statement for statement in statements)
+
+
+def test_login_rehashes_at_configured_cost():
+    email = f"auth-{uuid.uuid4().hex[:8]}@example.com"
+    cheap = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("Password123")
+    with SessionLocal() as db:
+        db.add(User(email=email, hashed_password=cheap, is_verified=True))
+        db.commit()
+
+    response = client.post("/api/auth/login", json={"email": email, "password": "Password123"})
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        upgraded = db.query(User).filter(User.email == email).one().hashed_password
+    assert upgraded.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+
+    assert client.post("/api/auth/login", json={"email": email, "password": "Password123"}).status_code == 200
+    with SessionLocal() as db:
+        assert db.query(User).filter(User.email == email).one().hashed_password == upgraded
+
+
+def test_password_hasher_caps_pending_work():
+    hasher = PasswordHasher(pwd_context, workers=1, max_pending=1)
+
+    async def burst():
+        return await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+
+    first, second = asyncio.run(burst())
+    assert isinstance(second, PasswordHashBusy)
+    assert asyncio.run(hasher.verify("a", first)) == (True, None)
+    hasher.close()
@@ -0,0 +1,38 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from app.metrics import Histogram
+from app.ml import MicroBatcher, MockEmbedder
+
+
+class CountingEmbedder(MockEmbedder):
+    def __init__(self) -> None:
+        self.batch_sizes = []
+
+    def embed_batch(self, waveforms):
+        self.batch_sizes.append(len(waveforms))
+        return super().embed_batch(waveforms)
+
+
+def test_micro_batcher_returns_each_callers_embedding():
+    embedder = CountingEmbedder()
+    batcher = MicroBatcher(embedder, max_batch_size=8, window_ms=50)
+    rng = np.random.default_rng(0)
+    waveforms = [rng.standard_normal(16000).astype(np.float32) for _ in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda waveform: batcher.submit(waveform).result(timeout=5), waveforms))
+    for waveform, result in zip(waveforms, results):
+        assert np.array_equal(result, MockEmbedder().extract(waveform, 16000))
+    assert sum(embedder.batch_sizes) == 8
+    assert max(embedder.batch_sizes) > 1
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(1, 2, 5, 10))
+    for value in [0.5] * 50 + [8] * 49 + [9.5]:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) <= 1
+    assert 5 < histogram.quantile(0.99) <= 9.5
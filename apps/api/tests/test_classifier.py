@@ -0,0 +1,48 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import numpy as np
+
+from app.ml import UserClassifier
+
+
+def clustered(rng, centers, per_class):
+    rows = np.concatenate([center + 0.05 * rng.standard_normal((per_class, center.size)) for center in centers])
+    labels = [label for label in ["a", "b", "c"][: len(centers)] for _ in range(per_class)]
+    return rows, labels
+
+
+def test_knn_predicts_nearest_cluster():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((3, 32))
+    rows, labels = clustered(rng, centers, 10)
+    classifier = UserClassifier(k=5)
+    classifier.fit(rows, labels, {"a": "Alarm", "b": "Bell", "c": "Crying"})
+    prediction = classifier.predict(centers[1])
+    assert prediction.sound_id == "b"
+    assert prediction.sound_name == "Bell"
+    assert 0.9 < prediction.confidence <= 1.0
+
+
+def test_sensitivity_weights_votes():
+    rows = np.array([[1.0, 0.0], [1.0, 0.05], [0.9, 0.3]])
+    classifier = UserClassifier(k=3)
+    classifier.fit(rows, ["a", "a", "b"], sensitivities={"a": 0.1, "b": 0.9})
+    assert classifier.predict(np.array([1.0, 0.1])).sound_id == "b"
+    classifier.set_sounds({}, {"a": 0.6, "b": 0.6})
+    assert classifier.predict(np.array([1.0, 0.1])).sound_id == "a"
+
+
+def test_incremental_add_matches_fit_and_centroids():
+    rng = np.random.default_rng(1)
+    centers = rng.standard_normal((3, 16))
+    rows, labels = clustered(rng, centers, 20)
+    fitted = UserClassifier(mode="centroid")
+    fitted.fit(rows, labels)
+    incremental = UserClassifier(mode="centroid")
+    for row, label in zip(rows, labels):
+        incremental.add(row, [label])
+    assert incremental.size == fitted.size == 60
+    assert np.allclose(incremental.embeddings, fitted.embeddings)
+    for center, label in zip(centers, ["a", "b", "c"]):
+        assert incremental.predict(center).sound_id == label
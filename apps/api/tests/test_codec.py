@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from app.codec import decode_embedding, decode_embeddings, encode_embedding, stack_embeddings
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_round_trip(dtype, tolerance):
+    rng = np.random.default_rng(0)
+    rows = rng.random((4, 1024)).astype(np.float32)
+    blobs = [encode_embedding(row, dtype) for row in rows]
+    assert np.allclose(decode_embedding(blobs[0]), rows[0], atol=tolerance)
+    matrix = decode_embeddings(blobs)
+    assert matrix.dtype == np.float32
+    assert np.allclose(matrix, rows, atol=tolerance)
+
+
+def test_float32_blob_is_compact():
+    assert len(encode_embedding(np.zeros(1024), "float32")) == 8 + 1024 * 4
+
+
+def test_stack_mixes_blobs_and_legacy_json():
+    rows = np.eye(3, dtype=np.float32)
+    values = [encode_embedding(rows[0]), rows[1].tolist(), encode_embedding(rows[2], "float16")]
+    assert np.array_equal(stack_embeddings(values), rows)
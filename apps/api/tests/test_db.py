@@ -0,0 +1,50 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+
+import pytest
+from sqlalchemy import text
+
+from app.db import LazySession, build_engine, engine_options
+
+
+def test_tuned_sqlite_uses_wal_and_busy_timeout(tmp_path):
+    bind = build_engine(f"sqlite:///{tmp_path / 'tuned.db'}", "tuned")
+    with bind.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    bind.dispose()
+
+
+def test_default_profile_keeps_sqlite_defaults(tmp_path):
+    bind = build_engine(f"sqlite:///{tmp_path / 'default.db'}", "default")
+    with bind.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    bind.dispose()
+
+
+def test_tuned_postgres_pool_options():
+    options = engine_options("postgresql+psycopg2://tikun@localhost/tikun", "tuned")
+    assert options["pool_size"] == 10 and options["max_overflow"] == 20
+    assert options["pool_pre_ping"] and options["pool_use_lifo"]
+    assert "connect_args" not in options
+    assert engine_options("postgresql+psycopg://tikun@localhost/tikun", "tuned")["connect_args"] == {"prepare_threshold": 5}
+    with pytest.raises(ValueError):
+        engine_options("sqlite://", "fast")
+
+
+def test_lazy_session_opens_on_first_use():
+    opened = []
+
+    def factory():
+        opened.append(True)
+        return build_engine("sqlite://", "tuned").connect()
+
+    db = LazySession(factory)
+    db.close()
+    assert not opened and not db.started
+    assert db.execute(text("SELECT 1")).scalar() == 1
+    assert opened == [True] and db.started
+    db.close()
+    assert not db.started
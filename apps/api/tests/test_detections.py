@@ -0,0 +1,167 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.detections import DetectionSink, history_page, history_page_async, summarize, summarize_async
+from app.ml import Prediction
+from app.models import DetectionEvent, Sound, User
+
+
+def make_sink(tmp_path, **overrides):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sink.db'}")
+    Base.metadata.create_all(bind=engine)
+    options = {"batch_size": 3, "flush_interval_ms": 60_000, "max_queue": 100, "below_threshold_sample_rate": 0.0}
+    options.update(overrides)
+    return DetectionSink(sessionmaker(bind=engine), **options), sessionmaker(bind=engine)
+
+
+def test_sink_drops_below_threshold_and_flushes_on_close(tmp_path):
+    sink, Session = make_sink(tmp_path)
+    hit = Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.9)
+    miss = Prediction(label="unknown", sound_id=None, sound_name=None, confidence=0.1)
+    assert sink.submit("user", hit, detected=True)
+    assert not sink.submit("user", miss, detected=False)
+    assert sink.depth == 1
+    sink.close()
+    assert sink.depth == 0
+    with Session() as db:
+        events = db.query(DetectionEvent).all()
+    assert [(event.sound_id, event.confidence) for event in events] == [("s1", 0.9)]
+
+
+def test_sink_bounds_queue(tmp_path):
+    sink, _ = make_sink(tmp_path, max_queue=2, batch_size=100)
+    hit = Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.9)
+    results = [sink.submit("user", hit, detected=True) for _ in range(3)]
+    assert results == [True, True, False]
+    assert sink.flush() == 2
+
+
+def test_failed_flush_requeues_rows_up_to_the_bound(tmp_path):
+    sink, Session = make_sink(tmp_path, max_queue=3, batch_size=100)
+    hit = Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.9)
+    for _ in range(3):
+        sink.submit("user", hit, detected=True)
+    working = sink.session_factory
+
+    def broken():
+        # Arrives while the insert is failing, so only two of the three rows fit back.
+        sink.submit("user", hit, detected=True)
+        raise RuntimeError("database down")
+
+    sink.session_factory = broken
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    assert sink.depth == 3
+    sink.session_factory = working
+    assert sink.flush() == 3
+    with Session() as db:
+        assert db.query(DetectionEvent).count() == 3
+
+
+def test_sampled_misses_are_stored_but_not_rolled_up(tmp_path):
+    sink, Session = make_sink(tmp_path, batch_size=100, below_threshold_sample_rate=1.0)
+    sink.submit("user", Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.9), detected=True)
+    sink.submit("user", Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.3), detected=False)
+    assert sink.flush() == 2
+    with Session() as db:
+        assert db.query(DetectionEvent).count() == 2
+        summary = summarize(db, "user", "hour", None, None)
+    assert [(bucket["count"], bucket["max_confidence"]) for bucket in summary["buckets"]] == [(1, 0.9)]
+
+
+def test_rows_that_can_never_be_written_are_dropped_alone(tmp_path):
+    sink, Session = make_sink(tmp_path, batch_size=100)
+    # SQLite only enforces foreign keys when asked, as Postgres always does.
+    bind = Session.kw["bind"]
+    event.listen(bind, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    bind.dispose()
+    with Session() as db:
+        db.add(User(id="user", email="user@example.com", hashed_password="x"))
+        db.add(Sound(id="s1", user_id="user", name="Bell"))
+        db.commit()
+    sink.submit("user", Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.9), detected=True)
+    sink.submit("user", Prediction(label="gone", sound_id="gone", sound_name="Deleted", confidence=0.9), detected=True)
+    sink.submit("user", Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=0.8), detected=True)
+    assert sink.flush() == 2
+    assert sink.depth == 0
+    with Session() as db:
+        assert sorted(detection.confidence for detection in db.query(DetectionEvent)) == [0.8, 0.9]
+
+
+def test_rollups_accumulate_across_flushes(tmp_path):
+    sink, Session = make_sink(tmp_path, batch_size=100)
+    now = datetime.utcnow()
+    for confidence in (0.5, 0.9):
+        sink.submit("user", Prediction(label="s1", sound_id="s1", sound_name="Bell", confidence=confidence), detected=True)
+        sink.submit("user", Prediction(label="unknown", sound_id=None, sound_name=None, confidence=0.2), detected=True)
+        sink.flush()
+    with Session() as db:
+        summary = summarize(db, "user", "minute", now - timedelta(minutes=5), now + timedelta(minutes=5))
+        hourly = summarize(db, "user", "hour", None, None)
+    assert [(sound["sound_id"], sound["count"]) for sound in summary["sounds"]] == [(None, 2), ("s1", 2)]
+    bell = next(bucket for bucket in summary["buckets"] if bucket["sound_id"] == "s1")
+    assert (bell["count"], bell["max_confidence"]) == (2, 0.9)
+    assert abs(bell["mean_confidence"] - 0.7) < 1e-9
+    assert sum(bucket["count"] for bucket in hourly["buckets"]) == 4
+
+    async def summarize_with_async_session():
+        bind = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sink.db'}")
+        async with AsyncSession(bind) as db:
+            result = await summarize_async(db, "user", "minute", now - timedelta(minutes=5), now + timedelta(minutes=5))
+        await bind.dispose()
+        return result
+
+    assert asyncio.run(summarize_with_async_session()) == summary
+
+
+def test_history_pages_by_cursor(tmp_path):
+    _, Session = make_sink(tmp_path)
+    start = datetime(2024, 1, 1)
+    with Session() as db:
+        # Pairs of events share a timestamp, so the id tiebreak has to hold across pages.
+        db.add_all(
+            DetectionEvent(id=f"e{index:02d}", user_id="user", sound_id=None, confidence=0.5, created_at=start + timedelta(seconds=index // 2))
+            for index in range(11)
+        )
+        db.commit()
+        seen, cursor = [], None
+        while True:
+            page, cursor = history_page(db.query(DetectionEvent).filter(DetectionEvent.user_id == "user"), cursor, 4)
+            seen.extend(event.id for event in page)
+            if cursor is None:
+                break
+    assert seen == [f"e{index:02d}" for index in reversed(range(11))]
+
+
+def test_async_history_matches_sync(tmp_path):
+    _, Session = make_sink(tmp_path)
+    with Session() as db:
+        db.add_all(
+            DetectionEvent(id=f"e{index}", user_id="user", sound_id=None, confidence=0.5, created_at=datetime(2024, 1, 1, 0, index))
+            for index in range(5)
+        )
+        db.commit()
+        first, cursor = history_page(db.query(DetectionEvent).filter(DetectionEvent.user_id == "user"), None, 3)
+
+    async def pages():
+        bind = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sink.db'}")
+        async with AsyncSession(bind) as db:
+            statement = select(DetectionEvent).where(DetectionEvent.user_id == "user")
+            page, next_cursor = await history_page_async(db, statement, None, 3)
+            rest, last = await history_page_async(db, statement, next_cursor, 3)
+        await bind.dispose()
+        return page, next_cursor, rest, last
+
+    page, next_cursor, rest, last = asyncio.run(pages())
+    assert [event.id for event in page] == [event.id for event in first] == ["e4", "e3", "e2"]
+    assert next_cursor == cursor and last is None
+    assert [event.id for event in rest] == ["e1", "e0"]
@@ -0,0 +1,92 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import numpy as np
+import pytest
+
+from app.ml import (
+    YAMNET_HOP_SAMPLES,
+    YAMNET_PATCH_SPAN_SAMPLES,
+    PatchEmbedder,
+    create_embedder,
+    frame_patches,
+    patch_count,
+)
+
+
+class SummingEmbedder(PatchEmbedder):
+    version = "summing-1"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def run_patches(self, patches):
+        self.calls += 1
+        assert patches.shape[1] == YAMNET_PATCH_SPAN_SAMPLES
+        return np.repeat(patches.sum(axis=1, keepdims=True), 1024, axis=1)
+
+
+@pytest.mark.parametrize(
+    "num_samples,expected",
+    [(0, 1), (8000, 1), (15600, 1), (15601, 2), (15600 + YAMNET_HOP_SAMPLES, 2), (48000, 6)],
+)
+def test_frame_patches_pads_like_yamnet(num_samples, expected):
+    waveform = np.arange(1, num_samples + 1, dtype=np.float32)
+    patches = frame_patches(waveform)
+    assert patches.shape == (expected, YAMNET_PATCH_SPAN_SAMPLES)
+    assert patches[-1, 0] == (waveform[(expected - 1) * YAMNET_HOP_SAMPLES] if num_samples else 0)
+
+
+def test_patch_embedder_batches_clips_in_one_run():
+    rng = np.random.default_rng(0)
+    clips = [rng.uniform(-1, 1, size).astype(np.float32) for size in (4000, 16000, 40000)]
+    embedder = SummingEmbedder()
+    batched = embedder.embed_batch(clips)
+    assert embedder.calls == 1
+    for clip, embedding in zip(clips, batched):
+        assert np.allclose(embedding, embedder.extract(clip, 16000))
+
+
+def test_patch_embedder_embeds_stream_windows_patch_by_patch():
+    waveform = np.random.default_rng(1).uniform(-1, 1, 2 * YAMNET_HOP_SAMPLES + YAMNET_PATCH_SPAN_SAMPLES)
+    embeddings = SummingEmbedder().embed_patches(waveform)
+    assert len(embeddings) == patch_count(len(waveform)) == 3
+    second = waveform[YAMNET_HOP_SAMPLES:YAMNET_HOP_SAMPLES + YAMNET_PATCH_SPAN_SAMPLES]
+    assert np.isclose(embeddings[1, 0], second.astype(np.float32).sum(), rtol=1e-4)
+
+
+def test_create_embedder_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        create_embedder("nope")
+
+
+PARITY_MODEL = os.environ.get("TIKUN_PARITY_MODEL_PATH")
+
+
+@pytest.mark.skipif(not PARITY_MODEL, reason="set TIKUN_PARITY_MODEL_PATH to an exported .onnx or .tflite model")
+def test_exported_model_matches_tensorflow_embeddings():
+    pytest.importorskip("tensorflow")
+    pytest.importorskip("tensorflow_hub")
+    from app.ml import OnnxEmbedder, TfliteEmbedder, YamnetEmbedder
+
+    if PARITY_MODEL.endswith(".tflite"):
+        exported = TfliteEmbedder(PARITY_MODEL)
+    else:
+        pytest.importorskip("onnxruntime")
+        exported = OnnxEmbedder(PARITY_MODEL)
+    reference = YamnetEmbedder()
+    rng = np.random.default_rng(2)
+    t = np.arange(int(16000 * 2.5)) / 16000
+    clips = [
+        rng.normal(0, 0.1, 16000).astype(np.float32),
+        (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32),
+        (0.3 * np.sign(np.sin(2 * np.pi * 3 * t)) * rng.uniform(-1, 1, len(t))).astype(np.float32),
+        rng.normal(0, 0.05, 7000).astype(np.float32),
+    ]
+    for clip in clips:
+        expected = reference.extract(clip, 16000)
+        actual = exported.extract(clip, 16000)
+        cosine = float(expected @ actual / (np.linalg.norm(expected) * np.linalg.norm(actual)))
+        assert cosine > 0.98, cosine
+    window = clips[2][: 2 * YAMNET_HOP_SAMPLES + YAMNET_PATCH_SPAN_SAMPLES]
+    assert exported.embed_patches(window).shape == reference.embed_patches(window).shape
@@ -0,0 +1,58 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+
+import numpy as np
+import pytest
+
+from app.frames import SoundTracker
+from app.ml import MockEmbedder, UserClassifier, pad_patches
+
+
+def trained(rng, mode="knn"):
+    centers = rng.standard_normal((2, 32))
+    rows = np.concatenate([center + 0.05 * rng.standard_normal((10, 32)) for center in centers])
+    classifier = UserClassifier(k=5, mode=mode)
+    classifier.fit(rows, ["knock"] * 10 + ["bell"] * 10, {"knock": "Knock", "bell": "Bell"}, {"knock": 0.5, "bell": 0.5})
+    return classifier, centers
+
+
+def test_frame_scores_match_single_predictions():
+    rng = np.random.default_rng(0)
+    for mode in ("knn", "centroid"):
+        classifier, centers = trained(rng, mode)
+        frames = np.stack([centers[0], rng.standard_normal(32), centers[1]])
+        scores = classifier.frame_scores(frames)
+        assert scores.shape == (3, 2)
+        for frame, embedding in zip(scores, frames):
+            prediction = classifier.predict(embedding)
+            if prediction.sound_id is not None:
+                assert np.isclose(frame[classifier.classes.index(prediction.sound_id)], prediction.confidence, atol=1e-5)
+        assert classifier.classes[int(np.argmax(scores[0]))] == "knock"
+        assert classifier.classes[int(np.argmax(scores[2]))] == "bell"
+
+
+def test_tracker_reports_onsets_and_debounces():
+    rng = np.random.default_rng(1)
+    classifier, centers = trained(rng)
+    knock = classifier.classes.index("knock")
+    scores = np.zeros((8, 2), dtype=np.float32)
+    scores[1:4, knock] = [0.9, 0.47, 0.9]  # dips inside the hysteresis band
+    scores[6:, knock] = 0.9
+    events, ended = SoundTracker(hysteresis=0.05).update(classifier, scores)
+    assert [(event.onset, event.offset) for event in events] == [(0.48, 2.4), (2.88, None)]
+    assert [event.confidence for event in events] == [pytest.approx(0.9)] * 2
+    assert ended == events[:1]
+
+    tracker = SoundTracker(attack_frames=2)
+    started, _ = tracker.update(classifier, scores[:2])
+    assert started == []
+    started, _ = tracker.update(classifier, scores[2:])
+    # The isolated frames never reach two in a row; only the sustained run at frame 6 fires.
+    assert [event.onset for event in started] == [2.88]
+
+
+def test_short_clips_still_yield_a_frame():
+    waveform = np.ones(8000, dtype=np.float32)
+    assert len(MockEmbedder().embed_patches(pad_patches(waveform))) == 1
+    assert len(MockEmbedder().embed_patches(pad_patches(np.ones(16000 * 2, dtype=np.float32)))) == 4
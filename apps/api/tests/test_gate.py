@@ -0,0 +1,56 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+
+import numpy as np
+
+from app.ml import ActivityGate, ActivityGates, MockEmbedder
+from app.streaming import ListenStream
+
+SAMPLE_RATE = 16000
+
+
+def noise(rng, seconds=1.0):
+    return (0.01 * rng.standard_normal(int(SAMPLE_RATE * seconds))).astype(np.float32)
+
+
+def test_gate_skips_background_and_passes_events():
+    rng = np.random.default_rng(0)
+    gate = ActivityGate(max_skipped=100)
+    assert gate.admit(noise(rng), SAMPLE_RATE)
+    assert not any(gate.admit(noise(rng), SAMPLE_RATE) for _ in range(5))
+
+    click = noise(rng)
+    click[8000:8080] += 0.3 * rng.standard_normal(80)
+    assert gate.admit(click, SAMPLE_RATE)
+    tone = noise(rng)
+    tone[4000:5600] += 0.05 * np.sin(2 * np.pi * 2000 * np.arange(1600) / SAMPLE_RATE)
+    assert gate.admit(tone, SAMPLE_RATE)
+    assert (gate.stats.chunks, gate.stats.skipped) == (8, 5)
+
+
+def test_gate_forces_a_chunk_through_after_max_skipped():
+    rng = np.random.default_rng(1)
+    gate = ActivityGate(max_skipped=3)
+    decisions = [gate.admit(noise(rng), SAMPLE_RATE) for _ in range(9)]
+    assert decisions == [True, False, False, False, True, False, False, False, True]
+
+
+def test_gates_share_stats_per_user():
+    rng = np.random.default_rng(2)
+    gates = ActivityGates(max_users=1)
+    gates.get("a").admit(noise(rng), SAMPLE_RATE)
+    gates.connection("a").admit(noise(rng), SAMPLE_RATE)
+    assert gates.stats("a").chunks == 2
+    gates.get("b")
+    assert gates.peek("a") is None
+
+
+def test_listen_stream_skips_quiet_patches():
+    rng = np.random.default_rng(3)
+    stream = ListenStream(MockEmbedder(), context_patches=2, buffer_seconds=5, gate=ActivityGate(max_skipped=100))
+    first = stream.feed(noise(rng, 1.5))
+    second = stream.feed(noise(rng, 1.5))
+    assert all(embedding is not None for _, embedding in first)
+    assert second and all(embedding is None for _, embedding in second)
+    assert [round(end, 2) for end, _ in first + second][:4] == [0.96, 1.44, 1.92, 2.4]
@@ -0,0 +1,82 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import asyncio
+import threading
+import numpy as np
+
+from app.index_store import ClassifierStore
+from app.ml import ModelRegistry
+
+
+def test_append_then_rewrite(tmp_path):
+    store = ClassifierStore(str(tmp_path))
+    rng = np.random.default_rng(1)
+    rows = rng.random((3, 8)).astype(np.float32)
+    for row, label in zip(rows, ["a", "b", "a"]):
+        store.append("user", row, label, label.upper())
+    snapshot = store.load("user")
+    assert snapshot.version == 3
+    assert snapshot.labels == ["a", "b", "a"]
+    assert snapshot.names == {"a": "A", "b": "B"}
+    assert np.array_equal(np.asarray(snapshot.embeddings), rows)
+
+    store.remove_label("user", "a")
+    snapshot = store.load("user")
+    assert snapshot.version == 4
+    assert snapshot.labels == ["b"]
+    assert np.array_equal(np.asarray(snapshot.embeddings), rows[1:2])
+    assert sorted(os.listdir(tmp_path / "user")) == [".lock", "embeddings.1.f32", "labels.1.i32", "meta.json"]
+
+
+def test_registries_share_store_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.ml.settings.index_dir", str(tmp_path))
+    first, second = ModelRegistry(), ModelRegistry()
+    assert second.get_classifier("user").predict(np.ones(8)).label == "unknown"
+
+    first.store.append("user", np.ones(8), "sound-1", "Doorbell")
+    prediction = second.get_classifier("user").predict(np.ones(8))
+    assert prediction.sound_id == "sound-1"
+    assert prediction.sound_name == "Doorbell"
+
+    first.store.update_sound("user", "sound-1", "Front doorbell", 0.6)
+    assert second.get_classifier("user").predict(np.ones(8)).sound_name == "Front doorbell"
+
+
+def test_async_classifier_loads_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.ml.settings.index_dir", str(tmp_path))
+    registry = ModelRegistry()
+    registry.store.append("user", np.ones(8), "sound-1", "Doorbell")
+    load = registry._load_classifier
+    loaded_on = []
+
+    def recording_load(*args):
+        loaded_on.append(threading.current_thread())
+        return load(*args)
+
+    monkeypatch.setattr(registry, "_load_classifier", recording_load)
+    first = asyncio.run(registry.get_classifier_async("user"))
+    assert asyncio.run(registry.get_classifier_async("user")) is first
+    assert len(loaded_on) == 1 and loaded_on[0] is not threading.main_thread()
+
+
+def test_remove_label_tombstones_until_compaction(tmp_path):
+    store = ClassifierStore(str(tmp_path), compact_ratio=0.25)
+    rows = np.random.default_rng(2).random((10, 8)).astype(np.float32)
+    labels = ["a"] + ["b"] * 2 + ["c"] * 7
+    store.write("user", rows, labels, {"a": "A", "b": "B", "c": "C"})
+    generation = store.load("user").generation
+
+    store.remove_label("user", "a")
+    snapshot = store.load("user")
+    assert snapshot.generation == generation
+    assert snapshot.removed == {"a"}
+    assert snapshot.labels == labels
+    assert "a" not in snapshot.names
+
+    store.remove_label("user", "b")
+    snapshot = store.load("user")
+    assert snapshot.generation > generation
+    assert snapshot.removed == frozenset()
+    assert snapshot.labels == ["c"] * 7
+    assert np.array_equal(np.asarray(snapshot.embeddings), rows[3:])
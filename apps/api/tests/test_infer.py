@@ -1,6 +1,8 @@
 import os
+import tempfile
 os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
 os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
 
 import io
 import wave
@@ -50,7 +52,7 @@ def test_train_and_infer_pipeline():
     assert response.status_code == 200
 
     rebuild = client.post("/api/train/rebuild", headers=headers)
-    assert rebuild.status_code == 200
+    assert rebuild.status_code == 202
 
     infer = client.post(
         "/api/infer",
@@ -60,3 +62,143 @@ def test_train_and_infer_pipeline():
     assert infer.status_code == 200
     payload = infer.json()
     assert "confidence" in payload
+
+
+def test_listen_websocket_streams_predictions():
+    response = client.post("/api/auth/signup", json={"email": "stream@example.com", "password": "Password123"})
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sound = client.post("/api/sounds", headers=headers, json={"name": "Kettle"}).json()
+    client.post(
+        "/api/train/sample",
+        headers=headers,
+        files={"file": ("sample.wav", make_wav(), "audio/wav")},
+        data={"sound_id": sound["id"], "label": "positive"},
+    )
+    t = np.arange(16000 * 2) / 16000
+    pcm = (0.2 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    with client.websocket_connect("/ws/listen") as websocket:
+        websocket.send_json({"token": token, "sample_rate": 16000, "encoding": "pcm16"})
+        assert websocket.receive_json()["type"] == "ready"
+        for start in range(0, len(pcm), 4096):
+            websocket.send_bytes(pcm[start:start + 4096].tobytes())
+        predictions = [websocket.receive_json() for _ in range(3)]
+    assert [prediction["time"] for prediction in predictions] == [0.96, 1.44, 1.92]
+    assert all(prediction["sound_id"] == sound["id"] for prediction in predictions)
+
+
+def test_listen_websocket_rejects_bad_token():
+    with client.websocket_connect("/ws/listen") as websocket:
+        websocket.send_json({"token": "not-a-token"})
+        message = websocket.receive()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 4401
+
+
+def test_listen_websocket_closes_when_pipeline_busy(monkeypatch):
+    monkeypatch.setattr("app.main.pipeline.max_pending", 0)
+    response = client.post("/api/auth/signup", json={"email": "streambusy@example.com", "password": "Password123"})
+    token = response.json()["access_token"]
+    with client.websocket_connect("/ws/listen") as websocket:
+        websocket.send_json({"token": token, "sample_rate": 16000, "encoding": "pcm16"})
+        assert websocket.receive_json()["type"] == "ready"
+        websocket.send_bytes(np.zeros(4096, dtype=np.int16).tobytes())
+        message = websocket.receive()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1013
+
+
+def test_infer_accepts_raw_pcm_and_rejects_garbage():
+    response = client.post("/api/auth/signup", json={"email": "rawpcm@example.com", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    pcm = (0.2 * np.sin(2 * np.pi * 440 * np.arange(8000) / 16000) * 32767).astype("<i2").tobytes()
+
+    raw = client.post("/api/infer", headers=headers, files={"file": ("chunk.pcm", pcm, "audio/pcm; rate=16000")})
+    assert raw.status_code == 200
+
+    garbage = client.post("/api/infer", headers=headers, files={"file": ("chunk.wav", b"not audio", "audio/wav")})
+    assert garbage.status_code == 400
+
+
+def test_infer_frames_reports_onsets():
+    response = client.post("/api/auth/signup", json={"email": "frames@example.com", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    sound = client.post("/api/sounds", headers=headers, json={"name": "Knock", "sensitivity": 0.6}).json()
+    client.post(
+        "/api/train/sample",
+        headers=headers,
+        files={"file": ("sample.wav", make_wav(), "audio/wav")},
+        data={"sound_id": sound["id"], "label": "positive"},
+    )
+    pcm = (0.2 * np.sin(2 * np.pi * 440 * np.arange(16000 * 2) / 16000) * 32767).astype("<i2").tobytes()
+    response = client.post("/api/infer/frames", headers=headers, files={"file": ("chunk.pcm", pcm, "audio/pcm; rate=16000")})
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["frames"] == 4
+    assert [(event["sound_id"], event["sound_name"], event["onset"]) for event in payload["detections"]] == [
+        (sound["id"], "Knock", 0.0)
+    ]
+    # The same sound continuing into the next chunk keeps its event open instead of starting again.
+    following = client.post("/api/infer/frames", headers=headers, files={"file": ("chunk.pcm", pcm, "audio/pcm; rate=16000")})
+    assert following.status_code == 200
+    assert following.json()["detections"] == []
+
+
+def test_listen_websocket_frames_mode_sends_onsets():
+    response = client.post("/api/auth/signup", json={"email": "streamframes@example.com", "password": "Password123"})
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sound = client.post("/api/sounds", headers=headers, json={"name": "Kettle"}).json()
+    client.post(
+        "/api/train/sample",
+        headers=headers,
+        files={"file": ("sample.wav", make_wav(), "audio/wav")},
+        data={"sound_id": sound["id"], "label": "positive"},
+    )
+    pcm = (0.2 * np.sin(2 * np.pi * 440 * np.arange(16000 * 2) / 16000) * 32767).astype(np.int16)
+    with client.websocket_connect("/ws/listen") as websocket:
+        websocket.send_json({"token": token, "sample_rate": 16000, "encoding": "pcm16", "mode": "frames"})
+        assert websocket.receive_json()["type"] == "ready"
+        websocket.send_bytes(pcm.tobytes())
+        event = websocket.receive_json()
+    assert (event["type"], event["sound_id"], event["onset"], event["offset"]) == ("onset", sound["id"], 0.0, None)
+
+
+def test_activity_gate_skips_repeated_background(monkeypatch):
+    monkeypatch.setattr("app.main.settings.gate_enabled", True)
+    response = client.post("/api/auth/signup", json={"email": "gate@example.com", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    background = (0.01 * np.random.default_rng(0).standard_normal(16000)).astype("<f4").tobytes()
+    content_type = "audio/pcm; rate=16000; encoding=float32"
+    first = client.post("/api/infer", headers=headers, files={"file": ("chunk.pcm", background, content_type)})
+    second = client.post("/api/infer", headers=headers, files={"file": ("chunk.pcm", background, content_type)})
+    assert first.json()["skipped"] is False
+    assert second.json() == {"sound_id": None, "sound_name": None, "confidence": 0.0, "label": "unknown", "skipped": True}
+    stats = client.get("/api/infer/gate", headers=headers).json()
+    assert (stats["enabled"], stats["chunks"], stats["skipped"], stats["skip_rate"]) == (True, 2, 1, 0.5)
+    assert stats["noise_floor_db"] < -30
+
+
+def test_detection_history_cursor_and_summary():
+    response = client.post("/api/auth/signup", json={"email": "history@example.com", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    pcm = (0.2 * np.sin(2 * np.pi * 440 * np.arange(8000) / 16000) * 32767).astype("<i2").tobytes()
+    sound = client.post("/api/sounds", headers=headers, json={"name": "Bell"}).json()
+    client.post(
+        "/api/train/sample",
+        headers=headers,
+        files={"file": ("sample.wav", make_wav(), "audio/wav")},
+        data={"sound_id": sound["id"], "label": "positive"},
+    )
+    for _ in range(3):
+        client.post("/api/infer", headers=headers, files={"file": ("chunk.pcm", pcm, "audio/pcm; rate=16000")})
+
+    first = client.get("/api/detections?limit=2", headers=headers)
+    assert len(first.json()) == 2
+    rest = client.get(f"/api/detections?limit=2&cursor={first.headers['x-next-cursor']}", headers=headers)
+    assert len(rest.json()) == 1 and "x-next-cursor" not in rest.headers
+    assert client.get("/api/detections?cursor=!!", headers=headers).status_code == 400
+
+    summary = client.get("/api/detections/summary?resolution=minute", headers=headers).json()
+    assert summary["sounds"] == [{"sound_id": sound["id"], "sound_name": "Bell", "count": 3}]
+    assert client.get("/api/detections/summary?resolution=day", headers=headers).status_code == 422
@@ -0,0 +1,110 @@
+import os
+import tempfile
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
+
+import time
+import uuid
+import numpy as np
+
+from app.codec import encode_embedding
+from app.db import Base, SessionLocal, engine
+from app.index_store import ClassifierStore
+from app.jobs import RebuildQueue
+from app.ml import ModelRegistry, UserClassifier
+from app.models import Sound, TrainingSample, User
+
+Base.metadata.create_all(bind=engine)
+
+
+def seed_user(samples: int) -> tuple[str, str]:
+    rng = np.random.default_rng(0)
+    with SessionLocal() as db:
+        user = User(email=f"jobs-{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        sound = Sound(user_id=user.id, name="Smoke alarm", sensitivity=0.8)
+        db.add(sound)
+        db.flush()
+        for _ in range(samples):
+            db.add(TrainingSample(
+                user_id=user.id, sound_id=sound.id, type="positive", embedding_blob=encode_embedding(rng.random(1024))
+            ))
+        db.commit()
+        return user.id, sound.id
+
+
+def make_queue(tmp_path, auto_after_samples: int = 0) -> RebuildQueue:
+    registry = ModelRegistry()
+    registry.store = ClassifierStore(str(tmp_path))
+    return RebuildQueue(SessionLocal, registry, workers=1, history=10, auto_after_samples=auto_after_samples)
+
+
+def test_rebuild_job_swaps_in_classifier(tmp_path):
+    user_id, sound_id = seed_user(3)
+    queue = make_queue(tmp_path)
+    job = queue.submit(user_id)
+    assert job.done.wait(5)
+    assert (job.status, job.samples, job.sounds) == ("rebuilt", 3, 1)
+    classifier = queue.registry.classifiers[user_id]
+    assert classifier.size == 3 and classifier.sensitivities[sound_id] == 0.8
+    queue.close()
+
+
+def test_requests_coalesce_while_a_job_waits(tmp_path):
+    user_id, _ = seed_user(2)
+    queue = make_queue(tmp_path)
+    with queue.registry.store.locked(user_id):
+        first = queue.submit(user_id)
+        while first.status == "queued":
+            time.sleep(0.001)
+        second = queue.submit(user_id)
+        third = queue.submit(user_id)
+        assert second is third and second is not first
+    assert first.done.wait(5) and second.done.wait(5)
+    assert second.status == "rebuilt"
+    queue.close()
+
+
+def test_auto_rebuild_after_new_samples(tmp_path):
+    user_id, _ = seed_user(1)
+    queue = make_queue(tmp_path, auto_after_samples=3)
+    assert queue.note_samples(user_id, 2) is None
+    job = queue.note_samples(user_id)
+    assert job is not None and job.reason == "auto"
+    assert job.done.wait(5)
+    assert queue.note_samples(user_id) is None
+    queue.close()
+
+
+def test_failed_rebuild_is_logged_with_its_traceback(tmp_path, monkeypatch, caplog):
+    user_id, _ = seed_user(1)
+    queue = make_queue(tmp_path)
+
+    def broken(user_id, **kwargs):
+        raise RuntimeError("index store unavailable")
+
+    monkeypatch.setattr(queue.registry, "get_classifier", broken)
+    with caplog.at_level("ERROR", logger="app.jobs"):
+        job = queue.submit(user_id)
+        assert job.done.wait(5)
+    assert (job.status, job.error) == ("failed", "index store unavailable")
+    [record] = [record for record in caplog.records if record.name == "app.jobs"]
+    assert job.id in record.getMessage() and record.exc_info[0] is RuntimeError
+    queue.close()
+
+
+def test_clone_leaves_published_classifier_untouched():
+    rng = np.random.default_rng(1)
+    original = UserClassifier()
+    original.fit(rng.random((4, 8)), ["a", "a", "b", "b"])
+    query = rng.random(8)
+    before = original.predict(query)
+
+    clone = original.clone()
+    clone.add(rng.random((2, 8)), ["c", "c"])
+
+    assert (original.size, original.classes) == (4, ["a", "b"])
+    assert original.predict(query) == before
+    assert clone.size == 6 and clone.classes == ["a", "b", "c"]
@@ -0,0 +1,71 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.detections import rollup_rows, upsert_rollups
+from app.maintenance import Maintenance, month_start
+from app.models import DetectionEvent, DetectionRollup, RetentionPolicy, Sound, TrainingSample, User
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+def make_maintenance(tmp_path, batch_size=3):
+    engine = create_engine(f"sqlite:///{tmp_path / 'maintenance.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    return Maintenance(Session, engine, 0, batch_size, 0, str(tmp_path / ".maintenance.lock")), Session
+
+
+def seed(Session):
+    with Session() as db:
+        db.add_all([User(id=user_id, email=f"{user_id}@example.com", hashed_password="x") for user_id in ("a", "b")])
+        db.add(Sound(id="kept", user_id="a", name="Bell"))
+        db.add(RetentionPolicy(user_id="b", detection_days=90))
+        db.add_all([
+            TrainingSample(id="live", user_id="a", sound_id="kept", type="positive"),
+            TrainingSample(id="negative", user_id="a", sound_id=None, type="negative"),
+            TrainingSample(id="orphan", user_id="a", sound_id="deleted", type="positive"),
+        ])
+        events = [
+            {"id": f"{user_id}-{age}", "user_id": user_id, "sound_id": None, "confidence": 0.5, "created_at": NOW - timedelta(days=age)}
+            for user_id in ("a", "b")
+            for age in (1, 10, 40, 41, 42, 43, 100)
+        ]
+        db.add_all(DetectionEvent(**event) for event in events)
+        upsert_rollups(db, rollup_rows(events))
+        db.commit()
+
+
+def test_run_once_applies_retention_and_collects_orphans(tmp_path):
+    maintenance, Session = make_maintenance(tmp_path)
+    seed(Session)
+    result = maintenance.run_once(NOW)
+    assert result["deleted"] == {"detection_events": 5 + 1, "detection_rollups": 10, "training_samples": 1}
+    with Session() as db:
+        remaining = sorted(event_id for (event_id,) in db.query(DetectionEvent.id))
+        samples = sorted(sample_id for (sample_id,) in db.query(TrainingSample.id))
+        hourly = db.query(DetectionRollup).filter(DetectionRollup.resolution == "hour").count()
+    # a keeps the default 30 days, b has a 90 day policy; minute rollups expire for both after 30.
+    assert remaining == ["a-1", "a-10", "b-1", "b-10", "b-40", "b-41", "b-42", "b-43"]
+    assert samples == ["live", "negative"]
+    assert hourly == 14
+    assert (maintenance.users_done, maintenance.users_total) == (2, 2)
+
+
+def test_only_one_process_runs_a_pass(tmp_path):
+    maintenance, Session = make_maintenance(tmp_path)
+    other, _ = make_maintenance(tmp_path)
+    with other._exclusive() as acquired:
+        assert acquired
+        assert "skipped" in maintenance.run_once(NOW)
+
+
+def test_month_start_wraps_years():
+    assert month_start(datetime(2024, 11, 20), 2) == datetime(2025, 1, 1)
+    assert month_start(datetime(2024, 1, 5), -1) == datetime(2023, 12, 1)
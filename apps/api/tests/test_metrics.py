@@ -0,0 +1,80 @@
+import os
+import tempfile
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
+
+import time
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import MetricsRegistry
+from app.profiling import SamplingProfiler
+from app.settings import settings
+
+
+client = TestClient(app)
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", route="/api/infer").inc(3)
+    registry.gauge("queue_depth", fn=lambda: 7)
+    histogram = registry.histogram("latency_ms", buckets=(1, 10), stage='say "hi"')
+    for value in (0.5, 5, 50):
+        histogram.observe(value)
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert "# TYPE tikun_requests_total counter" in lines
+    assert 'tikun_requests_total{route="/api/infer"} 3' in lines
+    assert "tikun_queue_depth 7" in lines
+    assert "# TYPE tikun_latency_ms histogram" in lines
+    assert 'tikun_latency_ms_bucket{stage="say \\"hi\\"",le="1"} 1' in lines
+    assert 'tikun_latency_ms_bucket{stage="say \\"hi\\"",le="10"} 2' in lines
+    assert 'tikun_latency_ms_bucket{stage="say \\"hi\\"",le="+Inf"} 3' in lines
+    assert 'tikun_latency_ms_sum{stage="say \\"hi\\""} 55.5' in lines
+    assert 'tikun_latency_ms_count{stage="say \\"hi\\""} 3' in lines
+
+
+def test_metrics_endpoint_counts_requests_by_route():
+    client.get("/health")
+    client.get("/no-such-route")
+
+    text = client.get("/metrics").text
+    assert 'tikun_http_requests_total{method="GET",route="/health",status="200"}' in text
+    assert 'route="unmatched"' in text
+    assert "tikun_model_load_seconds" in text
+    assert "tikun_embed_queue_depth" in text
+
+    snapshot = client.get("/metrics", params={"format": "json"}).json()
+    assert "http_request_ms" in snapshot
+
+
+def test_profiler_endpoints_require_toggle_and_token(monkeypatch):
+    assert client.get("/debug/profiler").status_code == 404
+    monkeypatch.setattr(settings, "profiler_enabled", True)
+    assert client.get("/debug/profiler").status_code == 404
+    monkeypatch.setattr(settings, "profiler_token", "debug-secret")
+    assert client.get("/debug/profiler").status_code == 403
+    assert client.get("/debug/profiler", headers={"X-Debug-Token": "wrong"}).status_code == 403
+    headers = {"X-Debug-Token": "debug-secret"}
+
+    assert client.post("/debug/profiler/start", params={"interval_ms": 1}, headers=headers).json()["running"] is True
+    assert client.post("/debug/profiler/start", headers=headers).status_code == 409
+    time.sleep(0.05)
+    stacks = client.post("/debug/profiler/stop", headers=headers).text
+    assert stacks and all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+    assert client.get("/debug/profiler", headers=headers).json()["running"] is False
+
+
+def test_sampling_profiler_collapses_thread_stacks():
+    profiler = SamplingProfiler(interval_ms=1)
+    profiler.start()
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    report = profiler.stop()
+
+    assert report["samples"] > 0 and not report["running"]
+    assert "test_sampling_profiler_collapses_thread_stacks" in profiler.collapsed()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
+
+import numpy as np
+import pytest
+
+from app.ml import YAMNET_HOP_SAMPLES, YAMNET_PATCH_SPAN_SAMPLES, MockEmbedder, ModelRegistry, create_embedder
+from app.model_server import ModelServer, ModelServerUnavailable, RemoteEmbedder
+from app.settings import settings
+
+
+@pytest.fixture
+def server():
+    path = os.path.join(tempfile.mkdtemp(prefix="tikun-sock-"), "embed.sock")
+    model_server = ModelServer(path, ModelRegistry("mock"))
+    model_server.start()
+    yield model_server
+    model_server.close()
+
+
+def test_remote_embedder_matches_local_model(server):
+    remote = RemoteEmbedder(server.path)
+    local = MockEmbedder()
+    rng = np.random.default_rng(0)
+    clips = [rng.uniform(-1, 1, size).astype(np.float32) for size in (16000, 4000, 0)]
+
+    assert remote.version == local.version
+    for actual, expected in zip(remote.embed_batch(clips), local.embed_batch(clips)):
+        assert np.allclose(actual, expected, atol=1e-6)
+    window = rng.uniform(-1, 1, YAMNET_PATCH_SPAN_SAMPLES + YAMNET_HOP_SAMPLES).astype(np.float32)
+    assert np.allclose(remote.embed_patches(window), local.embed_patches(window), atol=1e-6)
+    assert remote.embed_patches(window[:100]).shape == (0, 1024)
+
+
+def test_remote_embedder_reconnects_after_server_restart(server):
+    remote = RemoteEmbedder(server.path)
+    clip = np.ones(16000, dtype=np.float32)
+    expected = remote.extract(clip, 16000)
+    server.close()
+    with pytest.raises(ModelServerUnavailable):
+        remote.extract(clip, 16000)
+
+    restarted = ModelServer(server.path, server.registry)
+    restarted.start()
+    try:
+        assert np.array_equal(remote.extract(clip, 16000), expected)
+    finally:
+        restarted.close()
+
+
+def test_remote_backend_is_selectable(server, monkeypatch):
+    monkeypatch.setattr(settings, "embed_server_socket", server.path)
+    assert isinstance(create_embedder("remote"), RemoteEmbedder)
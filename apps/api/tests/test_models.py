@@ -0,0 +1,79 @@
+import os
+import tempfile
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
+
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from app.artifacts import ArtifactManager, ArtifactMissing
+from app.main import app
+from app.ml import ModelRegistry, model_registry
+
+
+def test_artifact_manager_installs_immutable_versions(tmp_path):
+    source = tmp_path / "export"
+    (source / "variables").mkdir(parents=True)
+    (source / "saved_model.pb").write_bytes(b"graph")
+    (source / "variables" / "variables.index").write_bytes(b"index")
+    manager = ArtifactManager(str(tmp_path / "models"), offline=True)
+
+    with pytest.raises(ArtifactMissing):
+        manager.resolve("yamnet", "1", "https://tfhub.dev/google/yamnet/1")
+    path = manager.install("yamnet", "1", str(source), origin="https://tfhub.dev/google/yamnet/1")
+
+    assert manager.resolve("yamnet", "1", "https://tfhub.dev/google/yamnet/1") == path
+    manifest = manager.manifest("yamnet", "1")
+    assert manifest["source"] == "https://tfhub.dev/google/yamnet/1"
+    assert set(manifest["files"]) == {"saved_model.pb", os.path.join("variables", "variables.index")}
+    with pytest.raises(FileExistsError):
+        manager.install("yamnet", "1", str(source))
+    assert not [name for name in os.listdir(tmp_path / "models" / "yamnet") if name.startswith(".")]
+
+
+def test_artifact_manager_falls_back_to_remote_when_online(tmp_path):
+    manager = ArtifactManager(str(tmp_path), offline=False)
+    assert manager.resolve("yamnet", "2", "https://tfhub.dev/google/yamnet/1") == "https://tfhub.dev/google/yamnet/1"
+    with pytest.raises(ArtifactMissing):
+        manager.resolve("yamnet", "2")
+
+
+def test_registry_loads_lazily_and_warms_up():
+    registry = ModelRegistry()
+    assert registry.status == "cold" and registry._embedder is None
+    hooked = []
+
+    registry.warm_up(lambda: hooked.append(True))
+
+    readiness = registry.readiness()
+    assert registry.ready and hooked == [True]
+    assert readiness["status"] == "ready"
+    assert readiness["embedder_version"] == "mock-1"
+    assert readiness["warmup_seconds"] is not None
+
+
+def test_warm_up_without_local_model_only_runs_hooks():
+    registry = ModelRegistry()
+    hooked = []
+
+    registry.warm_up(lambda: hooked.append(True), local=False)
+
+    assert registry.ready and hooked == [True]
+    assert registry._embedder is None
+    assert registry.readiness()["embedder_version"] is None
+
+
+def test_ready_is_unavailable_until_warm_up_finishes(monkeypatch):
+    monkeypatch.setattr(model_registry, "_ready", threading.Event())
+    response = TestClient(app).get("/ready")
+    assert response.status_code == 503
+    assert TestClient(app).get("/health").status_code == 200
+
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 10
+        while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.get("/ready").json()["status"] == "ready"
@@ -0,0 +1,98 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import asyncio
+import io
+import wave
+import numpy as np
+import pytest
+
+from app.ml import EmbeddingCache, MockEmbedder, ModelRegistry, load_audio, model_registry
+from app.pipeline import EmbeddingPipeline, PipelineBusy
+from app.streaming import ListenStream
+
+
+def make_wav() -> bytes:
+    sample_rate = 16000
+    t = np.linspace(0, 0.5, int(sample_rate * 0.5), False)
+    pcm = (0.2 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_pipeline_modes_match_direct_extract(mode):
+    wav_bytes = make_wav()
+    expected = MockEmbedder().extract(*load_audio(wav_bytes))
+    pipeline = EmbeddingPipeline(model_registry, mode, workers=1, max_pending=4)
+    try:
+        embedding = asyncio.run(pipeline.embed(wav_bytes))
+    finally:
+        pipeline.close()
+    assert np.array_equal(embedding, expected)
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_pipeline_stream_matches_direct_feed(mode):
+    audio = np.random.default_rng(0).standard_normal(16000 * 2).astype(np.float32)
+    direct = ListenStream(MockEmbedder(), context_patches=2, buffer_seconds=5)
+    expected = [result for start in range(0, len(audio), 4096) for result in direct.feed(audio[start:start + 4096])]
+    stream = ListenStream(None, context_patches=2, buffer_seconds=5)
+    pipeline = EmbeddingPipeline(model_registry, mode, workers=1, max_pending=4)
+
+    async def feed_all():
+        return [result for start in range(0, len(audio), 4096) for result in await pipeline.embed_stream(stream, audio[start:start + 4096])]
+
+    try:
+        results = asyncio.run(feed_all())
+    finally:
+        pipeline.close()
+    assert [end for end, _ in results] == [end for end, _ in expected]
+    assert all(np.array_equal(got, want) for (_, got), (_, want) in zip(results, expected))
+
+
+def test_pipeline_rejects_when_full():
+    pipeline = EmbeddingPipeline(model_registry, "thread", workers=1, max_pending=0)
+    with pytest.raises(PipelineBusy):
+        asyncio.run(pipeline.embed(make_wav()))
+
+
+def test_embedding_cache_evicts_by_bytes_and_reads_disk(tmp_path):
+    cache = EmbeddingCache(max_bytes=2 * 1024 * 4, directory=str(tmp_path))
+    rows = np.eye(3, 1024, dtype=np.float32)
+    for index, row in enumerate(rows):
+        cache.put(f"key-{index}", row)
+    cache._writer.shutdown(wait=True)
+    assert cache.size_bytes == 2 * 1024 * 4
+    assert cache.get("key-2") is not None
+    disk_only = EmbeddingCache(max_bytes=0, directory=str(tmp_path))
+    assert np.array_equal(disk_only.get("key-0"), rows[0])
+    assert disk_only.get("missing") is None
+
+
+def test_pipeline_reuses_cached_embedding(monkeypatch):
+    registry = ModelRegistry()
+    registry.cache = EmbeddingCache(max_bytes=1024 * 1024)
+    pipeline = EmbeddingPipeline(registry, "inline", workers=1, max_pending=4)
+    submitted = []
+    original_submit = registry.batcher.submit
+    monkeypatch.setattr(registry.batcher, "submit", lambda waveform: submitted.append(waveform) or original_submit(waveform))
+    first = asyncio.run(pipeline.embed(make_wav()))
+    second = asyncio.run(pipeline.embed(make_wav()))
+    assert np.array_equal(first, second)
+    assert len(submitted) == 1
+
+
+def test_embed_many_takes_one_slot_and_returns_errors_per_clip():
+    pipeline = EmbeddingPipeline(model_registry, "thread", workers=2, max_pending=1)
+    try:
+        results = asyncio.run(pipeline.embed_many([(make_wav(), "audio/wav"), (b"junk", None), (make_wav(), None)]))
+    finally:
+        pipeline.close()
+    assert isinstance(results[1], Exception)
+    assert np.array_equal(results[0], results[2])
@@ -0,0 +1,43 @@
+import os
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+
+import numpy as np
+
+from app.ml import YAMNET_HOP_SAMPLES, YAMNET_PATCH_SAMPLES, MockEmbedder
+from app.streaming import ListenStream, SampleRing
+
+
+def test_sample_ring_wraps_and_drops_oldest():
+    ring = SampleRing(8)
+    ring.write(np.arange(6, dtype=np.float32))
+    ring.advance(4)
+    ring.write(np.arange(6, 12, dtype=np.float32))
+    assert np.array_equal(ring.peek(8), np.arange(4, 12))
+    ring.write(np.arange(12, 15, dtype=np.float32))
+    assert ring.dropped == 3
+    assert np.array_equal(ring.peek(8), np.arange(7, 15))
+
+
+class PatchCountingEmbedder(MockEmbedder):
+    def __init__(self) -> None:
+        self.patches = 0
+
+    def embed_batch(self, waveforms):
+        self.patches += len(waveforms)
+        return super().embed_batch(waveforms)
+
+
+def test_listen_stream_embeds_each_patch_once():
+    embedder = PatchCountingEmbedder()
+    stream = ListenStream(embedder, context_patches=2, buffer_seconds=5)
+    audio = np.random.default_rng(0).standard_normal(16000 * 3).astype(np.float32)
+    results = []
+    for start in range(0, len(audio), 4096):
+        results.extend(stream.feed(audio[start:start + 4096]))
+    expected_patches = 1 + (len(audio) - YAMNET_PATCH_SAMPLES - 240) // YAMNET_HOP_SAMPLES
+    assert embedder.patches == len(results) == expected_patches
+    assert [round(end, 2) for end, _ in results[:3]] == [0.96, 1.44, 1.92]
+    second_patch = audio[YAMNET_HOP_SAMPLES:YAMNET_HOP_SAMPLES + YAMNET_PATCH_SAMPLES]
+    first_patch = audio[:YAMNET_PATCH_SAMPLES]
+    expected = np.mean(MockEmbedder().embed_batch([first_patch, second_patch]), axis=0)
+    assert np.allclose(results[1][1], expected)
@@ -0,0 +1,122 @@
+import os
+import tempfile
+os.environ.setdefault("TIKUN_EMBEDDING_BACKEND", "mock")
+os.environ.setdefault("TIKUN_DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("TIKUN_INDEX_DIR", tempfile.mkdtemp(prefix="tikun-index-"))
+
+import io
+import json
+import tarfile
+import uuid
+import wave
+import zipfile
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.ml import model_registry
+
+
+client = TestClient(app)
+
+
+def make_wav(frequency: float) -> bytes:
+    t = np.arange(8000) / 16000
+    pcm = (0.2 * np.sin(2 * np.pi * frequency * t) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def new_user() -> tuple[dict, str]:
+    email = f"batch-{uuid.uuid4().hex[:8]}@example.com"
+    token = client.post("/api/auth/signup", json={"email": email, "password": "Password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sound = client.post("/api/sounds", headers=headers, json={"name": "Doorbell"}).json()
+    return headers, sound["id"]
+
+
+def test_multipart_batch_reports_per_clip_results():
+    headers, sound_id = new_user()
+    files = [
+        ("files", ("a.wav", make_wav(440), "audio/wav")),
+        ("files", ("b.wav", make_wav(880), "audio/wav")),
+        ("files", ("broken.wav", b"not audio", "audio/wav")),
+    ]
+    response = client.post("/api/train/samples:batch", headers=headers, files=files, data={"sound_id": sound_id})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"], body["classifier_updated"]) == (2, 1, True)
+    assert [sample["status"] for sample in body["samples"]] == ["ok", "ok", "error"]
+    assert all(sample["sound_id"] == sound_id for sample in body["samples"][:2])
+    user_id = client.get("/api/sounds", headers=headers).json()["sounds"][0]["user_id"]
+    assert model_registry.get_classifier(user_id).size == 2
+
+
+def test_zip_bundle_with_manifest_and_unknown_sound():
+    headers, sound_id = new_user()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("clips/one.wav", make_wav(300))
+        archive.writestr("clips/two.wav", make_wav(600))
+        archive.writestr("clips/.DS_Store", b"junk")
+        archive.writestr("manifest.json", json.dumps({
+            "one.wav": {"sound_id": sound_id, "label": "negative"},
+            "clips/two.wav": {"sound_id": "someone-elses-sound"},
+        }))
+    response = client.post(
+        "/api/train/samples:batch",
+        headers=headers,
+        files=[("files", ("bundle.zip", buffer.getvalue(), "application/zip"))],
+        data={"update_classifier": "false"},
+    )
+
+    body = response.json()
+    assert body["accepted"] == 1 and body["classifier_updated"] is False
+    one, two = body["samples"]
+    assert (one["filename"], one["type"], one["sound_id"]) == ("clips/one.wav", "negative", sound_id)
+    assert two["error"] == "Sound not found"
+
+
+def test_tar_bundle_uses_form_defaults():
+    headers, sound_id = new_user()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for index in range(3):
+            data = make_wav(200 + 100 * index)
+            info = tarfile.TarInfo(f"clip-{index}.wav")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    response = client.post(
+        "/api/train/samples:batch",
+        headers=headers,
+        files=[("files", ("bundle.tar.gz", buffer.getvalue(), "application/gzip"))],
+        data={"sound_id": sound_id},
+    )
+
+    body = response.json()
+    assert body["accepted"] == 3
+    assert {sample["type"] for sample in body["samples"]} == {"positive"}
+
+
+def test_rejects_unreadable_bundle_and_bad_manifest():
+    headers, _ = new_user()
+    bad_zip = client.post(
+        "/api/train/samples:batch",
+        headers=headers,
+        files=[("files", ("bundle.zip", b"PK-not-really", "application/zip"))],
+    )
+    assert bad_zip.status_code == 400
+
+    bad_manifest = client.post(
+        "/api/train/samples:batch",
+        headers=headers,
+        files=[("files", ("a.wav", make_wav(440), "audio/wav"))],
+        data={"manifest": "[1, 2]"},
+    )
+    assert bad_manifest.status_code == 400
@@ -7,6 +7,7 @@ import Toggle from "../../components/Toggle";
 import FlashOverlay from "../../components/FlashOverlay";
 import { apiFetch } from "../../lib/api";
 import { encodeWav, getMicrophoneStream, playBeep } from "../../lib/audio";
+import { openListenSocket } from "../../lib/stream";
 
 const WINDOW_SECONDS = 0.96;
 
@@ -38,6 +39,7 @@ export default function ListeningPage() {
   const audioRef = useRef<AudioContext | null>(null);
   const processorRef = useRef<ScriptProcessorNode | null>(null);
   const streamRef = useRef<MediaStream | null>(null);
+  const socketRef = useRef<WebSocket | null>(null);
   const recentHitsRef = useRef<{ label: string; time: number }[]>([]);
   const lastTriggerRef = useRef<number>(0);
 
@@ -63,6 +65,21 @@ export default function ListeningPage() {
     setTimeout(() => setFlashText(null), 1400);
   };
 
+  const handlePrediction = (prediction: Prediction) => {
+    setLastPrediction(prediction);
+    const now = Date.now();
+    recentHitsRef.current = recentHitsRef.current.filter((hit) => now - hit.time < 3000);
+    if (prediction.label !== "unknown") {
+      recentHitsRef.current.push({ label: prediction.label, time: now });
+      const hits = recentHitsRef.current.filter((hit) => hit.label === prediction.label).length;
+      if (hits >= 2 && now - lastTriggerRef.current > cooldownSeconds * 1000) {
+        lastTriggerRef.current = now;
+        triggerAlert(prediction.sound_name || prediction.label);
+        loadHistory();
+      }
+    }
+  };
+
   const startListening = async () => {
     setListening(true);
     setStatus("Tikun is listening… You're covered.");
@@ -74,12 +91,26 @@ export default function ListeningPage() {
     const processor = audioContext.createScriptProcessor(4096, 1, 1);
     processorRef.current = processor;
 
+    // Prefer the streaming socket; fall back to per-chunk uploads if it is unavailable.
+    try {
+      socketRef.current = await openListenSocket(audioContext.sampleRate, handlePrediction, () => {
+        socketRef.current = null;
+      });
+    } catch (error) {
+      socketRef.current = null;
+    }
+
     const chunks: Float32Array[] = [];
     processor.onaudioprocess = async (event) => {
       const chunk = new Float32Array(event.inputBuffer.getChannelData(0));
-      chunks.push(chunk);
       const rms = Math.sqrt(chunk.reduce((sum, value) => sum + value * value, 0) / chunk.length);
       setAmbientLevel(rms);
+      const socket = socketRef.current;
+      if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(chunk.buffer);
+        return;
+      }
+      chunks.push(chunk);
       const totalLength = chunks.reduce((sum, current) => sum + current.length, 0);
       if (totalLength >= WINDOW_SECONDS * audioContext.sampleRate) {
         const buffer = new Float32Array(totalLength);
@@ -98,18 +129,7 @@ export default function ListeningPage() {
             method: "POST",
             body: formData,
           });
-          setLastPrediction(prediction);
-          const now = Date.now();
-          recentHitsRef.current = recentHitsRef.current.filter((hit) => now - hit.time < 3000);
-          if (prediction.label !== "unknown") {
-            recentHitsRef.current.push({ label: prediction.label, time: now });
-            const hits = recentHitsRef.current.filter((hit) => hit.label === prediction.label).length;
-            if (hits >= 2 && now - lastTriggerRef.current > cooldownSeconds * 1000) {
-              lastTriggerRef.current = now;
-              triggerAlert(prediction.sound_name || prediction.label);
-              loadHistory();
-            }
-          }
+          handlePrediction(prediction);
         } catch (error) {
           setStatus("Check your connection to the Tikun API.");
         }
@@ -124,6 +144,8 @@ export default function ListeningPage() {
     setListening(false);
     setStatus("Listening paused.");
     processorRef.current?.disconnect();
+    socketRef.current?.close();
+    socketRef.current = null;
     audioRef.current?.close();
     streamRef.current?.getTracks().forEach((track) => track.stop());
   };
@@ -0,0 +1,43 @@
+import { API_BASE_URL } from "./config";
+import { getAccessToken } from "./auth";
+
+export type StreamPrediction = {
+  sound_id?: string | null;
+  sound_name?: string | null;
+  label: string;
+  confidence: number;
+  time: number;
+};
+
+export async function openListenSocket(
+  sampleRate: number,
+  onPrediction: (prediction: StreamPrediction) => void,
+  onClose: () => void,
+): Promise<WebSocket> {
+  const token = await getAccessToken();
+  const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, "ws")}/ws/listen`);
+  socket.binaryType = "arraybuffer";
+  await new Promise<void>((resolve, reject) => {
+    let ready = false;
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ token, sample_rate: sampleRate, encoding: "float32" }));
+    };
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === "ready") {
+        ready = true;
+        resolve();
+      } else if (message.type === "prediction") {
+        onPrediction(message);
+      }
+    };
+    socket.onerror = () => {
+      if (!ready) reject(new Error("Stream connection failed"));
+    };
+    socket.onclose = () => {
+      if (!ready) reject(new Error("Stream rejected"));
+      else onClose();
+    };
+  });
+  return socket;
+}